@@ -0,0 +1,83 @@
+// Browser side of the columnar dataset payloads written by data_processing/transport.py (encode_frame).
+// main.py feeds the grid through it: update_columns writes the payload to a store, which this turns into rowData
+//     clientside_callback(ClientsideFunction('transport', 'toRecords'), Output('the-ag-grid', 'rowData'), Input('ag-grid-rows', 'data'))
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    transport: (function () {
+        const COLUMNAR_VERSION = 1;
+        const TYPED_ARRAYS = {
+            int8: Int8Array, uint8: Uint8Array, int16: Int16Array, uint16: Uint16Array,
+            int32: Int32Array, uint32: Uint32Array, int64: BigInt64Array, uint64: BigUint64Array,
+            float32: Float32Array, float64: Float64Array,
+        };
+
+        function typedArray(data, dtype) {
+            const binary = atob(data);
+            const bytes = new Uint8Array(binary.length);
+            for (let i = 0; i < binary.length; i++) {
+                bytes[i] = binary.charCodeAt(i);
+            }
+            // The payload is little-endian, as is every browser platform
+            return new TYPED_ARRAYS[dtype](bytes.buffer);
+        }
+
+        // Values of one column: a TypedArray for numbers without gaps, otherwise a plain Array with nulls.
+        // 64-bit integers stay BigInt so that no address or count loses precision.
+        function decodeColumn(column) {
+            const values = typedArray(column.data, column.dtype);
+            if (column.kind === 'dictionary') {
+                return Array.from(values, code => (code < 0 ? null : column.dictionary[code]));
+            }
+            if (column.kind === 'datetime') {
+                return Array.from(values, ms => (Number.isNaN(ms) ? null : new Date(ms)));
+            }
+            const valid = column.valid ? typedArray(column.valid, 'uint8') : null;
+            if (column.kind === 'bool') {
+                return Array.from(values, (value, i) => (valid && !valid[i] ? null : value === 1));
+            }
+            if (valid) {
+                return Array.from(values, (value, i) => (valid[i] ? value : null));
+            }
+            return values;
+        }
+
+        function decode(payload) {
+            if (!payload || payload.format !== 'columnar' || payload.version !== COLUMNAR_VERSION) {
+                throw new Error('Not a columnar dataset payload of version ' + COLUMNAR_VERSION);
+            }
+            const columns = {};
+            payload.columns.forEach(column => {
+                columns[column.name] = decodeColumn(column);
+            });
+            return {length: payload.length, columns: columns};
+        }
+
+        // One object per row, JSON-safe: BigInts become strings, dates ISO strings and NaN null
+        function toRecords(payload) {
+            if (!payload) {
+                return window.dash_clientside.no_update;
+            }
+            const frame = decode(payload);
+            const names = Object.keys(frame.columns);
+            const records = new Array(frame.length);
+            for (let i = 0; i < frame.length; i++) {
+                const record = {};
+                names.forEach(name => {
+                    const value = frame.columns[name][i];
+                    if (typeof value === 'bigint') {
+                        record[name] = value.toString();
+                    } else if (value instanceof Date) {
+                        record[name] = value.toISOString();
+                    } else if (typeof value === 'number' && Number.isNaN(value)) {
+                        record[name] = null;
+                    } else {
+                        record[name] = value;
+                    }
+                });
+                records[i] = record;
+            }
+            return records;
+        }
+
+        return {decode: decode, toRecords: toRecords};
+    })(),
+});
@@ -0,0 +1,86 @@
+'''Payload size and encode/decode time of the dataset transports against pandas' orient='split' JSON.
+
+Loads the WHOIS tables the way the app does and, per dataset and format, reports the size of the JSON
+text sent to the browser (and gzipped, as a compressing server or proxy would send it) and the best of
+--runs encode and decode times. Encoding includes the json.dumps of the payload and decoding the
+json.loads, so every format is timed from DataFrame to text and back. Run from the repository root, next
+to the WHOIS tables; the download cache goes to a temporary directory, so nothing is left behind.
+
+    python -m benchmarks.benchmark_transport [--runs N] [--datasets whois_ipv4_df whoisv6_df]
+'''
+import argparse
+import gzip
+import json
+import tempfile
+import time
+from io import StringIO
+
+import pandas as pd
+
+from classes.data_handler import DataHandler
+from data_processing import transport
+
+
+def encode_split(df):
+    return df.to_json(date_format='iso', orient='split')
+
+
+def decode_split(text):
+    return pd.read_json(StringIO(text), orient='split')
+
+
+CODECS = {
+    'split json': (encode_split, decode_split),
+    'columnar': (lambda df: json.dumps(transport.encode_frame(df, 'columnar')),
+                 lambda text: transport.decode_frame(json.loads(text))),
+    'arrow ipc': (lambda df: json.dumps(transport.encode_frame(df, 'arrow')),
+                  lambda text: transport.decode_frame(json.loads(text))),
+}
+
+
+def best_time(function, argument, runs):
+    '''(fastest of ``runs`` calls in seconds, result of the last call).'''
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function(argument)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def benchmark(df, runs):
+    rows = []
+    for name, (encode, decode) in CODECS.items():
+        encode_seconds, text = best_time(encode, df, runs)
+        decode_seconds, _ = best_time(decode, text, runs)
+        payload = text.encode()
+        rows.append({'format': name, 'MB': len(payload) / 1e6, 'gzip MB': len(gzip.compress(payload, 6)) / 1e6,
+                     'encode ms': encode_seconds * 1000, 'decode ms': decode_seconds * 1000})
+    report = pd.DataFrame(rows).set_index('format')
+    report['size vs json'] = report['MB'] / report.loc['split json', 'MB']
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--datasets', nargs='+', default=['whois_ipv4_df', 'whoisv6_df'])
+    args = parser.parse_args()
+
+    # Same inputs as main.create_app; the WHOIS tables do not need ip_alloc.json, so nothing is fetched
+    with tempfile.TemporaryDirectory(prefix='benchmark-cache-') as cache_dir:
+        data_handler = DataHandler(
+            json_url='https://raw.githubusercontent.com/impliedchaos/ip-alloc/main/ip_alloc.json',
+            whois_v4_pop_csv='whoisv4_pop_gdp.parquet',
+            population_csv='wpopdata.csv',
+            whoisv6_allocation_csv='ipv6_allocations.parquet',
+            cache_dir=cache_dir,
+        )
+        for name in args.datasets:
+            df = data_handler.dataset(name)
+            print(f'\n{name}: {len(df):,} rows, {len(df.columns)} columns (best of {args.runs})')
+            print(benchmark(df, args.runs).to_string(float_format=lambda value: f'{value:,.2f}'))
+
+
+if __name__ == '__main__':
+    main()
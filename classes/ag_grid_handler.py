@@ -1,15 +1,20 @@
 import pandas as pd
-from io import StringIO
+
+from data_processing import ip_math
 
 class AgGridHandler:
     def __init__(self, data_handler):
         self.data_handler = data_handler
 
     def format_json_data_for_aggrid(self):
+        formatted_df = self.json_grid()
+        return formatted_df.to_dict('records') if formatted_df is not None else []
+
+    def json_grid(self):
         df = self.data_handler.json_df
         if df is None or df.empty:
             print("JSON DataFrame is empty or not initialized.")
-            return []
+            return None
         formatted_df = df.copy()
         formatted_df['log_ipv4'] = pd.to_numeric(formatted_df['log_ipv4'], errors='coerce')
 
@@ -24,41 +29,68 @@ class AgGridHandler:
         formatted_df['percentv4'] = formatted_df['percentv4'].apply(lambda x: "{:.1f}%".format(x))
 
         # v6
-        formatted_df['ipv6'] = pd.to_numeric(formatted_df['ipv6'], errors='coerce')
-        formatted_df['ipv6'] = formatted_df['ipv6'].apply(lambda x: "{:,.0f}".format(x) if pd.notnull(x) else '')
-        formatted_df['pcv6'] = pd.to_numeric(formatted_df['pcv6'], errors='coerce')
+        # Exact address counts from the /64 counts; the float ipv6 column is rounded past 2**53
+        formatted_df['ipv6'] = formatted_df['ipv6_64s'].apply(lambda x: "{:,}".format(int(x) << 64))
         formatted_df['pcv6'] = formatted_df['pcv6'].apply(lambda x: "{:,.2f}".format(x) if pd.notnull(x) else '')
         # print(formatted_df.columns.tolist(), 'ag grid handler format function')
         formatted_df['percentv6'] = formatted_df['percentv6'].apply(lambda x: '{:.8f}%'.format(x))
         #print(formatted_df.dtypes, 'ag grid handler format function')
         # print(formatted_df.describe, 'ag grid handler format function')
         formatted_df['pop'] = formatted_df['pop'].apply(lambda x: '{:,.0f}'.format(x))
-        return formatted_df.to_dict('records')
+
+        # WHOIS address space per country, with overlapping blocks counted once
+        if self.data_handler.whois_ipv4_df is not None:
+            footprint = self.data_handler.address_footprint('ISO-3').set_index('ISO-3')
+            unique_addresses = formatted_df['iso_alpha_3'].map(footprint['Unique Addresses'].astype('int64'))
+            formatted_df['unique_whois_ipv4'] = unique_addresses.apply(lambda x: '{:,.0f}'.format(x) if pd.notnull(x) else '')
+        return formatted_df
 
     def format_whois4_data_for_aggrid(self):
+        formatted_df = self.whois4_grid()
+        return formatted_df.to_dict('records') if formatted_df is not None else []
+
+    def whois4_grid(self):
         df = self.data_handler.whois_ipv4_df
         if df is None or df.empty:
             print("WHOIS DataFrame is empty or not initialized.")
-            return []
+            return None
+        registry = self.data_handler.registry
+        # Formatting the ~460k rows is the slow part; it is done once per version of the dataset
+        return registry.derived(registry.token('whois_ipv4'), 'grid', self.whois4_grid_frame)
+
+    def whois4_grid_frame(self, df):
         # Filter out rows where 'Value' is 0
         df = df[df['Value'] != 0]
         formatted_df = df.copy()
+        # Start addresses are held as uint32 and only turned back into dotted strings for display;
+        # the integer goes along as StartInt so the grid can sort numerically (as uint32, which reaches the
+        # browser as a plain number; 64-bit integers would arrive as strings)
+        if formatted_df['Start'].dtype == 'uint32':
+            formatted_df['StartInt'] = formatted_df['Start']
+            formatted_df['Start'] = ip_math.int_to_ipv4(formatted_df['Start'])
+            formatted_df = formatted_df.drop(columns=['End'], errors='ignore')
         formatted_df['Value'] = formatted_df['Value'].apply(lambda x: "{:,.0f}".format(x) if pd.notnull(x) else x)
         formatted_df['Population'] = pd.to_numeric(formatted_df['Population'], errors='coerce')
         formatted_df['Population'] = formatted_df['Population'].apply(lambda x: "{:,.0f}".format(x) if pd.notnull(x) else x)
         formatted_df['Registry'] = formatted_df['Registry'].str.upper()
         formatted_df['Date'] = pd.to_datetime(formatted_df['Date'], format='%Y-%m-%d', errors='coerce').dt.strftime('%Y-%m-%d')
-        return formatted_df.to_dict('records')
-    
+        return formatted_df
+
     def format_whoisv6_data_for_aggrid(self, active_dataset):
         #print('we are here')
         #print(active_dataset.keys())
-        data_json_stream = StringIO(active_dataset['data'])
-        df = pd.read_json(data_json_stream, orient='split')
+        return self.whoisv6_grid(active_dataset).to_dict('records')
 
+    def whoisv6_grid(self, active_dataset):
+        return self.data_handler.registry.derived(active_dataset, 'grid', self.whoisv6_grid_frame)
+
+    def whoisv6_grid_frame(self, df):
         # print(df.columns.tolist(), 'ag handler format v6 data function')
         # print(df.dtypes, 'ag handler format v6 data function')
-        formatted_df = df.copy()
+        # 128-bit addresses do not fit a JavaScript number, so the grid sorts on fixed-width hex keys made from
+        # the (hi, lo) pairs computed at load; the pairs themselves stay server-side
+        formatted_df = df.drop(columns=ip_math.IPV6_INT_COLUMNS)
+        formatted_df['StartKey'] = ip_math.ipv6_sort_keys(df['StartHi'].to_numpy(), df['StartLo'].to_numpy())
         #print(formatted_df.columns.tolist())
         
         #formatted_df['Value'] = formatted_df['Value'].apply(lambda x: "{:,.0f}".format(x) if pd.notnull(x) else x)
@@ -66,7 +98,7 @@ class AgGridHandler:
         #formatted_df['Population'] = formatted_df['Population'].apply(lambda x: "{:,.0f}".format(x) if pd.notnull(x) else x)
         formatted_df['Registry'] = formatted_df['Registry'].str.upper()
         formatted_df['Date'] = pd.to_datetime(formatted_df['Date'], format='%Y-%m-%d', errors='coerce').dt.strftime('%Y-%m-%d')
-        return formatted_df.to_dict('records')
+        return formatted_df
 
     def generate_column_definitions(self, data_type):
         if data_type == 'v4_pool':
@@ -76,6 +108,7 @@ class AgGridHandler:
                 {'field': 'ipv4', 'headerName': 'Nr of IPv4 Addresses', 'sortable': True, 'filter': True},
                 {'field': 'pcv4', 'headerName': 'IPv4 per Capita', 'sortable': True, 'filter': True},
                 {'field': 'percentv4', 'headerName': 'Pct Total of v4 Pool', 'sortable': True, 'filter': True},
+                {'field': 'unique_whois_ipv4', 'headerName': 'Unique WHOIS IPv4', 'sortable': True, 'filter': True},
                 {'field': 'RIR', 'headerName': 'RIR', 'sortable': True, 'filter': True},
                 {'field': 'log_ipv4', 'headerName': 'Log of IPv4', 'sortable': True, 'filter': True}
             ]
@@ -84,7 +117,8 @@ class AgGridHandler:
                 {'field': 'Country', 'headerName': 'Country', 'sortable': True, 'filter': True},
                 {'field': 'Population', 'headerName': 'Population', 'sortable': True, 'filter': True},
                 {'field': 'Registry', 'headerName': 'Registry', 'sortable': True, 'filter': True},
-                {'field': 'Start', 'headerName': 'Start IP', 'sortable': True, 'filter': True},
+                {'field': 'Start', 'headerName': 'Start IP', 'sortable': True, 'filter': True,
+                 'comparator': {'function': 'nodeA.data.StartInt - nodeB.data.StartInt'}},
                 {'field': 'Value', 'headerName': 'Assigned IPs', 'sortable': True, 'filter': True},
                 {'field': 'Year', 'headerName': 'Year', 'sortable': True, 'filter': True},
                 {'field': 'Status', 'headerName': 'Status', 'sortable': True, 'filter': True},
@@ -105,8 +139,10 @@ class AgGridHandler:
                 {'field': 'Country', 'headerName': 'Country', 'sortable': True, 'filter': True},
                 #{'field': 'Population', 'headerName': 'Population', 'sortable': True, 'filter': True},
                 {'field': 'Registry', 'headerName': 'Registry', 'sortable': True, 'filter': True},
-                {'field': 'Start', 'headerName': 'Start IP', 'sortable': True, 'filter': True},
-                {'field': 'formatted_ipv6_count', 'headerName': 'Assigned IPs', 'sortable': True, 'filter': True},
+                {'field': 'Start', 'headerName': 'Start IP', 'sortable': True, 'filter': True,
+                 'comparator': {'function': 'nodeA.data.StartKey < nodeB.data.StartKey ? -1 : nodeA.data.StartKey > nodeB.data.StartKey ? 1 : 0'}},
+                {'field': 'formatted_ipv6_count', 'headerName': 'Assigned IPs', 'sortable': True, 'filter': True,
+                 'comparator': {'function': 'nodeA.data.ipv6_count - nodeB.data.ipv6_count'}},
                 {'field': 'Year', 'headerName': 'Year', 'sortable': True, 'filter': True},
                 {'field': 'Status', 'headerName': 'Status', 'sortable': True, 'filter': True},
                 {'field': 'Prefix', 'headerName': 'Prefix', 'sortable': True, 'filter': True},
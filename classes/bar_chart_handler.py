@@ -1,7 +1,6 @@
 import plotly.express as px
 import pandas as pd
 import numpy as np
-from io import StringIO
 
 class BarChartHandler:
     def __init__(self,  data_handler):
@@ -9,7 +8,7 @@ class BarChartHandler:
 
     def calculate_rir_percentages(self):
         df = self.data_handler.json_df
-        return df.groupby('RIR')['percentv4'].sum().reset_index()
+        return df.groupby('RIR', observed=True)['percentv4'].sum().reset_index()
 
     def get_data_by_rir(self, RIR):
         df = self.data_handler.json_df
@@ -60,7 +59,6 @@ class BarChartHandler:
         hover_data = None
         template = 'bootstrap' if switch_on else 'bootstrap_dark'
         x_axis = 'log' if log_scale_active else 'linear'
-        data_json_stream = StringIO(active_dataset['data'])
         allocation_version = allocation_version.get('allocation_type')
         #print(allocation_version, 'not working?')
         #print('dataframe is', active_dataset.get('dataset'))
@@ -96,9 +94,9 @@ class BarChartHandler:
         #print(active_item)
         
         if allocation_version == 'ipv4':
-            df = pd.read_json(data_json_stream, orient='split')
+            df = self.data_handler.registry.resolve(active_dataset)
             if active_item == 'RIR':
-                rir_sum = df.groupby('RIR')['ipv4'].sum().reset_index()
+                rir_sum = df.groupby('RIR', observed=True)['ipv4'].sum().reset_index()
                 df=rir_sum
                 x='RIR'
                 y='ipv4'
@@ -142,7 +140,8 @@ class BarChartHandler:
                 #     'textinfo': 'percent+label'
                 # }
             elif active_item == 'GLOBALBAR':
-                df = pd.read_json(data_json_stream, orient='split')
+                # Copied: the log column is added to it
+                df = self.data_handler.registry.resolve(active_dataset).copy()
                 log_values = np.log10(df['percentv4'] + 0.0001)
                 df['log_percentv4'] = (log_values - np.min(log_values)) / (np.max(log_values) - np.min(log_values))
                 #print(df.columns.tolist())
@@ -166,12 +165,13 @@ class BarChartHandler:
                 
 
         if allocation_version == 'ipv6':
-            df = pd.read_json(data_json_stream, orient='split')
+            df = self.data_handler.registry.resolve(active_dataset)
             if active_item == 'RIRV6':
-                rir_sum = df.groupby('RIR')['ipv6'].sum().reset_index()
+                # Summed as exact /64 counts; summing the float address counts would lose precision
+                rir_sum = df.groupby('RIR', observed=True)['ipv6_64s'].sum().reset_index()
                 df=rir_sum
                 x='RIR'
-                y='ipv6'
+                y='ipv6_64s'
                 color_continuous_scale=px.colors.sequential.Plasma_r
                 layout_options = {
                     'xaxis_tickangle':-25,
@@ -179,8 +179,8 @@ class BarChartHandler:
                     'autosize':True,
                     'margin': dict(t=50, b=50, l=50, r=50),
                     'xaxis_title': 'Regional Internet Registry',
-                    'yaxis_title': 'Sum of Total IPv6 Pool',
-                    'coloraxis_colorbar': dict(title='IPv6 Total')
+                    'yaxis_title': 'Sum of IPv6 /64 Subnets',
+                    'coloraxis_colorbar': dict(title='IPv6 /64s')
                 }
             
             elif active_item in ['RIPENCCV6', 'ARINV6', 'AFRINICV6', 'LACNICV6', 'APNICV6']:
@@ -210,7 +210,7 @@ class BarChartHandler:
 
         if active_dataset.get('dataset') == 'v4_allocation':  
             if active_item == 'UNVSALLOCATED':
-                df = pd.read_json(active_dataset['data'], orient='split')
+                df = self.data_handler.registry.resolve(active_dataset)
                 #print('inside conditional in bar chart unvsallocated')
                 stack_fig = px.bar(
                     df,
@@ -225,6 +225,21 @@ class BarChartHandler:
 
 
                 return stack_fig
+            if active_item == 'FOOTPRINT':
+                # Summed Value counts overlapping blocks twice; the unique column comes from the merged ranges
+                df = self.data_handler.address_footprint('Registry').melt(
+                    id_vars='Registry', value_vars=['Allocated Addresses', 'Unique Addresses'],
+                    var_name='Measure', value_name='Addresses')
+                footprint_fig = px.bar(
+                    df,
+                    x='Registry',
+                    y='Addresses',
+                    color='Measure',
+                    barmode='group',
+                    template=template,
+                )
+                footprint_fig.update_layout(xaxis_title='Regional Internet Registry', yaxis_title='IPv4 Addresses', yaxis_type=x_axis)
+                return footprint_fig
         
         fig = px.bar(df, x, y, color=y,color_continuous_scale=color_continuous_scale, template=template) #, custom_data=customdata, hover_data=hover_data
         #fig.update_traces(**trace_options)
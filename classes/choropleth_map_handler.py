@@ -1,7 +1,8 @@
 import plotly.express as px
 import numpy as np
 import pandas as pd
-from io import StringIO
+
+from data_processing.binning import BINNINGS
 
 class ChoroplethHandler:
     def __init__ (self, data_handler, hover_template_handler):
@@ -29,34 +30,26 @@ class ChoroplethHandler:
     # Color scale in function for easier code reusability -- Might add some more conditionals later when scaling for other graphs
     def get_colorscale(self, choropleth_accordion_selector):
         if choropleth_accordion_selector == 'normal':
-            colors = {
-                '0-10K': 'rgb(15, 246, 228)',
-                '10K-100K': 'rgb(0, 229, 255)',
-                '100K-1M': 'rgb(0, 208, 255)',
-                '1M-10M': 'rgb(86, 187, 255)',
-                '10M-100M': 'rgb(141, 160, 255)',
-                '100M-1B': 'rgb(207, 104, 255)',
-                '1B+': 'rgb(250, 0, 196)'
-            }
-            return colors
+            # Keyed by the same labels the data handler buckets ipv4_grouping into
+            return BINNINGS['ipv4'].colors
 
     def generate_figure(self, active_item, active_dataset, switch_on, allocation_version):
         hover_template = self.hover_template_handler.get_hover_template(active_item)
         template = 'bootstrap' if switch_on else 'bootstrap_dark'
         #print(active_item, 'in choropleth generate figure function')
 
-        data_json_stream = StringIO(active_dataset['data'])
         if allocation_version['allocation_type'] == 'ipv4':
             if active_item == 'normal':
                 colors=self.get_colorscale(active_item)
                 hover_template = self.hover_template_handler.get_hover_template(active_item)
-                df = pd.read_json(data_json_stream, orient='split') 
+                df = self.data_handler.registry.resolve(active_dataset) 
                 map_fig = px.choropleth(
                     data_frame=df,
                     locations='iso_alpha_3',
                     color='ipv4_grouping',
                     hover_name='name',
                     color_discrete_map=colors,
+                    category_orders=BINNINGS['ipv4'].category_orders('ipv4_grouping'),
                     locationmode='ISO-3',
                     hover_data={
                         'name': True,
@@ -91,7 +84,7 @@ class ChoroplethHandler:
                 # Generate the choropleth map
                 hover_template = self.hover_template_handler.get_hover_template(active_item)
                 map_fig = px.choropleth(
-                    data_frame=pd.read_json(data_json_stream, orient='split'),
+                    data_frame=self.data_handler.registry.resolve(active_dataset),
                     locations='iso_alpha_3',
                     color='log_ipv4',
                     hover_name='name',
@@ -129,12 +122,10 @@ class ChoroplethHandler:
                 return map_fig  
         if allocation_version['allocation_type'] == 'ipv6':
             if active_item == 'v6log':
-                #df = pd.read_json(data_json_stream, orient='split')
-                df = pd.read_json(data_json_stream, orient='split')
+                #df = self.data_handler.registry.resolve(active_dataset)
+                df = self.data_handler.registry.resolve(active_dataset)
                 #print(df.columns.tolist())
 
-                df['ipv6'] = df['ipv6'].apply(lambda x: x if x > 0 else 1.1)
-                df['log_ipv6'] = np.log10(df['ipv6'])
                 # highest = df['log_ipv6'].max()
                 # lowest = df['log_ipv6'].min()
                 # middle = df['log_ipv6'].median()
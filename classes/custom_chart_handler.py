@@ -25,7 +25,7 @@ class CustomChartHandler:
                 # Extra check for value counts and nulls
                 #print(df['ipv4'].value_counts())  # See distribution of values
                 #print(df['ipv4'].isnull().sum())  # Check if there are any remaining nulls
-                grouped_df = df.groupby('RIR')['ipv4'].sum().reset_index()
+                grouped_df = df.groupby('RIR', observed=True)['ipv4'].sum().reset_index()
                 fig = px.histogram(
                     grouped_df,
                     x='RIR',
@@ -1,56 +1,423 @@
-import requests
+import glob
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
 import pandas as pd
 import numpy as np
-import pycountry
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+
+from classes.dataset_registry import DatasetRegistry
+from data_processing import country_codes, ip_lookup, ip_math, netlist, rir_attribution, storage
+from data_processing.binning import BINNINGS
+from data_processing.cached_source import DEFAULT_TTL, StaleWhileRevalidate
+from data_processing.country_year_cube import CountryYearCube
+from data_processing.rir_fetcher import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Compact in-memory layout of the WHOIS tables. Columns that are not listed (Code, Extensions) are dropped
+# on load. v4 addresses are held as uint32 Start/End (inclusive) rather than dotted strings, v6 addresses
+# as (hi, lo) uint64 pairs next to the display string
+WHOIS_IPV4_SCHEMA = {
+    'Registry': 'category', 'Type': 'category', 'Start': 'uint32', 'End': 'uint32', 'Value': 'uint32',
+    'Date': 'datetime64[ns]', 'Status': 'category', 'Prefix': 'uint8', 'ISO-3': 'category', 'Year': 'int16',
+    'Country': 'category', 'Population': 'float64', 'GDPPerCap': 'float64',
+}
+WHOIS_IPV6_SCHEMA = {
+    'Registry': 'category', 'Type': 'category', 'Start': 'category', 'StartHi': 'uint64', 'StartLo': 'uint64',
+    'EndHi': 'uint64', 'EndLo': 'uint64', 'Value': 'uint32', 'Date': 'datetime64[ns]', 'Status': 'category',
+    'Prefix': 'uint8', 'ISO-3': 'category', 'Country': 'category', 'Year': 'int16',
+}
+# What an address lookup reports about the allocation (and the netlist range) holding the address
+LOOKUP_COLUMNS = ['Registry', 'Status', 'ISO-3', 'Country', 'Date', 'Prefix']
+NETLIST_LOOKUP_COLUMNS = ['RIR', 'Status', 'IP Address', 'Prefix']
+# A failed build is retried after this many seconds, doubling with every further failure up to the maximum,
+# unless its sources change first
+RETRY_BACKOFF = 5
+MAX_RETRY_BACKOFF = 300
+
+@lru_cache(maxsize=None)
+def ipv6_prefix_table():
+    '''Addresses in, display label for, and log10 of the block size of every IPv6 prefix length 0-128.'''
+    prefixes = np.arange(ip_math.IPV6_BITS + 1)
+    counts = np.ldexp(1.0, ip_math.IPV6_BITS - prefixes)
+    labels = [DataHandler.calculate_and_format_ipv6_addresses(int(prefix)) for prefix in prefixes]
+    return pd.DataFrame({'count': counts, 'label': labels, 'log10': np.log10(counts)}, index=prefixes)
+
+@lru_cache(maxsize=None)
+def processing_code_version():
+    '''Hash of this module and the data_processing package: a snapshot only holds what this code produced.'''
+    package = os.path.dirname(os.path.abspath(__file__))
+    paths = [os.path.abspath(__file__)] + sorted(glob.glob(os.path.join(package, '..', 'data_processing', '*.py')))
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as source_file:
+            digest.update(source_file.read())
+    return digest.hexdigest()[:12]
+
+class LazyDataset:
+    '''DataHandler attribute that is built by its declared builder on first read (see DataHandler.DATASETS).
+
+    Builders assign the attribute as before; the value is kept until the dataset's source version changes.
+    What a builder assigns is held apart until its build has succeeded, see DataHandler.build.
+    '''
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance.dataset(self.name)
+
+    def __set__(self, instance, value):
+        if self.name in instance.building:
+            instance.built[self.name] = value
+        else:
+            instance.datasets[self.name] = value
+
 
 # JSON Conversion is prioritised because of its compatability with dash/JS
 class DataHandler:
-    def __init__(self, json_url, whois_v4_pop_csv, population_csv, whoisv6_allocation_csv): #netlist_url, 
+    # dataset -> (builder method, datasets it is derived from, attribute naming its source file or URL).
+    # A source dataset's version is its file's (a cached remote source's own version, a plain URL is fetched
+    # once per process); a derived dataset's version is that of everything it is derived from, so it is
+    # rebuilt only when one of them is. A dataset with both is versioned by its source and its dependencies.
+    # Datasets are declared after the ones they derive from.
+    DATASETS = {
+        'whois_ipv4_df': ('fetch_whois_ipv4_data', (), 'whois_v4_pop_csv'),
+        'whoisv6_df': ('fetch_whois_ipv6_data', (), 'whoisv6_allocation_csv'),
+        'netlist_df': ('fetch_netlist_data', (), 'netlist_source'),
+        'rir_map': ('build_rir_map', ('whois_ipv4_df', 'whoisv6_df'), None),
+        'json_df': ('fetch_json_data', ('rir_map',), 'json_source'),
+        'allocation_df': ('create_allocation_bar_df', ('whois_ipv4_df',), None),
+        # Read off the country x year cube, which is built from both WHOIS tables
+        'ipv4_ts_df': ('create_time_series_df', ('whois_ipv4_df', 'whoisv6_df', 'rir_map'), None),
+        'address_indexes': ('build_address_indexes', ('whois_ipv4_df', 'whoisv6_df', 'netlist_df'), None),
+    }
+    # Served from memory-mapped column stores, whose pages every worker shares: a snapshot only records
+    # their versions and a restore maps the stores again instead of unpickling a private copy
+    MAPPED_DATASETS = ('whois_ipv4_df', 'whoisv6_df')
+    whois_ipv4_df = LazyDataset()
+    whoisv6_df = LazyDataset()
+    netlist_df = LazyDataset()
+    rir_map = LazyDataset()
+    json_df = LazyDataset()
+    allocation_df = LazyDataset()
+    ipv4_ts_df = LazyDataset()
+    address_indexes = LazyDataset()
+
+    def __init__(self, json_url, whois_v4_pop_csv, population_csv, whoisv6_allocation_csv, netlist_url=None, json_ttl=DEFAULT_TTL,
+                 snapshot_path=None, export_sink=None, cache_dir=DEFAULT_CACHE_DIR):
         self.json_url = json_url
+        # ip_alloc.json is served from its last good local copy and revalidated in the background
+        self.json_source = StaleWhileRevalidate('ip_alloc.json', json_url, ttl=json_ttl, cache_dir=cache_dir)
+        self.netlist_url = netlist_url
+        # The netlist likewise, so a stalled or unreachable GitHub never holds up the address indexes
+        self.netlist_source = StaleWhileRevalidate('netlist.txt', netlist_url, ttl=json_ttl, cache_dir=cache_dir,
+                                                   validate=netlist.validate_netlist) if netlist_url else None
         self.whois_v4_pop_csv = whois_v4_pop_csv
         self.population_csv = population_csv
         self.whoisv6_allocation_csv = whoisv6_allocation_csv
-        self.json_df = None
-        self.whois_ipv4_df = None
-        self.ipv4_ts_df = None
-        self.allocation_df = None
-        self.whoisv6_df = None
-
-        self.fetch_json_data()
-        self.fetch_whois_ipv4_data()
-        #self.process_whois_ipv4_data()
-        self.allocation_df = self.create_allocation_bar_df()
-        self.create_time_series_df()
-        self.fetch_whois_ipv6_data()
+        self.datasets = {}
+        self.dataset_versions = {}
+        self.building = set()
+        # What the builders in progress have assigned so far
+        self.built = {}
+        self.build_timings = {}
+        self.failed_builds = {}
+        # One lock per dataset: a reader waits for a build in progress in another thread instead of starting
+        # its own. Re-entrant, because builders read back the dataset they are assigning
+        self.locks = {name: threading.RLock() for name in self.DATASETS}
+        self.dataset_states = {}
+        self.dropped_columns = {}
+        self.derived_cache = {}
+        # Processed datasets are saved here after a warm start and restored by the next one
+        self.snapshot_path = snapshot_path
+        self.snapshot_versions = {}
+        # Opt-in debug exports of built datasets, written by a background ExportSink
+        self.export_sink = export_sink
+        # What the dcc.Stores refer to by token instead of carrying the frames
+        self.registry = DatasetRegistry(self)
+
+    # Dataset graph
+    def source_version(self, name):
+        builder, dependencies, source = self.DATASETS[name]
+        dependency_versions = tuple(self.current_version(dependency) for dependency in dependencies)
+        if source is None:
+            return dependency_versions
+        if dependencies:
+            return (self.location_version(name),) + dependency_versions
+        return self.location_version(name)
+
+    def location_version(self, name):
+        location = getattr(self, self.DATASETS[name][2])
+        if isinstance(location, StaleWhileRevalidate):
+            return location.version()
+        if not location or '://' in location:
+            return location
+        return storage.dataset_version(location)
+
+    def current_version(self, name):
+        self.dataset(name)
+        return self.dataset_versions.get(name)
+
+    def dataset(self, name):
+        '''The named dataset, (re)built first if it is missing or its sources changed since it was built.'''
+        with self.locks[name]:
+            if name in self.building:
+                # Builders read back what they have assigned so far
+                return self.built.get(name)
+            # Resolving the version first builds what the dataset derives from, so each stage is timed on its own
+            version = self.source_version(name)
+            if name not in self.dataset_versions or self.dataset_versions[name] != version:
+                if self.may_build(name, version):
+                    self.build(name, version)
+            return self.datasets.get(name)
+
+    def may_build(self, name, version):
+        # After a failure, the same sources are only tried again once the backoff has passed
+        failure = self.failed_builds.get(name)
+        return failure is None or failure['version'] != version or time.monotonic() >= failure['retry_at']
+
+    def build(self, name, version=None):
+        builder = self.DATASETS[name][0]
+        self.building.add(name)
+        self.dataset_states[name] = 'loading'
+        started = time.perf_counter()
+        try:
+            result = getattr(self, builder)()
+        except BaseException:
+            self.dataset_states[name] = 'failed'
+            self.record_failure(name, version)
+            raise
+        finally:
+            self.building.discard(name)
+            built = self.built.pop(name, None)
+        # Builders return the dataset or assign it; one that catches its own error does neither
+        if result is None:
+            result = built
+        self.build_timings[name] = round(time.perf_counter() - started, 3)
+        if result is None:
+            # What was built before stays in service under the version it was built from, and the build is
+            # retried after the backoff (see may_build)
+            logger.warning('%s: build failed after %.2fs', name, self.build_timings[name])
+            self.dataset_states[name] = 'failed'
+            self.record_failure(name, version)
+            return
+        logger.info('%s: built in %.2fs', name, self.build_timings[name])
+        self.datasets[name] = result
+        # Versioned after the build, which may itself have refreshed the source (e.g. rebuilt a column store)
+        self.dataset_versions[name] = self.source_version(name)
+        self.dataset_states[name] = 'ready'
+        self.failed_builds.pop(name, None)
+
+    def record_failure(self, name, version):
+        previous = self.failed_builds.get(name)
+        attempts = previous['attempts'] + 1 if previous and previous['version'] == version else 1
+        backoff = min(RETRY_BACKOFF * 2 ** (attempts - 1), MAX_RETRY_BACKOFF)
+        self.failed_builds[name] = {'version': version, 'attempts': attempts, 'retry_at': time.monotonic() + backoff}
+
+    def warm_start(self, names=None, max_workers=None):
+        '''Start building the given datasets (all by default) in a background thread pool and return at once.
+
+        Independent datasets load in parallel (downloads and file reads release the GIL); a dataset waits
+        in its own thread for the ones it derives from. Reads in the meantime wait for the build in progress.
+        '''
+        names = list(names or self.DATASETS)
+        if self.snapshot_path:
+            self.load_snapshot()
+        for name in names:
+            self.dataset_states.setdefault(name, 'pending')
+        executor = ThreadPoolExecutor(max_workers=max_workers or len(names), thread_name_prefix='warm-start')
+        futures = [executor.submit(self.dataset, name) for name in names]
+        executor.shutdown(wait=False)
+        if self.snapshot_path:
+            threading.Thread(target=self.save_snapshot_after, args=(futures,), name='snapshot', daemon=True).start()
+        return executor
+
+    def is_loading(self, name):
+        # Datasets nobody has asked for yet are not loading: reading them simply builds them
+        return self.dataset_states.get(name) in ('pending', 'loading')
+
+    def readiness(self):
+        '''State of every dataset (pending, loading, ready or failed, None if never requested) with its build time.
+
+        Failed datasets also report how many times in a row they failed and in how many seconds they are retried.
+        '''
+        readiness = {name: {'state': self.dataset_states.get(name), 'seconds': self.build_timings.get(name)}
+                     for name in self.DATASETS}
+        for name, failure in self.failed_builds.items():
+            readiness[name].update(attempts=failure['attempts'], retry_in=round(max(failure['retry_at'] - time.monotonic(), 0), 1))
+        return readiness
+
+    def refresh(self, *names):
+        '''Forget the given datasets (all by default) so that the next read rebuilds them and what derives from them.'''
+        for name in names or self.DATASETS:
+            self.dataset_versions.pop(name, None)
+            self.failed_builds.pop(name, None)
+
+    # Processed-state snapshot
+    def is_persistent(self, name):
+        # Only datasets whose sources are versioned by content can be restored; a plain URL says nothing
+        # about what it serves now, so what is fetched from one is rebuilt by every process
+        builder, dependencies, source = self.DATASETS[name]
+        location = getattr(self, source) if source else None
+        if isinstance(location, str) and '://' in location:
+            return False
+        return all(self.is_persistent(dependency) for dependency in dependencies)
+
+    def snapshot_key(self):
+        # Only the sources themselves and the code processing them: nothing is built to compute the key
+        return {'code': processing_code_version(),
+                'sources': {name: self.location_version(name) for name, (builder, dependencies, source) in self.DATASETS.items()
+                            if source and self.is_persistent(name)}}
+
+    def save_snapshot(self):
+        '''Write every built persistent dataset and the derived results to ``snapshot_path``; returns whether it did.
+
+        Each dataset is saved with the version of the sources it was built from, which is what decides on
+        loading whether it can be restored; the file header is keyed by the current source versions and the
+        version of the processing code, a change to which invalidates the whole snapshot. MAPPED_DATASETS are
+        saved as their version only.
+
+        Worker processes share the file: one writes at a time and the others skip, as does a process whose
+        datasets are already in the snapshot on disk (another worker wrote the same state before it).
+        '''
+        versions = {name: self.dataset_versions[name] for name in self.DATASETS if self.is_persistent(name) and self.is_built(name)}
+        datasets = {name: (version, None if name in self.MAPPED_DATASETS else self.datasets[name]) for name, version in versions.items()}
+        state = {'datasets': datasets, 'derived': dict(self.derived_cache), 'dropped_columns': self.dropped_columns}
+        # Compared the way the header stores it, through JSON (tuples come back as lists)
+        key = json.loads(json.dumps(dict(self.snapshot_key(), datasets=versions), default=str))
+        started = time.perf_counter()
+        with storage.snapshot_lock(self.snapshot_path) as locked:
+            if not locked or storage.read_snapshot_key(self.snapshot_path) == key:
+                self.snapshot_versions = versions
+                return False
+            storage.write_snapshot(self.snapshot_path, key, state)
+        self.snapshot_versions = versions
+        logger.info('Snapshot of %d datasets written in %.2fs', len(datasets), time.perf_counter() - started)
+        return True
+
+    def is_built(self, name):
+        return self.dataset_states.get(name) == 'ready' and self.datasets.get(name) is not None
+
+    def save_snapshot_after(self, futures):
+        for future in futures:
+            future.exception()
+        versions = {name: self.dataset_versions[name] for name in self.DATASETS
+                    if self.is_persistent(name) and self.is_built(name)}
+        # Nothing new was built since the snapshot was loaded or last written
+        if versions != self.snapshot_versions:
+            self.save_snapshot()
+
+    def load_snapshot(self):
+        '''Restore the datasets in ``snapshot_path`` whose sources are unchanged; returns how many were.
+
+        Datasets come back in declaration order, sources before what derives from them, and a derived one
+        only if everything it derives from was restored at the version it was built from. MAPPED_DATASETS are
+        built (their column stores mapped) rather than unpickled. The rest are left for the normal build.
+        '''
+        started = time.perf_counter()
+        key = self.snapshot_key()
+        sources = key['sources']
+        snapshot = storage.read_snapshot(self.snapshot_path, key_matches=lambda saved: saved.get('code') == key['code'] and any(
+            saved['sources'].get(name) == version for name, version in sources.items()))
+        if snapshot is None:
+            return 0
+        state = snapshot[1]
+        restored = {}
+        for name, (builder, dependencies, source) in self.DATASETS.items():
+            if name not in state['datasets'] or not self.is_persistent(name):
+                continue
+            version, value = state['datasets'][name]
+            if not all(dependency in restored for dependency in dependencies):
+                continue
+            current = tuple(restored[dependency] for dependency in dependencies)
+            if source:
+                current = (sources[name],) + current if dependencies else sources[name]
+            if version != current:
+                continue
+            if name in self.MAPPED_DATASETS:
+                # Built from its column store as usual, which leaves it versioned like any other build
+                self.dataset(name)
+                if self.dataset_versions.get(name) == version:
+                    restored[name] = version
+                continue
+            with self.locks[name]:
+                self.datasets[name] = value
+                self.dataset_versions[name] = version
+                self.dataset_states[name] = 'ready'
+                self.build_timings[name] = 0.0
+            restored[name] = version
+        # Derived results are checked against their datasets' versions whenever they are used
+        self.derived_cache.update(state['derived'])
+        self.dropped_columns.update(state['dropped_columns'])
+        self.snapshot_versions = restored
+        logger.info('Restored %d datasets from snapshot in %.2fs', len(restored), time.perf_counter() - started)
+        return len(restored)
+
+    def fetch_netlist_data(self):
+        if self.netlist_source is None:
+            return None
+        try:
+            self.netlist_df = netlist.process_netlist_data(netlist.parse_netlist_text(self.netlist_source.read().decode()))
+        except Exception as e:
+            logger.exception('Failed to load or process netlist data: %s', e)
 
     def fetch_whois_ipv6_data(self):
         try:
-            self.whoisv6_df = pd.read_csv(self.whoisv6_allocation_csv, low_memory=False)
-            expected_columns = ['Registry','Code','Type','Start','Value','Date','Status','Extensions','Prefix','ISO-3','Country','Year']
-            if not all(col in self.whoisv6_df.columns for col in expected_columns):
+            # Memory-mapped from the prebuilt column store: typed already, and shared between worker processes
+            whoisv6_df = storage.read_dataset_mapped(self.whoisv6_allocation_csv)
+            expected_columns = ['Registry', 'Type', 'Start', 'Value', 'Date', 'Status', 'Prefix', 'ISO-3', 'Country', 'Year']
+            if not all(col in whoisv6_df.columns for col in expected_columns):
                 raise ValueError('WHOIS IPv6 data missing expected columns.')
-            self.whoisv6_df['Date'] = pd.to_datetime(self.whoisv6_df['Date'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-            self.whoisv6_df['Year'] = self.whoisv6_df['Year'].astype(int)
+            self.whoisv6_df = self.compact_whois_df('whois_ipv6', whoisv6_df, WHOIS_IPV6_SCHEMA)
             #total_fields = self.whoisv6_df.shape[0] * self.whoisv6_df.shape[1]  # where df.shape[0] is the number of rows and df.shape[1] is the number of columns
-            self.whoisv6_df['formatted_ipv6_count'] = self.whoisv6_df['Prefix'].apply(self.calculate_and_format_ipv6_addresses)
+            self.add_ipv6_count_columns(self.whoisv6_df)
             #print(self.whoisv6_df.head(20))
         except Exception as e:
-            print(f'Failed to load or process WHOIS IPv6 data: {e}')
+            logger.exception('Failed to load or process WHOIS IPv6 data: %s', e)
+
+    def add_ipv6_count_columns(self, df):
+        '''Block size columns for each IPv6 allocation, looked up from its prefix in one step.
+
+        ``formatted_ipv6_count`` is the display label and ``ipv6_count`` the number of addresses (a power of
+        two, so exact as a float) for sorting by real size; ``log10_ipv6_count`` goes with it.
+        '''
+        table = ipv6_prefix_table()
+        prefixes = np.clip(df['Prefix'].to_numpy(dtype=np.int64, na_value=ip_math.IPV6_BITS), 0, ip_math.IPV6_BITS)
+        label_codes, labels = pd.factorize(table['label'])
+        df['formatted_ipv6_count'] = pd.Categorical.from_codes(label_codes[prefixes], labels)
+        df['ipv6_count'] = table['count'].to_numpy()[prefixes]
+        df['log10_ipv6_count'] = table['log10'].to_numpy()[prefixes]
+        return df
 
     def fetch_json_data(self):
-        response = requests.get(self.json_url)
-        if response.status_code == 200:
-            data = response.json()
-            print('Data fetched successfully')
-            self.json_df = self.create_and_process_dataframe(self.transform_json_data(data))
-            self.enhance_dataframe(self.json_df)
-            if not self.json_df.empty:
-                print('DataFrame processed and populated.')
-            else:
-                print('DataFrame is empty after processing.')
+        try:
+            data = self.json_source.read_json()
+        except (OSError, ValueError) as e:
+            logger.error('Failed to fetch data: %s', e)
+            return
+        logger.info('Data fetched successfully')
+        self.json_df = self.create_and_process_dataframe(self.transform_json_data(data))
+        self.enhance_dataframe(self.json_df)
+        coverage = self.rir_attribution_report()
+        if coverage['unmapped']:
+            logger.warning('RIR map covers %.0f%% of the pool countries; no delegations for %d',
+                           coverage['covered'] * 100, len(coverage['unmapped']))
+        if self.export_sink is not None:
+            self.export_sink.submit('json_df', self.json_df)
+        if not self.json_df.empty:
+            logger.info('DataFrame processed and populated.')
         else:
-            print('Failed to fetch data: HTTP', response.status_code)
+            logger.warning('DataFrame is empty after processing.')
 
     def load_population_data(self):
         try:
@@ -65,22 +432,185 @@ class DataHandler:
 
             return pop_df_long
         except Exception as e:
-            print(f'Error loading population data: {e}')
+            logger.exception('Error loading population data: %s', e)
             return None
 
     def fetch_whois_ipv4_data(self):
         try:
-            self.whois_ipv4_df = pd.read_csv(self.whois_v4_pop_csv, low_memory=False)
+            whois_ipv4_df = storage.read_dataset_mapped(self.whois_v4_pop_csv)
             expected_columns = ['ISO-3', 'Year', 'Registry', 'Type', 'Start', 'Value', 'Date', 'Status', 'Prefix', 'Country', 'Population']
-            if not all(col in self.whois_ipv4_df.columns for col in expected_columns):
+            if not all(col in whois_ipv4_df.columns for col in expected_columns):
                 raise ValueError('WHOIS IPv4 data missing expected columns.')
-            self.whois_ipv4_df['Date'] = pd.to_datetime(self.whois_ipv4_df['Date'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-            self.whois_ipv4_df['Year'] = self.whois_ipv4_df['Year'].astype(int)
-            self.whois_ipv4_df['Population'] = pd.to_numeric(self.whois_ipv4_df['Population'], errors='coerce')
+            # Files built before the CIDR split still hold ranges that are not a single prefix
+            values = whois_ipv4_df['Value']
+            if (~ip_math.is_power_of_two(values) & (values > 0)).any():
+                whois_ipv4_df = ip_math.explode_ipv4_cidrs(whois_ipv4_df)
+            self.whois_ipv4_df = self.compact_whois_df('whois_ipv4', whois_ipv4_df, WHOIS_IPV4_SCHEMA)
             #print('WHOIS IPv4 data loaded successfully.')
             return self.whois_ipv4_df
         except Exception as e:
-            print(f'Failed to load or process WHOIS IPv4 data: {e}')
+            logger.exception('Failed to load or process WHOIS IPv4 data: %s', e)
+
+    def compact_whois_df(self, name, df, schema):
+        '''Keep only the columns in ``schema``, cast to their compact types.
+
+        The frame is rebuilt column by column, which keeps the memory-mapped columns that already have the
+        right type mapped instead of copying them like a column selection would.
+        '''
+        # Integer addresses come from ingest when the dataset has them, otherwise they are derived here
+        if schema.get('End') == 'uint32':
+            addresses = ip_math.ipv4_address_columns(df).rename(columns={'StartInt': 'Start', 'EndInt': 'End'})
+        else:
+            addresses = ip_math.ipv6_address_columns(df)
+        self.dropped_columns[name] = {column: int(df[column].memory_usage(deep=True, index=False))
+                                      for column in df.columns if column not in schema and column not in ip_math.IPV4_INT_COLUMNS}
+        columns = {}
+        for column in schema:
+            if column in addresses.columns:
+                columns[column] = addresses[column]
+            elif column in df.columns:
+                columns[column] = df[column]
+        return storage.apply_schema(pd.DataFrame(columns, copy=False), schema)
+
+    def memory_report(self):
+        '''Per-column bytes of the WHOIS tables before (object strings, int64) and after the compact schema.
+
+        Mapped columns count at their full size although their pages are shared between processes.
+        '''
+        rows = []
+        for name, df in (('whois_ipv4', self.whois_ipv4_df), ('whois_ipv6', self.whoisv6_df)):
+            if df is None:
+                continue
+            for column in df.columns:
+                series = df[column]
+                if column in ('Start', 'End') and series.dtype == 'uint32':
+                    loose = pd.Series(ip_math.int_to_ipv4(series))
+                elif isinstance(series.dtype, pd.CategoricalDtype):
+                    loose = series.astype(object)
+                elif pd.api.types.is_integer_dtype(series.dtype):
+                    loose = series.astype('int64')
+                else:
+                    loose = series
+                rows.append({'dataset': name, 'column': column, 'dtype': str(series.dtype),
+                             'bytes_before': int(loose.memory_usage(deep=True, index=False)),
+                             'bytes_after': int(series.memory_usage(deep=True, index=False))})
+            for column, nbytes in self.dropped_columns.get(name, {}).items():
+                rows.append({'dataset': name, 'column': column, 'dtype': 'dropped', 'bytes_before': nbytes, 'bytes_after': 0})
+        report = pd.DataFrame(rows, columns=['dataset', 'column', 'dtype', 'bytes_before', 'bytes_after'])
+        for name, totals in report.groupby('dataset')[['bytes_before', 'bytes_after']].sum().iterrows():
+            logger.info('%s: %.1f MB -> %.1f MB', name, totals['bytes_before'] / 1e6, totals['bytes_after'] / 1e6)
+        return report
+
+    # Parameterised results derived from the WHOIS tables
+    def cached_derived(self, key, build, dependencies=('whois_ipv4_df',)):
+        # Kept until a different version of one of the datasets they are derived from is loaded
+        version = tuple(self.current_version(dependency) for dependency in dependencies)
+        cached = self.derived_cache.get(key)
+        if cached is None or cached[0] != version:
+            cached = self.derived_cache[key] = (version, build())
+        return cached[1]
+
+    def country_year_cube(self):
+        '''Dense [country, year, metric] cube of the WHOIS tables, see CountryYearCube for the metrics.'''
+        return self.cached_derived(('cube',), lambda: CountryYearCube.from_frames(self.whois_ipv4_df, self.whoisv6_df),
+                                   dependencies=('whois_ipv4_df', 'whoisv6_df'))
+
+    def coalesced_ranges(self, by='ISO-3'):
+        '''Union of the WHOIS v4 allocations per ``by`` group (ISO-3 or Registry): one row per merged range.
+
+        Overlapping and adjacent blocks of a group are merged, so ``Addresses`` counts every address once.
+        '''
+        def build():
+            df = self.whois_ipv4_df[self.whois_ipv4_df['Value'] > 0]
+            groups = df[by].astype('category')
+            group_codes, starts, ends = ip_math.coalesce_ranges(df['Start'], df['End'], groups.cat.codes)
+            return pd.DataFrame({
+                by: pd.Categorical.from_codes(group_codes, groups.cat.categories),
+                'Start': starts,
+                'End': ends,
+                'Addresses': ends.astype('int64') - starts.astype('int64') + 1,
+            })
+        return self.cached_derived(('ranges', by), build)
+
+    def address_footprint(self, by='ISO-3'):
+        '''Unique addresses held per ``by`` group next to the plain Value sum, which counts overlaps twice.'''
+        def build():
+            ranges = self.coalesced_ranges(by)
+            footprint = ranges.groupby(by, observed=True).agg(**{
+                'Unique Addresses': ('Addresses', 'sum'),
+                'Ranges': ('Addresses', 'size'),
+            })
+            allocated = self.whois_ipv4_df.groupby(by, observed=True)['Value'].sum().astype('int64')
+            footprint['Allocated Addresses'] = allocated.reindex(footprint.index, fill_value=0)
+            footprint['Double Counted'] = footprint['Allocated Addresses'] - footprint['Unique Addresses']
+            return footprint.reset_index()
+        return self.cached_derived(('footprint', by), build)
+
+    # Address lookups
+    def build_address_indexes(self):
+        '''Sorted interval indexes over the loaded allocations (the address_indexes dataset).'''
+        indexes = {}
+        if self.whois_ipv4_df is not None:
+            indexes['whois_ipv4'] = ip_lookup.AddressIndex.from_ipv4(self.whois_ipv4_df, columns=LOOKUP_COLUMNS)
+        if self.whoisv6_df is not None:
+            indexes['whois_ipv6'] = ip_lookup.AddressIndex.from_ipv6(self.whoisv6_df, columns=LOOKUP_COLUMNS)
+        if self.netlist_df is not None:
+            indexes['netlist'] = ip_lookup.AddressIndex.from_ipv4(self.netlist_df, columns=NETLIST_LOOKUP_COLUMNS)
+        for name, index in indexes.items():
+            if index.overlaps:
+                logger.info('%s: %d overlapping ranges', name, index.overlaps)
+        return indexes
+
+    def lookup_many(self, addresses):
+        '''Allocation holding each address, one row per address in input order (missing values where none does).
+
+        ``addresses`` may mix IPv4 and IPv6 strings, or be IPv4 integers. ``Row`` is the matching row's label in
+        whois_ipv4_df / whoisv6_df; netlist matches (IPv4 only) come in ``Netlist ...`` columns.
+        '''
+        indexes = self.address_indexes
+        is_v6, v4, v6 = ip_lookup.parse_addresses(addresses)
+        parts = []
+        if len(v4) and 'whois_ipv4' in indexes:
+            v4_rows = indexes['whois_ipv4'].lookup_many(v4)
+            if 'netlist' in indexes:
+                netlist_rows = indexes['netlist'].lookup_many(v4).add_prefix('Netlist ')
+                v4_rows = pd.concat([v4_rows, netlist_rows], axis=1)
+            v4_rows.index = np.flatnonzero(~is_v6)
+            parts.append(v4_rows)
+        if len(v6[0]) and 'whois_ipv6' in indexes:
+            v6_rows = indexes['whois_ipv6'].lookup_many(v6)
+            v6_rows.index = np.flatnonzero(is_v6)
+            parts.append(v6_rows)
+        if not parts:
+            result = pd.DataFrame(index=range(len(is_v6)), columns=['Row'] + LOOKUP_COLUMNS)
+        elif len(parts) == 1 and len(parts[0]) == len(is_v6):
+            # A single-family batch is already in input order
+            result = parts[0]
+        else:
+            result = pd.concat(parts).reindex(range(len(is_v6)))
+        result.insert(0, 'Family', pd.Categorical.from_codes(is_v6.astype(np.int8), ['ipv4', 'ipv6']))
+        return result
+
+    def lookup(self, address):
+        '''JSON-ready description of the allocation holding ``address``, or None if no allocation does.
+
+        Raises ValueError for anything that is not an IPv4 or IPv6 address.
+        '''
+        address = str(ipaddress.ip_address(address.strip()))
+        match = self.lookup_many([address])
+        if pd.isna(match['Row'].iloc[0]):
+            return None
+        result = json.loads(match.to_json(orient='records', date_format='iso'))[0]
+        result['ip'] = address
+        row = int(match['Row'].iloc[0])
+        if result['Family'] == 'ipv6':
+            allocation = self.whoisv6_df.loc[row]
+            result['Start'] = str(allocation['Start'])
+            result['End'] = ip_math.int_to_ipv6([allocation['EndHi']], [allocation['EndLo']])[0]
+        else:
+            allocation = self.whois_ipv4_df.loc[row]
+            result['Start'], result['End'] = ip_math.int_to_ipv4([allocation['Start'], allocation['End']])
+        return result
 
     # JSON_DF
     def transform_json_data(self, json_data):
@@ -95,6 +625,11 @@ class DataHandler:
         json_df = pd.DataFrame(transformed_data)
         json_df['ipv4'] = pd.to_numeric(json_df['ipv4'], errors='coerce')
         json_df['pop'] = pd.to_numeric(json_df['pop'], errors='coerce')
+        # IPv6 totals are exact multiples of 2**64 far beyond int64; they are kept as an exact /64 count
+        # and a float64 address count for plotting (an object column of big ints cannot round-trip JSON)
+        json_df['ipv6_64s'] = ip_math.ipv6_subnet_counts(json_df['ipv6'])
+        json_df['ipv6'] = json_df['ipv6_64s'] * float(2 ** 64)
+        json_df['pcv6'] = pd.to_numeric(json_df['pcv6'], errors='coerce')
         #json_df['ipv6'] = pd.to_numeric(json_df['ipv6'], errors='coerce').astype('int64')
         #print(json_df['ipv6'])
 
@@ -106,10 +641,14 @@ class DataHandler:
         # print(json_df.columns.tolist(), 'data handler enhance_dataframe function')
         # print(json_df.dtypes, 'data handler enhance_dataframe function')
         # print(json_df.describe, 'data handler enhance_dataframe function')
-        json_df['iso_alpha_3'] = json_df['country_code'].apply(self.alpha2_to_alpha3)
-        json_df['ipv4_grouping'] = json_df['ipv4'].apply(self.assign_ipv4_grouping)
-        json_df['RIR'] = json_df['iso_alpha_3'].apply(self.alpha3_to_rir)
+        # Placeholder codes (AP, EU, ZZ, blank) stay 'Unknown' here, as they always have in the charts
+        json_df['iso_alpha_3'] = country_codes.alpha2_to_alpha3(json_df['country_code'], unknown='Unknown', replacements=False).astype(str)
+        json_df['ipv4_grouping'] = BINNINGS['ipv4'].assign(json_df['ipv4'])
+        # Plain strings like iso_alpha_3: the sunburst charts build their paths from this frame directly
+        json_df['RIR'] = rir_attribution.attribute(json_df['iso_alpha_3'], self.rir_map['RIR']).astype(str)
         json_df['log_ipv4'] = np.log10(json_df['ipv4'].where(json_df['ipv4'] > 0, np.nan) + 1)
+        # Countries without IPv6 get log10(1.1), just above zero, so they still show on the log scales
+        json_df['log_ipv6'] = np.log10(json_df['ipv6'].where(json_df['ipv6'] > 0, 1.1))
         #json_df['ipv6'] = json_df['ipv6'].apply(lambda x: x if x > 0 else 1.26)
         #json_df['ipv6'] = json_df['ipv6'].astype(str)
         #json_df['log_ipv6'] = np.log10(json_df['ipv6'])
@@ -126,34 +665,37 @@ class DataHandler:
         # Count the number of zero or negative values
         #invalid_count = invalid_values.sum()
         #print(f"There are {invalid_count} zero or negative values in the 'log_ipv6' column.")
-        json_df.to_csv("json_df.csv", index=False)
         return json_df
 
     def create_time_series_df(self):
-        # Starting with the original DataFrame
-        ipv4_ts_df = self.whois_ipv4_df
-        
-        # Grouping by Country and Year and aggregating necessary fields
-        ipv4_ts_df = ipv4_ts_df.groupby(['Country', 'Year']).agg({
-            'ISO-3': 'first', 
-            'Registry': 'first', 
-            'Date': 'first',
-            'Value': 'sum',
-            'Population': 'first',
-            'GDPPerCap': 'first'
-        }).reset_index()
-
-        # Dropping unnecessary columns
-        ipv4_ts_df.drop(columns=['Registry', 'Date'], axis=1, inplace=True)
+        # One row per country and year with IPv4 delegations, read off the country x year cube instead of
+        # grouping the WHOIS table again
+        cube = self.country_year_cube()
+        country_positions, year_positions = np.nonzero(cube.metric('delegations'))
+
+        def cells(metric):
+            return cube.metric(metric)[country_positions, year_positions]
+
+        iso3 = cube.countries[country_positions]
+        country_names = self.whois_ipv4_df[['ISO-3', 'Country']].drop_duplicates('ISO-3')
+        country_names = country_names.set_index(country_names['ISO-3'].astype(object))['Country'].astype(object)
+        ipv4_ts_df = pd.DataFrame({
+            'Country': pd.Categorical(country_names.reindex(iso3).to_numpy()),
+            'Year': cube.years[year_positions].astype('int16'),
+            'ISO-3': pd.Categorical(iso3),
+            'Value': cells('allocated').astype('int64'),
+            'Population': cells('population'),
+            'GDPPerCap': cells('gdp_per_capita'),
+        })
 
         # Convert ISO-3 to RIR if needed
-        ipv4_ts_df['RIR'] = ipv4_ts_df['ISO-3'].apply(self.alpha3_to_rir)
+        ipv4_ts_df['RIR'] = rir_attribution.attribute(ipv4_ts_df['ISO-3'], self.rir_map['RIR'])
         
-        # Ensure data is sorted by Country and Year for correct cumulative calculation
+        # Ensure data is sorted by Country and Year, as the animation frames expect
         ipv4_ts_df.sort_values(by=['Country', 'Year'], ascending=[True, True], inplace=True)
 
-        # Calculate cumulative sum of 'Value' within each 'Country' group
-        ipv4_ts_df['Cumulative Value'] = ipv4_ts_df.groupby('Country')['Value'].cumsum()
+        # Running total of 'Value' per country, which the cube already holds for every year
+        ipv4_ts_df['Cumulative Value'] = cells('cumulative').astype('int64')[ipv4_ts_df.index]
         ipv4_ts_df['Size'] = np.sqrt(ipv4_ts_df['Cumulative Value'])
         # Assigning back to class attribute if needed
         self.ipv4_ts_df = ipv4_ts_df
@@ -161,72 +703,47 @@ class DataHandler:
         # Optionally, return the DataFrame
         return ipv4_ts_df
 
+    def build_rir_map(self):
+        '''ISO-3 -> RIR table: the registry holding most of each country's v4 and v6 delegations.
+
+        Columns are those of rir_attribution.majority_registry plus ``RIR``, the chart label as a categorical.
+        Countries delegated to by several registries are reported, together with ties.
+        '''
+        table = rir_attribution.majority_registry(rir_attribution.registry_votes([self.whois_ipv4_df, self.whoisv6_df]))
+        table['RIR'] = rir_attribution.rir_mapping(table)
+        report = rir_attribution.attribution_report(table)
+        logger.info('RIR map: %d countries, %d delegated to by several registries%s', report['countries'], len(report['conflicts']),
+                    f", ties broken alphabetically for {', '.join(report['ties'])}" if report['ties'] else '')
+        return table
+
+    def rir_attribution_report(self):
+        '''Coverage of the pool data's countries by the RIR map, and the countries with conflicting registries.'''
+        return rir_attribution.attribution_report(self.rir_map, self.json_df['iso_alpha_3'])
+
     def create_allocation_bar_df(self):
         df = self.whois_ipv4_df
         #df = df[df['Registry'] != 'none']
-        columns_to_drop = ['Population', 'Year', 'ISO-3', 'Date']
-        allocation_df = df.drop(columns=columns_to_drop)
+        # Only the three columns the chart needs are carried through the filter
+        allocation_df = df[['Registry', 'Status', 'Value']]
         filtered_df = allocation_df[allocation_df['Status'].isin(['allocated', 'assigned'])]
-        allocation_df = filtered_df.groupby(['Registry', 'Status'], as_index=False)['Value'].sum()
+        allocation_df = filtered_df.groupby(['Registry', 'Status'], as_index=False, observed=True)['Value'].sum()
         return allocation_df
 
 
     @staticmethod
     def calculate_prefix(value):
-        if value == 1:
-            return 32
-        prefix = 32 - int(np.log2(value))
-        return prefix
+        # Works on a single value or a whole column at once
+        prefix = ip_math.calculate_prefix(value)
+        return int(prefix) if np.ndim(prefix) == 0 else prefix
 
     @staticmethod
     def alpha2_to_alpha3(alpha_2):
-        if alpha_2 == 'XK':
-            return 'XKX'
-        try:
-            country = pycountry.countries.get(alpha_2=alpha_2)
-            return country.alpha_3
-        except AttributeError:
-            return 'Unknown'
+        return country_codes.country_crosswalk(replacements=False)['ISO-3'].get(alpha_2, 'Unknown')
 
-    @staticmethod
-    def alpha3_to_rir(alpha_3):
-        rir_by_region = {
-        'AFRINIC': ['DZA', 'AGO', 'BEN', 'BWA', 'BFA', 'BDI', 'CMR', 'CPV', 'CAF', 'COD', 'TCD', 'COM', 'COG', 'DJI', 'EGY', 'GNQ', 'ERI', 'ETH', 'GAB', 'GMB', 'GHA', 'GIN', 'GNB', 'CIV', 'KEN', 'LSO', 'LBR', 'LBY', 'MDG', 'MWI', 'MLI', 'MRT', 'MUS', 'MYT', 'MAR', 'MOZ', 'NAM', 'NER', 'NGA', 'REU', 'RWA', 'SHN', 'STP', 'SEN', 'SYC', 'SLE', 'SOM', 'ZAF', 'SSD', 'SDN', 'SWZ', 'TZA', 'TGO', 'TUN', 'UGA', 'ZMB', 'ZWE', 'ESH'],
-        'APNIC': ['AFG', 'AUS', 'BGD', 'BTN', 'BRN', 'KHM', 'CHN', 'CXR', 'CCK', 'COK', 'IOT', 'FJI', 'HKG', 'IND', 'IDN', 'JPN', 'KAZ', 'PRK', 'KOR', 'KGZ', 'LAO', 'MAC', 'MYS', 'MDV', 'MNG', 'MMR', 'NPL', 'NCL', 'NZL', 'NIU', 'NFK', 'PAK', 'PLW', 'PNG', 'PHL', 'PCN', 'SGP', 'SLB', 'LKA', 'TWN', 'TJK', 'THA', 'TLS', 'TKL', 'TON', 'TUV', 'VUT', 'VNM', 'WLF', 'ASM', 'GUM', 'KIR', 'MHL', 'FSM', 'NRU', 'PLW', 'PYF', 'PNY', 'WSM'],
-        'ARIN': ['AIA', 'ATG', 'ABW', 'BHS', 'BRB', 'BLM', 'BMU', 'BES', 'CAN', 'CYM', 'CUW', 'DMA', 'DOM', 'GLP', 'GRD', 'GRL', 'GTM', 'HTI', 'HND', 'JAM', 'MTQ', 'MEX', 'MSR', 'SXM', 'KNA', 'LCA', 'MAF', 'MNP', 'SPM', 'VCT', 'TTO', 'TCA', 'USA', 'VGB', 'VIR', 'PRI'],
-        'LACNIC': ['ARG', 'BOL', 'BRA', 'BLZ', 'CHL', 'COL', 'CRI', 'CUB', 'CUW', 'DMA', 'ECU', 'SLV', 'FLK', 'GUF', 'GTM', 'GUY', 'HND', 'JAM', 'MTQ', 'MEX', 'NIC', 'PAN', 'PRY', 'PER', 'PRI', 'BLM', 'KNA', 'LCA', 'SPM', 'VCT', 'SGS', 'SUR', 'TTO', 'URY', 'VEN', 'BES', 'SXM', 'ABW'],
-        'RIPE NCC': ['ALA', 'ALB', 'AND', 'ARM', 'AUT', 'AZE', 'BHR', 'BLR', 'BEL', 'BIH', 'BGR', 'HRV', 'CYP', 'CZE', 'DNK', 'EST', 'FRO', 'FIN', 'FRA', 'GEO', 'DEU', 'GIB', 'GRC', 'GGY', 'VAT', 'HUN', 'ISL', 'IRN', 'IRQ', 'IRL', 'IMN', 'ISR', 'ITA', 'JEY', 'JOR', 'KWT', 'LVA', 'LBN', 'LIE', 'LTU', 'LUX', 'MLT', 'MDA', 'MCO', 'MNE', 'NLD', 'MKD', 'NOR', 'OMN', 'PSE', 'POL', 'PRT', 'QAT', 'ROU', 'RUS', 'SMR', 'SAU', 'SRB', 'SVK', 'SVN', 'ESP', 'SJM', 'SWE', 'CHE', 'SYR', 'TUR', 'UKR', 'UZB', 'ARE', 'GBR', 'YEM', 'KOS', 'TKM', 'XKX', ],
-        }
-        for rir, countries in rir_by_region.items():
-            if alpha_3 in countries:
-                return rir
-        return 'Unknown'
-    
-    @staticmethod
-    def assign_ipv4_grouping(value):
-        if value <= 10000:
-            return '0-10k'
-        elif value <= 100000:
-            return '10k-100k'
-        elif value <= 1000000:
-            return '100k-1M'
-        elif value <= 10000000:
-            return '1M-10M'
-        elif value <= 100000000:
-            return '10M-100M'
-        elif value <= 1000000000:
-            return '100M-1B'
-        else:
-            return '1B+'
-    
     @staticmethod
     def alpha3_to_country_name(code):
-        '''Convert ISO-3166-1 alpha-3 code to a country name using the pycountry library.'''
-        country = pycountry.countries.get(alpha_3=code)
-        if country:
-            return country.name
-        else:
-            return 'Unknown'
+        '''Convert ISO-3166-1 alpha-3 code to a country name; only the codes pycountry knows have one.'''
+        return country_codes.alpha3_names(special_cases=False, replacements=False).get(code, 'Unknown')
     
     @staticmethod    
     def calculate_and_format_ipv6_addresses(prefix_length):
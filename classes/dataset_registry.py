@@ -0,0 +1,67 @@
+import hashlib
+
+from data_processing.frame_cache import FrameCache
+
+
+class DatasetRegistry:
+    '''Server-side home of the datasets the dcc.Stores used to carry as JSON.
+
+    A store now holds a token, ``{'dataset': <id>, 'version': <version>}``, a few bytes instead of the
+    whole frame. Callbacks hand the token to ``resolve`` for the DataFrame itself. The version changes
+    whenever the underlying DataHandler dataset is rebuilt, so a refreshed dataset still reaches the
+    callbacks as a new store value.
+
+    Frames the callbacks derive from a dataset the same way every time (the formatted grid tables) are
+    built once per dataset version through ``derived`` and kept in a FrameCache.
+    '''
+
+    # store dataset id -> DataHandler dataset
+    DATASETS = {
+        'ipv4': 'json_df',
+        'whois_ipv4': 'whois_ipv4_df',
+        'whois_ipv6': 'whoisv6_df',
+        'ipv4_time_series': 'ipv4_ts_df',
+        'v4_allocation': 'allocation_df',
+    }
+
+    def __init__(self, data_handler, frames=None):
+        self.data_handler = data_handler
+        self.frames = frames if frames is not None else FrameCache()
+
+    def version(self, dataset_id):
+        name = self.DATASETS[dataset_id]
+        # Dataset versions are tuples of source versions for derived datasets; a short hash fits a store
+        version = self.data_handler.current_version(name)
+        return hashlib.sha1(repr(version).encode()).hexdigest()[:12]
+
+    def token(self, dataset_id):
+        return {'dataset': dataset_id, 'version': self.version(dataset_id)}
+
+    def is_token(self, token):
+        return isinstance(token, dict) and token.get('dataset') in self.DATASETS and 'version' in token
+
+    def resolve(self, token):
+        '''The DataFrame a store token stands for.
+
+        This is the frame the DataHandler holds (the WHOIS tables memory-mapped), not a copy: callers must not
+        modify it, and copy it first where they do. Filtering, grouping and the like already return new frames.
+        A token of an older version resolves to the current frame; the store picks up the new token the next
+        time it is updated.
+        '''
+        if not self.is_token(token):
+            raise KeyError(f'Not a dataset token: {token!r}')
+        df = self.data_handler.dataset(self.DATASETS[token['dataset']])
+        if df is None:
+            raise LookupError(f"Dataset {token['dataset']} is not available")
+        return df
+
+    def derived(self, token, view, build):
+        '''``build(df)`` of the frame ``token`` resolves to, cached until that dataset is rebuilt.
+
+        ``view`` names what ``build`` makes of the dataset, so one dataset can have several derived frames.
+        The cached frame is shared between callers like the resolved one and must not be modified either.
+        '''
+        # Version first: a rebuild in between then only costs a second build, never a stale frame kept as new
+        version = self.version(token['dataset'])
+        df = self.resolve(token)
+        return self.frames.get((token['dataset'], view), version, lambda: build(df))
@@ -63,7 +63,7 @@ class DynamicCardHandler:
         ])
 
     def get_content(self, active_dataset, active_tab, allocation_version):
-        if not active_dataset or 'data' not in active_dataset:
+        if not active_dataset or not self.data_handler.registry.is_token(active_dataset):
             return 'Please select a dataset and ensure data is loaded.'
         dataset = active_dataset.get('dataset')
 
@@ -286,6 +286,11 @@ class DynamicCardHandler:
                         item_id='UNVSALLOCATED',
                         title='Allocated vs Assigned'
                     ),
+                    dbc.AccordionItem(
+                        'This chart compares each RIR\'s summed allocations with the unique address space they cover, once overlapping and adjacent blocks are merged',
+                        item_id='FOOTPRINT',
+                        title='Unique Address Space per RIR'
+                    ),
                     dbc.AccordionItem(
                         'This chart displays the cumulative distribution of IPv4 addresses between the countries within the RIPE NCC region.',
                         item_id='RIPENCC',
@@ -2,7 +2,6 @@ import plotly.express as px
 import numpy as np
 import plotly.graph_objs as go
 import pandas as pd
-from io import StringIO
 
 class PieChartHandler:
     def __init__(self, data_handler, hover_template_handler):
@@ -11,7 +10,7 @@ class PieChartHandler:
 
     def calculate_rir_percentages(self):
         df = self.data_handler.json_df
-        return df.groupby('RIR')['percentv4'].sum().reset_index()
+        return df.groupby('RIR', observed=True)['percentv4'].sum().reset_index()
 
     def get_data_by_rir(self, rir):
         df = self.data_handler.json_df
@@ -60,7 +59,6 @@ class PieChartHandler:
         allocation_version = allocation_version.get('allocation_type')
         #print(allocation_version, 'in generate figurte ')
         #print(allocation_version)
-        data_json_stream = StringIO(active_dataset['data'])
         #hover_template = self.hover_template_handler.get_pie_hover_template(active_item)
         #customdata = self.populate_custom_data(active_item, active_dataset)
         #hover_template = self.hover_template_handler.get_pie_hover_template(active_item, customdata)
@@ -104,7 +102,7 @@ class PieChartHandler:
             #print('this works')
             if active_item == 'SUNBURSTV6':
                 #print('this also works')
-                df = pd.read_json(data_json_stream, orient='split')
+                df = self.data_handler.registry.resolve(active_dataset)
                 #print(allocation_version, active_item, 'in pie chart conditional')
 
                 sun_fig = px.sunburst(
@@ -118,12 +116,12 @@ class PieChartHandler:
 
                 return sun_fig
             elif active_item == 'RIRV6':
-                df = pd.read_json(data_json_stream, orient='split')
+                df = self.data_handler.registry.resolve(active_dataset)
                 values = 'percentv6'
                 names = 'RIR'
             
             elif active_item in ['RIPENCCV6', 'ARINV6', 'AFRINICV6', 'APNICV6', 'LACNICV6']:
-                #df = pd.read_json(data_json_stream, orient='split')
+                #df = self.data_handler.registry.resolve(active_dataset)
                 #print(active_item)
                 RIR_DATA = self.calculate_rir_country_data(self.data_handler.json_df, active_item)
                 #print(RIR_DATA['RIR'].unique)
@@ -157,7 +155,8 @@ class PieChartHandler:
 
         if allocation_version == 'ipv4':
             if active_item == 'TotalPool':
-                df = self.data_handler.json_df
+                # Copied: case_df_processing adds the log column to it
+                df = self.data_handler.json_df.copy()
                 df, value_column = self.case_df_processing(df, log_scale_active, view_mode)
                 hover_data={
                     'name': True,
@@ -206,7 +205,8 @@ class PieChartHandler:
                 names = 'name'
 
             elif active_item == 'SUNBURST':
-                df = self.data_handler.json_df
+                # Copied: the shared json_df would otherwise be rescaled again on every call
+                df = self.data_handler.json_df.copy()
                 df['pop'].fillna(0, inplace=True)
                 df['percentv4'].fillna(0, inplace=True)  
                 df['percentv4'] = df['percentv4'] / 100
@@ -267,7 +267,7 @@ class PieChartHandler:
 
         if active_dataset.get('dataset') == 'v4_allocation': 
             if active_item == 'UNVSALLOCATED':
-                df = pd.read_json(active_dataset['data'], orient='split')
+                df = self.data_handler.registry.resolve(active_dataset)
                 #print(df.columns.tolist())
                 sun_fig = px.sunburst(
                     df,
@@ -1,7 +1,8 @@
 import plotly.express as px
 import pandas as pd
 import numpy as np
-from io import StringIO
+
+from data_processing.binning import BINNINGS
 
 class ScatterHandler:
     def __init__(self, data_handler):#, hover_template_handler
@@ -23,23 +24,13 @@ class ScatterHandler:
         fig = None
         template = 'bootstrap' if switch_on else 'bootstrap_dark'
         #print(active_dataset)
-        data_json_stream = StringIO(active_dataset['data'])
 
         #(active_item, 'in generate figure scatter plot')
-        ipv4_group_to_ticks = {
-            '0-10k': 1e4,
-            '10k-100k': 1e5,
-            '100k-1M': 1e6,
-            '1M-10M': 1e7,
-            '10M-100M': 1e8,
-            '100M-1B': 1e9,
-            '1B+': 1e10
-        }
 
         
         if active_dataset.get('dataset') == 'ipv4':
             if active_item == 'normal':
-                df = pd.read_json(data_json_stream, orient='split')
+                df = self.data_handler.registry.resolve(active_dataset)
                 selected, unselected = self.selected_unselected_functionality()
                 
                 scatter_fig = px.scatter(
@@ -57,12 +48,12 @@ class ScatterHandler:
                         'percentv4': True,
                         'pcv4': True
                     },
-                    category_orders={"ipv4_grouping": ['0-10k', '10k-100k', '100k-1M', '1M-10M', '10M-100M', '100M-1B', '1B+']},
-                    color_discrete_sequence=px.colors.qualitative.Plotly
+                    category_orders=BINNINGS['ipv4'].category_orders('ipv4_grouping'),
+                    color_discrete_map=BINNINGS['ipv4'].colors
                 )
                 
                 scatter_fig.update_xaxes(type='log', title_text='Population Size (Logarithmic Scale)', tickvals=[1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10], ticktext=['1k', '10k', '100k', '1M', '10M', '100M', '1B', '10B'])
-                scatter_fig.update_yaxes(type='log', title_text='Number of IPv4 Addresses')#, tickvals=list(ipv4_group_to_ticks.values()), ticktext=list(ipv4_group_to_ticks.keys())
+                scatter_fig.update_yaxes(type='log', title_text='Number of IPv4 Addresses')
                 
                 hover_template='<b>%{customdata[0]}</b><br>' + \
                                 'IPv4: %{y:,.0f}<br>' + \
@@ -98,7 +89,7 @@ class ScatterHandler:
                 )
 
             elif active_item == 'log':
-                df = pd.read_json(data_json_stream, orient='split')
+                df = self.data_handler.registry.resolve(active_dataset)
                 selected, unselected = self.selected_unselected_functionality()
                 scatter_fig = px.scatter(
                     df,
@@ -159,11 +150,9 @@ class ScatterHandler:
                 )
 
             if active_item == 'v6log':
-                df = pd.read_json(data_json_stream, orient='split')
+                df = self.data_handler.registry.resolve(active_dataset)
                 #print(df.columns.tolist())
                 selected, unselected = self.selected_unselected_functionality()
-                df['ipv6'] = df['ipv6'].apply(lambda x: x if x > 0 else 1.1)
-                df['log_ipv6'] = np.log10(df['ipv6'])
 
                 min_value = df['log_ipv6'].quantile(0.1)
                 max_value = df['log_ipv6'].quantile(0.9)
@@ -221,7 +210,7 @@ class ScatterHandler:
             return scatter_fig
         if active_dataset.get('dataset') == 'ipv4_time_series':
             if active_item == 'animated':
-                df = pd.read_json(data_json_stream, orient='split')
+                df = self.data_handler.registry.resolve(active_dataset)
                 selected, unselected = self.selected_unselected_functionality()
                 x_values = [10e3, 100e3, 1e6, 10e6, 100e6, 1e9, 5e9]
                 #print(df.head(100))
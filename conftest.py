@@ -0,0 +1 @@
+# Lets a plain `pytest` import the repository's packages (classes, data_processing) from tests/
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+MAGNITUDE_SUFFIXES = ((1e9, 'B'), (1e6, 'M'), (1e3, 'k'))
+
+
+def format_magnitude(value):
+    '''10000 -> '10k', 1e6 -> '1M', 2.5e9 -> '2.5B'; below 1000 the plain number.'''
+    for scale, suffix in MAGNITUDE_SUFFIXES:
+        if abs(value) >= scale:
+            return f'{value / scale:g}{suffix}'
+    return f'{value:g}'
+
+
+def magnitude_labels(edges):
+    # '0-10k', '10k-100k', ..., '1B+' for edges 1e4 ... 1e9
+    names = [format_magnitude(edge) for edge in edges]
+    return ['0-' + names[0]] + [f'{low}-{high}' for low, high in zip(names, names[1:])] + [names[-1] + '+']
+
+
+class Binning:
+    '''Named buckets over a numeric metric: upper-inclusive bin edges, ordered labels and their colours.
+
+    A value v lands in bin i when edges[i-1] < v <= edges[i]; the first bin is open below and the last
+    open above, so ``len(edges) + 1`` labels. Bucketing is one np.digitize over the whole array, whatever
+    its shape; missing values get no bucket.
+    '''
+
+    def __init__(self, name, edges, labels=None, colors=None):
+        self.name = name
+        self.edges = np.asarray(edges, dtype=np.float64)
+        if (np.diff(self.edges) <= 0).any():
+            raise ValueError(f'{name}: bin edges must be increasing')
+        self.labels = list(labels) if labels is not None else magnitude_labels(self.edges)
+        if len(self.labels) != len(self.edges) + 1:
+            raise ValueError(f'{name}: {len(self.edges)} edges need {len(self.edges) + 1} labels, got {len(self.labels)}')
+        self.dtype = pd.CategoricalDtype(self.labels, ordered=True)
+        # label -> colour, for plotly's color_discrete_map
+        self.colors = dict(zip(self.labels, colors)) if colors is not None else None
+
+    @classmethod
+    def decades(cls, name, first_exponent, last_exponent, colors=None):
+        '''Bins at every power of ten from 10**first_exponent to 10**last_exponent.'''
+        return cls(name, 10.0 ** np.arange(first_exponent, last_exponent + 1), colors=colors)
+
+    def codes(self, values):
+        '''Bin number of every value (-1 where missing), same shape as ``values``.'''
+        values = np.asarray(values, dtype=np.float64)
+        codes = np.digitize(values, self.edges, right=True)
+        codes[np.isnan(values)] = -1
+        return codes
+
+    def assign(self, values):
+        '''Ordered categorical of the bin labels of a 1-D array or Series (keeping its index).'''
+        codes = self.codes(values)
+        categorical = pd.Categorical.from_codes(codes, dtype=self.dtype)
+        if isinstance(values, pd.Series):
+            return pd.Series(categorical, index=values.index, name=values.name)
+        return categorical
+
+    def category_orders(self, column):
+        return {column: self.labels}
+
+
+BINNINGS = {
+    # IPv4 addresses held per country
+    'ipv4': Binning.decades('ipv4', 4, 9, colors=[
+        'rgb(15, 246, 228)',
+        'rgb(0, 229, 255)',
+        'rgb(0, 208, 255)',
+        'rgb(86, 187, 255)',
+        'rgb(141, 160, 255)',
+        'rgb(207, 104, 255)',
+        'rgb(250, 0, 196)',
+    ]),
+}
@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+
+from data_processing.rir_fetcher import DEFAULT_CACHE_DIR, CachedFetcher
+
+DEFAULT_TTL = 6 * 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+class StaleWhileRevalidate:
+    '''A remote file served from its last good local copy, revalidated in the background once it is older than ``ttl``.
+
+    Revalidation is a conditional GET through CachedFetcher (ETag / Last-Modified, so an unchanged file costs
+    a 304). A new body only replaces the served copy if ``validate`` accepts it, so a truncated download or an
+    error page never overwrites data that worked; when the network is down the last good copy simply stays
+    in service. Only the very first read, with nothing cached yet, waits for a download.
+    '''
+
+    def __init__(self, name, url, ttl=DEFAULT_TTL, cache_dir=DEFAULT_CACHE_DIR, validate=json.loads, timeout=30):
+        self.name = name
+        self.url = url
+        self.ttl = ttl
+        self.validate = validate
+        self.fetcher = CachedFetcher(cache_dir, timeout=timeout)
+        self.path = self.fetcher.cache_path(name + '.last-good')
+        self.lock = threading.Lock()
+        self.refreshing = None
+        self.last_error = None
+
+    def checked_at(self):
+        return self.fetcher.load_meta(self.name).get('checked', 0)
+
+    def is_stale(self):
+        return time.time() - self.checked_at() > self.ttl
+
+    def revalidate(self):
+        '''Conditional GET of the remote file; returns whether the served copy changed.'''
+        try:
+            download_path, changed = self.fetcher.fetch(self.name, self.url)
+            if changed or not os.path.exists(self.path):
+                with open(download_path, 'rb') as download:
+                    payload = download.read()
+                self.validate(payload)
+                self.fetcher.atomic_write(self.path, payload)
+            self.last_error = None
+        except (requests.RequestException, OSError, ValueError) as e:
+            self.last_error = e
+            logger.warning('%s: revalidation failed, serving the cached copy: %s', self.name, e)
+            return False
+        finally:
+            # Failures count as a check too, so an offline app retries once per TTL instead of on every read
+            meta = self.fetcher.load_meta(self.name)
+            meta['checked'] = time.time()
+            self.fetcher.save_meta(self.name, meta)
+        return changed
+
+    def refresh_in_background(self):
+        # At most one revalidation in flight; readers never wait for it
+        with self.lock:
+            if self.refreshing is not None and self.refreshing.is_alive():
+                return self.refreshing
+            self.refreshing = threading.Thread(target=self.revalidate, name=f'revalidate-{self.name}', daemon=True)
+            self.refreshing.start()
+            return self.refreshing
+
+    def version(self):
+        '''Token of the served copy; starts a background revalidation first if the copy is stale.
+
+        Reading the version is how the dataset graph polls a source, so a stale copy gets refreshed on the
+        first read after its TTL and the dataset is rebuilt on the read after the new copy lands.
+        '''
+        if not os.path.exists(self.path):
+            return None
+        if self.is_stale():
+            self.refresh_in_background()
+        stat = os.stat(self.path)
+        return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+    def read(self):
+        '''Bytes of the last good copy, downloaded first only if there has never been one.'''
+        if not os.path.exists(self.path):
+            self.revalidate()
+            if not os.path.exists(self.path):
+                raise OSError(f'{self.name}: no cached copy and the download failed: {self.last_error}')
+        elif self.is_stale():
+            self.refresh_in_background()
+        with open(self.path, 'rb') as cached_file:
+            return cached_file.read()
+
+    def read_json(self):
+        return json.loads(self.read())
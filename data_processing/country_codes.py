@@ -0,0 +1,79 @@
+from functools import lru_cache
+
+import pandas as pd
+
+# ISO-2 codes used by the registries that pycountry does not know (or that we want named differently)
+CUSTOM_REPLACEMENTS = {
+    '': ('UNK', 'Unknown'),
+    'ZZ': ('RES', 'Reserved'),
+    'AP': ('ITU', 'International Telecommunication Union'),
+    'EU': ('EUR', 'Europe')
+}
+SPECIAL_CASES = {
+    'XK': ('XKX', 'Kosovo')
+}
+UNKNOWN = ('UNK', 'Unknown')
+
+
+@lru_cache(maxsize=None)
+def country_crosswalk(special_cases=True, replacements=True):
+    '''ISO-2 -> (ISO-3, country name) table, built once from pycountry plus the custom codes.
+
+    The ETL writes the registries' placeholder codes (blank, ZZ, AP, EU) as codes of their own, which is
+    ``replacements``; the dashboard has always shown them as unknown and asks for the table without them.
+    '''
+    # pycountry parses its JSON databases on import; only the first lookup needs them
+    import pycountry
+    rows = [(country.alpha_2, country.alpha_3, country.name) for country in pycountry.countries]
+    custom = {**(SPECIAL_CASES if special_cases else {}), **(CUSTOM_REPLACEMENTS if replacements else {})}
+    rows += [(alpha_2, alpha_3, name) for alpha_2, (alpha_3, name) in custom.items()]
+    crosswalk = pd.DataFrame(rows, columns=['alpha_2', 'ISO-3', 'Country'])
+    # The custom entries come last so they win over pycountry
+    return crosswalk.drop_duplicates('alpha_2', keep='last').set_index('alpha_2')
+
+
+@lru_cache(maxsize=None)
+def alpha3_names(special_cases=True, replacements=True):
+    crosswalk = country_crosswalk(special_cases, replacements)
+    return pd.Series(crosswalk['Country'].values, index=crosswalk['ISO-3'].values).groupby(level=0).first()
+
+
+def map_codes(codes, table, unknown):
+    # Each distinct code is looked up once; the result is expanded back to the rows by its integer codes
+    codes = pd.Series(codes, copy=False)
+    if isinstance(codes.dtype, pd.CategoricalDtype):
+        row_codes, uniques = codes.cat.codes.to_numpy(), codes.cat.categories
+    else:
+        row_codes, uniques = pd.factorize(codes)
+    # Missing codes (-1) are looked up as the empty string, like a blank registry field
+    keys = pd.Index(list(uniques.astype(str)) + [''])
+    mapped = pd.Series(keys.map(table), dtype=object)
+    if unknown is not None:
+        mapped = mapped.fillna(unknown)
+    category_codes, categories = pd.factorize(mapped)
+    return pd.Series(pd.Categorical.from_codes(category_codes[row_codes], categories), index=codes.index)
+
+
+def alpha2_to_alpha3(codes, unknown=UNKNOWN[0], special_cases=True, replacements=True):
+    return map_codes(codes, country_crosswalk(special_cases, replacements)['ISO-3'], unknown)
+
+
+def alpha2_to_country_name(codes, unknown=UNKNOWN[1], special_cases=True, replacements=True):
+    return map_codes(codes, country_crosswalk(special_cases, replacements)['Country'], unknown)
+
+
+def alpha3_to_country_name(codes, unknown=UNKNOWN[1], special_cases=True, replacements=True):
+    return map_codes(codes, alpha3_names(special_cases, replacements), unknown)
+
+
+def resolve_alpha2(codes):
+    '''Resolve a whole column of ISO-2 codes to an ISO-3 / Country frame in one join.'''
+    return pd.DataFrame({
+        'ISO-3': alpha2_to_alpha3(codes),
+        'Country': alpha2_to_country_name(codes),
+    })
+
+
+def custom_codes_in(codes):
+    # Which of the custom replacement codes actually occurred, for the ETL's end-of-run report
+    return set(pd.Series(codes, copy=False).astype(object).fillna('').astype(str).unique()) & set(CUSTOM_REPLACEMENTS)
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+METRICS = ('allocated', 'cumulative', 'delegations', 'population', 'gdp_per_capita', 'ipv6_prefixes', 'ipv6_64s')
+
+
+class CountryYearCube:
+    '''Dense float64 array indexed [country, year, metric], built once from the WHOIS tables.
+
+    Countries are ISO-3 codes and years a contiguous range, so a country or metric is a dictionary lookup and
+    a year is an offset; every slice is a NumPy view, not a copy. Counts are 0 where a country has nothing
+    that year, population and GDP are NaN where unknown.
+
+    - ``allocated``: IPv4 addresses allocated that year
+    - ``cumulative``: IPv4 addresses allocated up to and including that year
+    - ``delegations``: rows of the WHOIS v4 table that year, so a country-year with only empty
+      delegations still tells apart from one without any
+    - ``population``, ``gdp_per_capita``: as merged into the WHOIS v4 table
+    - ``ipv6_prefixes``: IPv6 allocations made that year
+    - ``ipv6_64s``: /64 subnets in those allocations
+    '''
+
+    def __init__(self, countries, years, values, metrics=METRICS):
+        self.countries = pd.Index(countries, name='ISO-3')
+        self.years = np.asarray(years, dtype=np.int64)
+        self.metrics = tuple(metrics)
+        self.values = values
+        self.first_year = int(self.years[0]) if len(self.years) else 0
+        self.country_positions = {country: position for position, country in enumerate(self.countries)}
+        self.metric_positions = {metric: position for position, metric in enumerate(self.metrics)}
+
+    @classmethod
+    def from_frames(cls, whois_ipv4_df, whoisv6_df=None):
+        frames = [whois_ipv4_df] + ([whoisv6_df] if whoisv6_df is not None else [])
+        countries = pd.Index(sorted(set().union(*(frame['ISO-3'].dropna().astype(str).unique() for frame in frames))))
+        all_years = np.concatenate([frame['Year'].dropna().to_numpy(dtype=np.int64) for frame in frames])
+        years = np.arange(all_years.min(), all_years.max() + 1) if len(all_years) else np.array([], dtype=np.int64)
+        cube = cls(countries, years, np.zeros((len(countries), len(years), len(METRICS))))
+        cube.values[:, :, [cube.metric_positions['population'], cube.metric_positions['gdp_per_capita']]] = np.nan
+
+        v4_cells, v4_rows = cube.cells(whois_ipv4_df)
+        cube.accumulate('allocated', v4_cells, whois_ipv4_df['Value'].to_numpy(dtype=np.float64)[v4_rows])
+        cube.accumulate('delegations', v4_cells, np.ones(len(v4_cells)))
+        for metric, column in (('population', 'Population'), ('gdp_per_capita', 'GDPPerCap')):
+            if column in whois_ipv4_df.columns:
+                cube.assign(metric, v4_cells, whois_ipv4_df[column].to_numpy(dtype=np.float64, na_value=np.nan)[v4_rows])
+        cube.values[:, :, cube.metric_positions['cumulative']] = np.cumsum(cube.metric('allocated'), axis=1)
+
+        if whoisv6_df is not None:
+            v6_cells, v6_rows = cube.cells(whoisv6_df)
+            prefixes = whoisv6_df['Prefix'].to_numpy(dtype=np.int64)[v6_rows]
+            cube.accumulate('ipv6_prefixes', v6_cells, np.ones(len(v6_cells)))
+            # Blocks longer than /64 count as the fraction of a /64 they are
+            cube.accumulate('ipv6_64s', v6_cells, np.ldexp(1.0, 64 - prefixes))
+        return cube
+
+    def cells(self, df):
+        # Flat [country, year] cell of every row that has both, and which rows those are
+        country_positions = self.countries.get_indexer(df['ISO-3'].astype(object))
+        years = df['Year'].to_numpy(dtype=np.float64, na_value=np.nan)
+        rows = np.flatnonzero((country_positions >= 0) & ~np.isnan(years))
+        year_positions = years[rows].astype(np.int64) - self.first_year
+        return country_positions[rows] * len(self.years) + year_positions, rows
+
+    def accumulate(self, metric, cells, weights):
+        sums = np.bincount(cells, weights=weights, minlength=len(self.countries) * len(self.years))
+        self.values[:, :, self.metric_positions[metric]] += sums.reshape(len(self.countries), len(self.years))
+
+    def assign(self, metric, cells, values):
+        # One value per cell (population and GDP repeat on every row of a country-year): the first known one,
+        # as groupby's 'first' would take it; missing ones are skipped
+        known = ~np.isnan(values)
+        cells, first = np.unique(cells[known], return_index=True)
+        country_positions, year_positions = np.divmod(cells, len(self.years))
+        self.values[country_positions, year_positions, self.metric_positions[metric]] = values[known][first]
+
+    def country_position(self, country):
+        return self.country_positions[country]
+
+    def year_position(self, year):
+        position = int(year) - self.first_year
+        if not 0 <= position < len(self.years):
+            raise KeyError(year)
+        return position
+
+    def metric(self, metric):
+        '''[country, year] view of one metric.'''
+        return self.values[:, :, self.metric_positions[metric]]
+
+    def country(self, country, metric):
+        '''One country's metric over all years.'''
+        return self.values[self.country_positions[country], :, self.metric_positions[metric]]
+
+    def year(self, year, metric):
+        '''One year's metric for all countries.'''
+        return self.values[:, self.year_position(year), self.metric_positions[metric]]
+
+    def value(self, country, year, metric):
+        return self.values[self.country_positions[country], self.year_position(year), self.metric_positions[metric]]
+
+    def to_frame(self, metrics=None):
+        '''Long ISO-3 / Year frame of the given metrics (all by default), one row per cell.'''
+        metrics = list(metrics or self.metrics)
+        frame = pd.DataFrame({
+            'ISO-3': pd.Categorical.from_codes(np.repeat(np.arange(len(self.countries)), len(self.years)), self.countries),
+            'Year': np.tile(self.years, len(self.countries)),
+        })
+        for metric in metrics:
+            frame[metric] = self.metric(metric).reshape(-1)
+        return frame
@@ -0,0 +1,80 @@
+import logging
+import os
+import queue
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+WRITERS = {
+    'csv': lambda df, path: df.to_csv(path, index=False),
+    'parquet': lambda df, path: df.to_parquet(path, index=False),
+    'json': lambda df, path: df.to_json(path, orient='split', date_format='iso'),
+}
+
+
+class ExportSink:
+    '''Writes debug exports of DataFrames from a background thread, off the request path.
+
+    ``submit`` copies the frame and queues it; the writer thread writes each export to a temporary file in
+    ``directory`` and renames it into place, so readers (and other processes exporting the same name)
+    only ever see complete files, the last rename winning. When ``max_pending`` exports are already
+    queued, new ones are dropped rather than waited for.
+    '''
+
+    def __init__(self, directory='exports', formats=('csv',), max_pending=8):
+        unknown = set(formats) - set(WRITERS)
+        if unknown:
+            raise ValueError(f"Unknown export formats {sorted(unknown)}, expected some of {sorted(WRITERS)}")
+        self.directory = directory
+        self.formats = tuple(formats)
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()
+        self.writer = None
+        self.dropped = 0
+
+    def submit(self, name, df):
+        # Copied so that the caller can keep modifying its frame while the export waits
+        try:
+            self.pending.put_nowait((name, df.copy()))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning('Export of %s dropped: %d exports already pending', name, self.pending.maxsize)
+            return False
+        self.start()
+        return True
+
+    def start(self):
+        with self.lock:
+            if self.writer is None or not self.writer.is_alive():
+                self.writer = threading.Thread(target=self.run, name='export-sink', daemon=True)
+                self.writer.start()
+
+    def run(self):
+        while True:
+            name, df = self.pending.get()
+            try:
+                for export_format in self.formats:
+                    self.write(name, df, export_format)
+            except Exception as e:
+                logger.exception('Failed to export %s: %s', name, e)
+            finally:
+                self.pending.task_done()
+
+    def write(self, name, df, export_format):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{name}.{export_format}')
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-', suffix='.' + export_format)
+        os.close(fd)
+        try:
+            WRITERS[export_format](df, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def flush(self):
+        '''Wait until every submitted export has been written.'''
+        self.pending.join()
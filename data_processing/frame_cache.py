@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 8
+# The WHOIS grid frames are the big ones, a few hundred MB of formatted strings each at most
+DEFAULT_MAX_BYTES = 512 * 2**20
+
+
+def frame_bytes(frame):
+    '''Memory held by ``frame``, object columns (strings) included.'''
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+
+class FrameCache:
+    '''Least recently used cache of DataFrames built from the datasets, keyed by (name, version).
+
+    ``get`` returns the cached frame or builds it with ``build``. These are frames of their own (formatted
+    copies, not the datasets the DataHandler already holds), so the cache is bounded both by entry count
+    and by ``max_bytes``; the most recently built frame is always kept. A name holds one version at a
+    time: caching a new version drops the older ones straight away instead of waiting for them to be
+    evicted. ``hits`` and ``misses`` count lookups since the cache was created or last cleared.
+    '''
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        if max_entries < 1:
+            raise ValueError(f'max_entries must be at least 1, got {max_entries}')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, name, version, build):
+        key = (name, version)
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+        # Built outside the lock so that one slow build does not hold up hits on other frames; two
+        # threads missing the same key both build it and the second result is the one kept
+        frame = build()
+        size = frame_bytes(frame)
+        with self.lock:
+            for stale in [cached for cached in self.entries if cached[0] == name and cached != key]:
+                self.remove(stale)
+            self.entries[key] = frame
+            self.sizes[key] = size
+            self.entries.move_to_end(key)
+            while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.total_bytes() > self.max_bytes):
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+        return frame
+
+    def remove(self, key):
+        del self.entries[key]
+        del self.sizes[key]
+
+    def total_bytes(self):
+        return sum(self.sizes.values())
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': [{'name': name, 'version': version, 'bytes': self.sizes[(name, version)]}
+                            for name, version in self.entries],
+                'bytes': self.total_bytes(),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else None,
+            }
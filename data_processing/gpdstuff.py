@@ -1,19 +1,21 @@
 import pandas as pd
 
+from data_processing.storage import read_dataset, write_dataset
 
 
-def gdppc_long():
-    df = pd.read_csv('gpd.csv')
+
+def gdppc_long(gdp_csv='gpd.csv', output_path='gdppc_long.parquet'):
+    df = pd.read_csv(gdp_csv)
 
     long_df = pd.melt(df, id_vars=['Country', 'ISO-3'], var_name='Year', value_name='GPDPerCap')
 
-    long_df.to_csv("gdppc_long.csv", index=False)
+    write_dataset(long_df, output_path)
 
 #gdppc_long()
 
-def drop_aggregates():
+def drop_aggregates(input_path='gdppc_long.parquet', output_path='gdppc_long2.parquet'):
     # List of entries to be removed
-    df = pd.read_csv('gdppc_long.csv')
+    df = read_dataset(input_path, categorical=False)
     entries_to_remove = [
         "Africa Eastern and Southern",
         "Arab World",
@@ -44,23 +46,23 @@ def drop_aggregates():
     cleaned_df = df[~df['Country'].isin(entries_to_remove)]
 
     # Display the cleaned DataFrame
-    cleaned_df.to_csv("gdppc_long2.csv", index=False)
+    write_dataset(cleaned_df, output_path)
 #drop_aggregates()
 
 def check_check_for_discrepancies():
-    df = pd.read_csv('whois_v4_pop.csv')
+    df = read_dataset('whois_v4_pop.parquet', categorical=False)
     print(df.nunique())
 
-    df2 = pd.read_csv('gdppc_long2.csv')
+    df2 = read_dataset('gdppc_long2.parquet', categorical=False)
     print(df2.nunique())
 
 #check_check_for_discrepancies()
 
 def finding_out_which_rows_to_drop():
-    df = pd.read_csv('whois_v4_dropped.csv')
+    df = read_dataset('whois_v4_dropped.parquet', categorical=False)
     #print(df.nunique())
 
-    df2 = pd.read_csv('gdp_dropped.csv')
+    df2 = read_dataset('gdp_dropped.parquet', categorical=False)
     #print(df2.nunique())
     iso3_set1 = set(df['ISO-3'])
     iso3_set2 = set(df2['ISO-3'])
@@ -78,10 +80,11 @@ def finding_out_which_rows_to_drop():
 #finding_out_which_rows_to_drop()
 
 
-def dropping_smaller_countries():
+def dropping_smaller_countries(whois_path='whois_v4_pop.parquet', gdp_path='gdppc_long2.parquet',
+                               whois_output='whois_v4_dropped.parquet', gdp_output='gdp_dropped.parquet'):
     # ISO-3 entries to drop from the first dataset
-    df1 = pd.read_csv('whois_v4_pop.csv', low_memory=False)
-    df2 = pd.read_csv('gdppc_long2.csv')
+    df1 = read_dataset(whois_path, categorical=False)
+    df2 = read_dataset(gdp_path, categorical=False)
     iso3_to_drop_first = {'MYT', 'MSR', 'WLF', 'GLP', 'REU', 'NFK', 'GUF', 'BLM', 'BES', 'IOT', 'TKL', 'UNK', 'VAT', 'JEY', 'MTQ', 'GGY', 'ALA', 'TWN', 'AIA', 'COK', 'FLK', 'NIU', 'SPM'}
 
     # ISO-3 entries to drop from the second dataset
@@ -93,27 +96,27 @@ def dropping_smaller_countries():
     # Drop entries from the second dataset
     cleaned_df2 = df2[~df2['ISO-3'].isin(iso3_to_drop_second)]
 
-    # Write the cleaned DataFrames to new CSV files
-    cleaned_df1.to_csv("whois_v4_dropped.csv", index=False)
-    cleaned_df2.to_csv("gdp_dropped.csv", index=False)
+    # Write the cleaned DataFrames to new datasets
+    write_dataset(cleaned_df1, whois_output)
+    write_dataset(cleaned_df2, gdp_output)
 
 #dropping_smaller_countries()
 
 def find_double_dots(cleaned_df2):
-    #cleaned_df2 = pd.read_csv('gdp_dropped.csv')
-    # Find entries with double dots (..) in the 'GPDPerCap' column
-    entries_with_double_dots = cleaned_df2[cleaned_df2['GPDPerCap'] == '..']
+    #cleaned_df2 = read_dataset('gdp_dropped.parquet', categorical=False)
+    # Find entries with double dots (..) in the 'GPDPerCap' column, stored as missing values in the typed dataset
+    entries_with_double_dots = cleaned_df2[cleaned_df2['GPDPerCap'].isna()]
 
     # Display the entries with double dots
     print(entries_with_double_dots)
 
     # Handle missing values (for example, by dropping these rows)
-    cleaned_df2 = cleaned_df2[cleaned_df2['GPDPerCap'] != '..']
+    cleaned_df2 = cleaned_df2[cleaned_df2['GPDPerCap'].notna()]
 
 #find_double_dots()
 
-def testing_backfill():
-    cleaned_df2 = pd.read_csv('gdp_dropped.csv')
+def testing_backfill(input_path='gdp_dropped.parquet', output_path='gdp_dropped_bkfill.parquet'):
+    cleaned_df2 = read_dataset(input_path, categorical=False)
     # Convert '..' to NaN
     cleaned_df2['GPDPerCap'] = cleaned_df2['GPDPerCap'].replace('..', pd.NA)
 
@@ -123,19 +126,16 @@ def testing_backfill():
     # Backfill missing values within each ISO-3 group
     cleaned_df2['GPDPerCap'] = cleaned_df2.groupby('ISO-3')['GPDPerCap'].fillna(method='bfill')
 
-    # Replace remaining NaN values with '..'
-    cleaned_df2['GPDPerCap'] = cleaned_df2['GPDPerCap'].fillna('..')
-
     # Display the updated DataFrame
     print(cleaned_df2.head(25))
 
     find_double_dots(cleaned_df2)
-    cleaned_df2.to_csv("gdp_dropped_bkfill.csv", index=False)
+    write_dataset(cleaned_df2, output_path)
 
 #testing_backfill()
 
-def testing_frontfill():
-    cleaned_df2 = pd.read_csv('gdp_dropped_bkfill.csv')
+def testing_frontfill(input_path='gdp_dropped_bkfill.parquet', output_path='gdp_dropped_filled.parquet'):
+    cleaned_df2 = read_dataset(input_path, categorical=False)
     # Convert '..' to NaN
     cleaned_df2['GPDPerCap'] = cleaned_df2['GPDPerCap'].replace('..', pd.NA)
 
@@ -148,20 +148,17 @@ def testing_frontfill():
     # Front fill remaining missing values within each ISO-3 group
     cleaned_df2['GPDPerCap'] = cleaned_df2.groupby('ISO-3')['GPDPerCap'].fillna(method='ffill')
 
-    # Replace remaining NaN values with '..'
-    cleaned_df2['GPDPerCap'] = cleaned_df2['GPDPerCap'].fillna('..')
-
     # Display the updated DataFrame
     print(cleaned_df2.head)
     find_double_dots(cleaned_df2)
-    cleaned_df2.to_csv("gdp_dropped_filled.csv", index=False)
+    write_dataset(cleaned_df2, output_path)
 
 #testing_frontfill()
 
 def checking_the_last_double_dots():
-    cleaned_df2 = pd.read_csv('gdp_dropped_filled.csv')
+    cleaned_df2 = read_dataset('gdp_dropped_filled.parquet', categorical=False)
     # Find rows with double dots (..) in the 'GPDPerCap' column
-    rows_with_double_dots = cleaned_df2[cleaned_df2['GPDPerCap'] == '..']
+    rows_with_double_dots = cleaned_df2[cleaned_df2['GPDPerCap'].isna()]
 
     # Print out the rows without abbreviation
     with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', None):
@@ -170,7 +167,7 @@ def checking_the_last_double_dots():
 #checking_the_last_double_dots()
 
 def checking_stuff_in_the_old_df(df):
-    #cleaned_df2 = pd.read_csv('gdp_dropped_filled_nodots.csv')
+    #cleaned_df2 = read_dataset('gdp_dropped_filled_nodots.parquet', categorical=False)
     # Filter rows containing ISO-3 codes PRK, GIB, and VGB
     filtered_rows = df[df['ISO-3'].isin(['PRK', 'GIB', 'VGB'])]
 
@@ -179,40 +176,58 @@ def checking_stuff_in_the_old_df(df):
 
 #checking_stuff_in_the_old_df()
 
-def setting_dots_to_zero():
-    cleaned_df2 = pd.read_csv('gdp_dropped_filled.csv')
-    # Replace '..' with 0 for GIB and VGB
-    cleaned_df2.loc[(cleaned_df2['ISO-3'] == 'GIB') | (cleaned_df2['ISO-3'] == 'VGB'), 'GPDPerCap'] = cleaned_df2.loc[(cleaned_df2['ISO-3'] == 'GIB') | (cleaned_df2['ISO-3'] == 'VGB'), 'GPDPerCap'].replace('..', '0')
+def setting_dots_to_zero(input_path='gdp_dropped_filled.parquet', output_path='gdp_dropped_filled_nodots.parquet'):
+    cleaned_df2 = read_dataset(input_path, categorical=False)
+    # Replace '..' (missing) with 0 for GIB and VGB
+    cleaned_df2.loc[(cleaned_df2['ISO-3'] == 'GIB') | (cleaned_df2['ISO-3'] == 'VGB'), 'GPDPerCap'] = cleaned_df2.loc[(cleaned_df2['ISO-3'] == 'GIB') | (cleaned_df2['ISO-3'] == 'VGB'), 'GPDPerCap'].fillna(0)
 
     # Display the updated DataFrame
     
-    cleaned_df2.to_csv("gdp_dropped_filled_nodots.csv", index=False)
+    write_dataset(cleaned_df2, output_path)
 
 #setting_dots_to_zero()
 
-def combining_the_two():
-    cleaned_df1 = pd.read_csv('whois_v4_dropped.csv')
-    cleaned_df2 = pd.read_csv('gdp_dropped_filled_nodots.csv')
+def combining_the_two(whois_path='whois_v4_dropped.parquet', gdp_path='gdp_dropped_filled_nodots.parquet',
+                      output_path='whoisv4_pop_gdp.parquet'):
+    cleaned_df1 = read_dataset(whois_path, categorical=False)
+    cleaned_df2 = read_dataset(gdp_path, categorical=False)
     # Merge the two datasets on the 'ISO-3' and 'Year' columns
 # Merge the two datasets on the 'ISO-3' and 'Year' columns
     merged_df = pd.merge(cleaned_df1, cleaned_df2, on=['ISO-3', 'Year'])
 
-    # Save the merged DataFrame to a new CSV file
-    merged_df.to_csv("whoisv4_pop_gdp.csv", index=False)
+    # Save the merged DataFrame to a new dataset
+    write_dataset(merged_df, output_path)
 
     # Display the merged DataFrame
     checking_stuff_in_the_old_df(merged_df)
 
 #combining_the_two()
 
-def last_cleanup():
-    df = pd.read_csv('whoisv4_pop_gdp.csv')
+def last_cleanup(input_path='whoisv4_pop_gdp.parquet', output_path='whoisv4_pop_gdp2.parquet'):
+    df = read_dataset(input_path, categorical=False)
     df.drop(columns=['Country_x'], inplace=True)
     df.rename(columns={'Country_y': 'Country', 'GPDPerCap': 'GDPPerCap'}, inplace=True)
-    df.to_csv("whoisv4_pop_gdp2.csv", index=False)
+    write_dataset(df, output_path)
 
     print(df.tail())
     print(df.head())
 
-last_cleanup()
+def build_gdp_long(gdp_csv='gpd.csv', output_path='gdppc_long2.parquet', long_path='gdppc_long.parquet'):
+    # Pipeline stage: World Bank GDP per capita (wide) -> long format without the regional aggregates
+    gdppc_long(gdp_csv, long_path)
+    drop_aggregates(long_path, output_path)
+
+def build_whois_gdp(whois_path='whois_v4_pop.parquet', gdp_path='gdppc_long2.parquet',
+                    output_path='whoisv4_pop_gdp_merged.parquet', whois_dropped_path='whois_v4_dropped.parquet',
+                    gdp_dropped_path='gdp_dropped.parquet', gdp_backfilled_path='gdp_dropped_bkfill.parquet',
+                    gdp_filled_path='gdp_dropped_filled.parquet', gdp_nodots_path='gdp_dropped_filled_nodots.parquet'):
+    # Pipeline stage: the steps above in the order they were run by hand
+    dropping_smaller_countries(whois_path, gdp_path, whois_dropped_path, gdp_dropped_path)
+    testing_backfill(gdp_dropped_path, gdp_backfilled_path)
+    testing_frontfill(gdp_backfilled_path, gdp_filled_path)
+    setting_dots_to_zero(gdp_filled_path, gdp_nodots_path)
+    combining_the_two(whois_dropped_path, gdp_nodots_path, output_path)
+
+if __name__ == '__main__':
+    last_cleanup()
     
\ No newline at end of file
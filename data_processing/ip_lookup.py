@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+from data_processing import ip_math
+
+
+def searchsorted_pairs(hi, lo, query_hi, query_lo):
+    '''np.searchsorted(side='right') for 128-bit keys held as (hi, lo) pairs sorted lexicographically.
+
+    Keys and queries are sorted together (keys first on ties), so the number of keys before each query
+    is its insertion point. That is one lexsort instead of the single searchsorted the 32-bit case needs.
+    '''
+    key_count = len(hi)
+    is_query = np.concatenate([np.zeros(key_count, dtype=bool), np.ones(len(query_hi), dtype=bool)])
+    order = np.lexsort((is_query, np.concatenate([lo, query_lo]), np.concatenate([hi, query_hi])))
+    keys_before = np.cumsum(~is_query[order])
+    positions = np.empty(len(query_hi), dtype=np.int64)
+    query_slots = is_query[order]
+    positions[order[query_slots] - key_count] = keys_before[query_slots]
+    return positions
+
+
+def parse_addresses(addresses):
+    '''Split a batch of IP addresses into an IPv4 uint32 array and IPv6 (hi, lo) pairs.
+
+    Strings may mix both families; integers are taken as IPv4. Returns (is_v6 mask, v4 values, (v6 hi, v6 lo)), with the v4/v6 arrays holding only their own rows.
+    '''
+    addresses = pd.Series(addresses, copy=False)
+    if pd.api.types.is_integer_dtype(addresses.dtype):
+        values = addresses.to_numpy(dtype=np.uint64)
+        if (values >> np.uint64(ip_math.IPV4_BITS)).any():
+            raise ValueError('Integer addresses must be IPv4 (below 2**32)')
+        is_v6 = np.zeros(len(values), dtype=bool)
+        return is_v6, values.astype(np.uint32), (np.array([], dtype=np.uint64), np.array([], dtype=np.uint64))
+    addresses = addresses.astype(str)
+    is_v6 = addresses.str.contains(':', regex=False).to_numpy()
+    v4 = ip_math.ipv4_to_int(addresses[~is_v6]) if (~is_v6).any() else np.array([], dtype=np.uint32)
+    v6 = ip_math.ipv6_to_int(addresses[is_v6]) if is_v6.any() else (np.array([], dtype=np.uint64), np.array([], dtype=np.uint64))
+    return is_v6, v4, v6
+
+
+class AddressIndex:
+    '''Sorted interval index over address ranges, answering "which range holds this address?".
+
+    ``starts`` and ``ends`` (inclusive) are uint32 arrays for IPv4 or (hi, lo) uint64 pairs for IPv6, one
+    entry per row of ``frame``. Lookups return the matching rows of ``frame`` plus a ``Row`` column with
+    their index label there. An address is matched to the range with the highest start at or below it; if
+    that range has already ended (ranges overlap), to the earlier range reaching furthest, which then holds it.
+    '''
+
+    def __init__(self, frame, starts, ends):
+        self.is_v6 = isinstance(starts, tuple)
+        if self.is_v6:
+            order = np.lexsort((starts[1], starts[0]))
+            self.starts = tuple(np.asarray(part, dtype=np.uint64)[order] for part in starts)
+            self.ends = tuple(np.asarray(part, dtype=np.uint64)[order] for part in ends)
+            # Blocks of /64 or shorter start and end on a 64-bit boundary, so the upper word alone decides
+            self.hi_only = bool((self.starts[1] == 0).all() and (self.ends[1] == ip_math.UINT64_MAX).all())
+        else:
+            order = np.argsort(starts, kind='stable')
+            self.starts = np.asarray(starts, dtype=np.uint32)[order]
+            self.ends = np.asarray(ends, dtype=np.uint32)[order]
+        self.frame = frame.iloc[order].reset_index(names='Row')
+        self.overlaps = int(ip_math.overlapping_ranges(self.starts, self.ends).sum()) if len(self.frame) else 0
+        self.reach = self.reaching_ranges() if self.overlaps else None
+
+    @classmethod
+    def from_ipv4(cls, df, start_column='Start', end_column='End', columns=None):
+        # Rows without addresses (Value 0 fillers) are not ranges and are left out
+        df = df[df['Value'] > 0] if 'Value' in df.columns else df
+        frame = df[columns] if columns else df
+        return cls(frame, df[start_column].to_numpy(), df[end_column].to_numpy())
+
+    @classmethod
+    def from_ipv6(cls, df, columns=None):
+        frame = df[columns] if columns else df
+        return cls(frame, (df['StartHi'].to_numpy(), df['StartLo'].to_numpy()),
+                   (df['EndHi'].to_numpy(), df['EndLo'].to_numpy()))
+
+    def __len__(self):
+        return len(self.frame)
+
+    def reaching_ranges(self):
+        # For each position, the range at or before it with the furthest end (the latest one on ties)
+        end_ranks = ip_math.address_ranks(self.ends)[0]
+        furthest = np.maximum.accumulate(end_ranks)
+        return np.maximum.accumulate(np.where(end_ranks == furthest, np.arange(len(end_ranks)), 0))
+
+    def insertion_points(self, queries):
+        if not self.is_v6:
+            return np.searchsorted(self.starts, queries, side='right')
+        if self.hi_only:
+            return np.searchsorted(self.starts[0], queries[0], side='right')
+        return searchsorted_pairs(self.starts[0], self.starts[1], queries[0], queries[1])
+
+    def covers(self, positions, queries):
+        # Whether the range at each position ends at or after its query (it starts at or before it already)
+        if not self.is_v6:
+            return queries <= self.ends[positions]
+        end_hi = self.ends[0][positions]
+        if self.hi_only:
+            return queries[0] <= end_hi
+        return (queries[0] < end_hi) | ((queries[0] == end_hi) & (queries[1] <= self.ends[1][positions]))
+
+    def positions(self, queries):
+        '''Row position in ``frame`` of the range holding each query address, or -1 where none does.'''
+        if self.is_v6:
+            queries = tuple(np.asarray(part, dtype=np.uint64) for part in queries)
+        else:
+            queries = np.asarray(queries, dtype=np.uint32)
+        candidates = self.insertion_points(queries) - 1
+        clipped = np.maximum(candidates, 0)
+        found = (candidates >= 0) & self.covers(clipped, queries)
+        positions = np.where(found, clipped, -1)
+        if self.reach is not None:
+            # The furthest-reaching earlier range starts at or before the query too, so it holds it if it reaches it
+            retry = (candidates >= 0) & ~found
+            reaching = self.reach[clipped[retry]]
+            retry_queries = tuple(part[retry] for part in queries) if self.is_v6 else queries[retry]
+            positions[retry] = np.where(self.covers(reaching, retry_queries), reaching, -1)
+        return positions
+
+    def lookup_many(self, queries):
+        '''Frame rows for each query (all-missing rows where nothing matched), in query order.'''
+        positions = self.positions(queries)
+        if (positions >= 0).all():
+            rows = self.frame.take(positions)
+        else:
+            # -1 is not a label of the RangeIndex, so misses come back as missing values
+            rows = self.frame.reindex(positions)
+        rows.index = pd.RangeIndex(len(positions))
+        return rows
@@ -0,0 +1,266 @@
+import socket
+
+import numpy as np
+import pandas as pd
+
+IPV4_BITS = 32
+IPV6_BITS = 128
+UINT64_MAX = np.uint64(0xFFFFFFFFFFFFFFFF)
+IPV4_INT_COLUMNS = ['StartInt', 'EndInt']
+IPV6_INT_COLUMNS = ['StartHi', 'StartLo', 'EndHi', 'EndLo']
+OCTET_STRINGS = np.array([str(octet) for octet in range(256)], dtype=object)
+
+
+def ipv4_to_int(addresses):
+    '''Convert a column of dotted-quad strings to uint32; ValueError on the first malformed or missing address.'''
+    addresses = pd.Series(addresses, copy=False)
+    if isinstance(addresses.dtype, pd.CategoricalDtype):
+        codes = addresses.cat.codes.to_numpy()
+        if (codes < 0).any():
+            raise ValueError('Missing IPv4 addresses in column')
+        # Only the distinct addresses are parsed, then expanded back to the rows by their codes
+        return ipv4_to_int(addresses.cat.categories)[codes]
+    # inet_pton parses in C and accepts only four decimal octets of 0-255; NumPy then reads the packed
+    # addresses as big-endian words, so no intermediate text or frame is built
+    packed = bytearray()
+    for address in addresses:
+        try:
+            packed += socket.inet_pton(socket.AF_INET, address)
+        except (OSError, TypeError):
+            raise ValueError(f'Malformed IPv4 address in column: {address!r}') from None
+    return np.frombuffer(packed, dtype='>u4').astype(np.uint32)
+
+
+def int_to_ipv4(values):
+    values = np.asarray(values, dtype=np.uint64)
+    octets = [OCTET_STRINGS[(values >> np.uint64(shift)) & np.uint64(0xFF)] for shift in (24, 16, 8, 0)]
+    return octets[0] + '.' + octets[1] + '.' + octets[2] + '.' + octets[3]
+
+
+def ipv4_range_ends(starts, values):
+    '''Last address (inclusive) of each range; empty ranges (Value 0) end where they start.'''
+    starts = np.asarray(starts, dtype=np.int64)
+    values = np.maximum(np.asarray(values, dtype=np.int64), 1)
+    return (starts + values - 1).astype(np.uint32)
+
+
+def ipv6_to_int(addresses):
+    '''Convert a column of IPv6 strings to (hi, lo) uint64 arrays: the upper and lower 64 bits of each address.'''
+    addresses = pd.Series(addresses, copy=False)
+    if isinstance(addresses.dtype, pd.CategoricalDtype):
+        hi, lo = ipv6_to_int(addresses.cat.categories)
+        codes = addresses.cat.codes.to_numpy()
+        return hi[codes], lo[codes]
+    # inet_pton parses (and expands '::') in C; NumPy then reads the packed addresses as big-endian words
+    packed = b''.join(socket.inet_pton(socket.AF_INET6, address) for address in addresses.astype(str))
+    words = np.frombuffer(packed, dtype='>u8').reshape(-1, 2).astype(np.uint64)
+    return words[:, 0], words[:, 1]
+
+
+def ipv6_subnet_counts(counts, prefix=64):
+    '''Number of /``prefix`` networks in each IPv6 address count, exactly, as uint64.
+
+    Address counts reach 2**113 and arrive as Python ints; shifting them once at load keeps every later
+    sum and ratio in fixed-width integers. Missing counts become 0.
+    '''
+    shift = IPV6_BITS - prefix
+    counts = pd.Series(counts, copy=False)
+    return np.fromiter((int(count) >> shift if pd.notna(count) else 0 for count in counts), dtype=np.uint64, count=len(counts))
+
+
+def pack_ipv6(hi, lo):
+    words = np.empty((len(hi), 2), dtype='>u8')
+    words[:, 0] = hi
+    words[:, 1] = lo
+    return words.tobytes()
+
+
+def int_to_ipv6(hi, lo):
+    packed = pack_ipv6(hi, lo)
+    return np.array([socket.inet_ntop(socket.AF_INET6, packed[i:i + 16]) for i in range(0, len(packed), 16)], dtype=object)
+
+
+def host_mask(bits):
+    # (1 << bits) - 1 for 0..64 bits; a uint64 shift by 64 is undefined, so the all-ones case is set separately
+    bits = np.asarray(bits, dtype=np.uint64)
+    mask = (np.uint64(1) << np.minimum(bits, np.uint64(63))) - np.uint64(1)
+    return np.where(bits >= 64, UINT64_MAX, mask)
+
+
+def ipv6_block_ends(hi, lo, prefixes):
+    '''Last address of each CIDR block, as (hi, lo), by setting all of its host bits.'''
+    prefixes = np.asarray(prefixes, dtype=np.int64)
+    hi_host = np.clip(64 - prefixes, 0, 64)
+    lo_host = np.clip(IPV6_BITS - prefixes, 0, 64)
+    return np.asarray(hi, dtype=np.uint64) | host_mask(hi_host), np.asarray(lo, dtype=np.uint64) | host_mask(lo_host)
+
+
+def ipv6_sort_keys(hi, lo):
+    '''Fixed-width hex strings that sort like the addresses, for consumers without 64-bit integers (JavaScript).'''
+    digits = pack_ipv6(hi, lo).hex()
+    return np.array([digits[i:i + 32] for i in range(0, len(digits), 32)], dtype=object)
+
+
+def ipv4_address_columns(df):
+    '''uint32 StartInt/EndInt for an IPv4 frame, taken from the frame when ingest already added them.'''
+    if all(column in df.columns for column in IPV4_INT_COLUMNS):
+        return df[IPV4_INT_COLUMNS]
+    starts = ipv4_to_int(df['Start'])
+    return pd.DataFrame({'StartInt': starts, 'EndInt': ipv4_range_ends(starts, df['Value'])}, index=df.index)
+
+
+def ipv6_address_columns(df):
+    '''uint64 StartHi/StartLo/EndHi/EndLo for an IPv6 frame, taken from the frame when ingest already added them.'''
+    if all(column in df.columns for column in IPV6_INT_COLUMNS):
+        return df[IPV6_INT_COLUMNS]
+    start_hi, start_lo = ipv6_to_int(df['Start'])
+    end_hi, end_lo = ipv6_block_ends(start_hi, start_lo, df['Prefix'])
+    return pd.DataFrame({'StartHi': start_hi, 'StartLo': start_lo, 'EndHi': end_hi, 'EndLo': end_lo}, index=df.index)
+
+
+def address_ranks(*addresses):
+    '''Order-preserving int64 ranks for addresses given as uint32 arrays or (hi, lo) pairs.
+
+    All arguments are ranked together, so the ranks of starts and ends stay comparable with each other.
+    '''
+    if not isinstance(addresses[0], tuple):
+        return [np.asarray(values, dtype=np.int64) for values in addresses]
+    hi = np.concatenate([pair[0] for pair in addresses]).astype(np.uint64)
+    lo = np.concatenate([pair[1] for pair in addresses]).astype(np.uint64)
+    _, ranks = np.unique(np.stack([hi, lo], axis=1), axis=0, return_inverse=True)
+    ranks = ranks.reshape(-1)
+    splits = np.cumsum([len(pair[0]) for pair in addresses])[:-1]
+    return np.split(ranks, splits)
+
+
+def overlapping_ranges(starts, ends):
+    '''Mask of the ranges that overlap a range starting at or before them (input order is kept).
+
+    Addresses are uint32 arrays for IPv4 or (hi, lo) pairs for IPv6; ``ends`` are inclusive.
+    '''
+    starts, ends = address_ranks(starts, ends)
+    order = np.lexsort((ends, starts))
+    running_end = np.maximum.accumulate(ends[order])
+    overlaps = np.zeros(len(starts), dtype=bool)
+    overlaps[order[1:]] = starts[order[1:]] <= running_end[:-1]
+    return overlaps
+
+
+def coalesce_ranges(starts, ends, groups=None):
+    '''Union of IPv4 ranges (``ends`` inclusive), per group when integer ``groups`` codes are given.
+
+    Returns (group, start, end) arrays of the merged ranges, sorted by group and start. Overlapping and
+    adjacent ranges of a group are merged; ranges of different groups never are. One sort, then a sweep
+    with a running maximum of the ends: a new range begins wherever a start lies more than one address
+    past everything before it.
+    '''
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    groups = np.zeros(len(starts), dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+    if not len(starts):
+        return groups, starts.astype(np.uint32), ends.astype(np.uint32)
+    order = np.lexsort((starts, groups))
+    starts, ends, groups = starts[order], ends[order], groups[order]
+    # Ends are below 2**32, so shifting each group up by 2**33 stops the running maximum leaking across groups
+    offsets = groups << (IPV4_BITS + 1)
+    reach = np.maximum.accumulate(ends + offsets) - offsets
+    new_range = np.ones(len(starts), dtype=bool)
+    new_range[1:] = (groups[1:] != groups[:-1]) | (starts[1:] > reach[:-1] + 1)
+    first = np.flatnonzero(new_range)
+    last = np.append(first[1:] - 1, len(starts) - 1)
+    return groups[first], starts[first].astype(np.uint32), reach[last].astype(np.uint32)
+
+
+def floor_log2(values):
+    # frexp is exact for integers below 2**53, unlike np.log2 followed by a cast
+    return np.frexp(np.asarray(values, dtype=np.float64))[1].astype(np.int64) - 1
+
+
+def calculate_prefix(values):
+    '''Prefix length of the largest block that fits in ``values`` addresses (exact for powers of two).'''
+    values = np.maximum(np.asarray(values, dtype=np.int64), 1)
+    return IPV4_BITS - floor_log2(values)
+
+
+def range_to_cidrs(starts, values):
+    '''Split each IPv4 range (start, number of addresses) into the exact list of CIDR blocks.
+
+    Returns (row, block_start, prefix) arrays, where ``row`` points back at the input range each block
+    belongs to. Blocks are ordered by row and then by address. Every step works on all ranges at once,
+    and a range never needs more than 2 * 32 blocks, so the loop runs at most 64 times.
+    '''
+    starts = np.asarray(starts, dtype=np.int64)
+    remaining = np.asarray(values, dtype=np.int64)
+    rows = np.arange(len(starts))
+
+    out_rows, out_starts, out_sizes = [], [], []
+    active = remaining > 0
+    rows, starts, remaining = rows[active], starts[active], remaining[active]
+    while len(rows):
+        # A block is limited both by the alignment of its start and by how many addresses are left
+        alignment = starts & -starts
+        alignment[starts == 0] = 1 << IPV4_BITS
+        size = np.minimum(alignment, 1 << floor_log2(remaining))
+
+        out_rows.append(rows)
+        out_starts.append(starts.copy())
+        out_sizes.append(size)
+
+        starts = starts + size
+        remaining = remaining - size
+        active = remaining > 0
+        rows, starts, remaining = rows[active], starts[active], remaining[active]
+
+    if not out_rows:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty.astype(np.uint32), empty
+    block_rows = np.concatenate(out_rows)
+    block_starts = np.concatenate(out_starts)
+    block_sizes = np.concatenate(out_sizes)
+    order = np.lexsort((block_starts, block_rows))
+    prefixes = IPV4_BITS - floor_log2(block_sizes[order])
+    return block_rows[order], block_starts[order].astype(np.uint32), prefixes
+
+
+def is_power_of_two(values):
+    values = np.asarray(values, dtype=np.int64)
+    return (values > 0) & ((values & (values - 1)) == 0)
+
+
+def explode_ipv4_cidrs(df, start_column='Start', value_column='Value'):
+    '''Return ``df`` with one row per CIDR block, rewriting Start/Value and adding a Prefix column.
+
+    Rows without addresses (Value 0, e.g. filler rows for years without allocations) are kept as they
+    are with a Prefix of 0, and the original row order is preserved.
+    '''
+    values = df[value_column].to_numpy(dtype=np.int64)
+    # Only rows with addresses need a parseable start
+    starts = np.zeros(len(df), dtype=np.uint32)
+    starts[values > 0] = ipv4_to_int(df[start_column][values > 0])
+    block_rows, block_starts, prefixes = range_to_cidrs(starts, values)
+
+    empty_rows = np.flatnonzero(values <= 0)
+    all_rows = np.concatenate([block_rows, empty_rows])
+    order = np.argsort(all_rows, kind='stable')
+    exploded = df.iloc[all_rows[order]].reset_index(drop=True)
+
+    block_count = len(block_rows)
+    all_prefixes = np.concatenate([prefixes, np.zeros(len(empty_rows), dtype=np.int64)])[order]
+    is_block = (np.arange(len(all_rows)) < block_count)[order]
+
+    # Ranges that already are a single CIDR block keep their original start string
+    split = is_block & (np.bincount(block_rows, minlength=len(df))[all_rows[order]] > 1)
+    if split.any():
+        starts = exploded[start_column].to_numpy(dtype=object, copy=True)
+        starts[split] = int_to_ipv4(np.concatenate([block_starts, np.zeros(len(empty_rows), dtype=np.uint32)])[order][split])
+        exploded[start_column] = starts
+
+    new_values = np.where(is_block, np.int64(1) << (IPV4_BITS - all_prefixes), 0)
+    exploded[value_column] = new_values.astype(df[value_column].dtype)
+    exploded['Prefix'] = all_prefixes.astype(np.uint8)
+    if 'StartInt' in exploded.columns:
+        # Integer addresses carried over from the unsplit ranges are recomputed for the blocks
+        all_starts = np.concatenate([block_starts, df['StartInt'].to_numpy(dtype=np.uint32)[empty_rows]])[order]
+        exploded['StartInt'] = all_starts.astype(np.uint32)
+        exploded['EndInt'] = ipv4_range_ends(all_starts, new_values)
+    return exploded
@@ -1,16 +1,27 @@
 import pandas as pd
-from dash import Dash, html
-import dash_ag_grid as ag
 import requests
 
+FETCH_TIMEOUT = 30
+
+
 # Fetching data from github repository
-def fetch_netlist_data(url):
-    response = requests.get(url)
-    lines = response.text.strip().split("\n")
+def fetch_netlist_data(url, timeout=FETCH_TIMEOUT):
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return parse_netlist_text(response.text)
+
+def parse_netlist_text(text):
+    lines = text.strip().split("\n")
     data = [line.split(maxsplit=3) for line in lines if line]
     netlist_df = pd.DataFrame(data, columns=['Start', 'End', 'RIR', 'Description'])
     return netlist_df
 
+def validate_netlist(payload):
+    # Used before a download replaces the cached copy: an error page or a truncated body raises ValueError
+    first_line = payload.decode().strip().split("\n", 1)[0].split(maxsplit=3)
+    if len(first_line) != 4 or not (first_line[0].isdigit() and first_line[1].isdigit()):
+        raise ValueError('not a netlist: expected "<start> <end> <rir> <description>" lines')
+
 # Function to tidy up and better granularity of netlist data
 def process_netlist_data(netlist_df):
     # Splitting Description column into multiple columns
@@ -19,29 +30,35 @@ def process_netlist_data(netlist_df):
     netlist_df[['IP Address', 'Prefix']] = netlist_df['IP'].str.split("/", expand=True)
     # Dropping unnecessary columns
     netlist_df.drop(columns=['Description', 'IP'], inplace=True)
-    # Convert 'Start' and 'End' columns to UInt64
-    netlist_df['Start'] = netlist_df['Start'].astype('UInt64')
-    netlist_df['End'] = netlist_df['End'].astype('UInt64')
+    # The netlist already carries integer addresses; they are held as uint32 like the WHOIS StartInt/EndInt
+    netlist_df['Start'] = pd.to_numeric(netlist_df['Start']).astype('uint32')
+    netlist_df['End'] = pd.to_numeric(netlist_df['End']).astype('uint32')
     # Calculate aggregate as the difference between 'End' and 'Start'
-    netlist_df['Nr of IPs'] = netlist_df['End'] - netlist_df['Start']
+    netlist_df['Nr of IPs'] = netlist_df['End'].astype('int64') - netlist_df['Start'].astype('int64')
     return netlist_df
 
 netlist_url = 'https://raw.githubusercontent.com/impliedchaos/ip-alloc/main/netlist.txt'
-netlist_data_frame = fetch_netlist_data(netlist_url)
 
-# Process the data
-netlist_data_frame = process_netlist_data(netlist_data_frame)
+# Standalone viewer; importing the module only brings in the fetch/process functions (DataHandler uses them)
+if __name__ == '__main__':
+    # The viewer's imports stay here so that the data handler importing this module does not load Dash
+    from dash import Dash, html
+    import dash_ag_grid as ag
 
-app = Dash(__name__)
+    netlist_data_frame = fetch_netlist_data(netlist_url)
 
-app.layout = html.Div([
-    html.H1("Netlist Data in Ag-Grid"),
-    ag.AgGrid(
-        id='netlist-grid',
-        columnDefs=[{"headerName": col, "field": col, "filter": True} for col in netlist_data_frame.columns],
-        rowData=netlist_data_frame.to_dict('records'),
-    )
-])
+    # Process the data
+    netlist_data_frame = process_netlist_data(netlist_data_frame)
+
+    app = Dash(__name__)
+
+    app.layout = html.Div([
+        html.H1("Netlist Data in Ag-Grid"),
+        ag.AgGrid(
+            id='netlist-grid',
+            columnDefs=[{"headerName": col, "field": col, "filter": True} for col in netlist_data_frame.columns],
+            rowData=netlist_data_frame.to_dict('records'),
+        )
+    ])
 
-if __name__ == '__main__':
     app.run_server(debug=True)
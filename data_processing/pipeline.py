@@ -0,0 +1,241 @@
+# Run from the project root: python -m data_processing.pipeline [--force STAGE ...] [--offline] [--workers N]
+import argparse
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from data_processing import gpdstuff, storage, time_series_df_generation, whois_csv_generation2
+from data_processing.rir_fetcher import DEFAULT_CACHE_DIR, rir_urls
+
+MANIFEST_PATH = 'pipeline_manifest.json'
+HASH_CHUNK_SIZE = 1 << 20
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    '''One step of the ETL: a module-level function plus the files it reads and writes.
+
+    ``inputs`` and ``outputs`` map the function's keyword arguments to a path (or a list of paths), and the
+    function is called with both. A stage depends on whichever stage produces one of its inputs. Network
+    stages have no local inputs to hash and always run (unless offline); their own conditional requests
+    keep that cheap.
+    '''
+
+    def __init__(self, name, func, inputs=None, outputs=None, network=False):
+        self.name = name
+        self.func = func
+        self.inputs = inputs or {}
+        self.outputs = outputs or {}
+        self.network = network
+
+    def input_paths(self):
+        return flatten_paths(self.inputs)
+
+    def output_paths(self):
+        return flatten_paths(self.outputs)
+
+    def outputs_exist(self):
+        return all(os.path.exists(path) for path in self.output_paths())
+
+
+def flatten_paths(mapping):
+    paths = []
+    for value in mapping.values():
+        paths.extend(value if isinstance(value, (list, tuple)) else [value])
+    return paths
+
+
+def default_stages():
+    rir_paths = [os.path.join(DEFAULT_CACHE_DIR, rir) for rir in rir_urls]
+    # The datasets DataHandler serves, which get a memory-mappable copy as the last step
+    served_paths = ['whoisv4_pop_gdp.parquet', 'ipv6_allocations.parquet']
+    return [
+        Stage('fetch', whois_csv_generation2.fetch_delegated_files,
+              outputs={'rir_paths': rir_paths}, network=True),
+        Stage('parse', whois_csv_generation2.build_allocation_datasets,
+              inputs={'rir_paths': rir_paths},
+              outputs={'ipv4_path': 'ipv4_allocations.parquet', 'ipv6_path': 'ipv6_allocations.parquet'}),
+        # Intermediates the stages write on the way are declared as outputs too, so they are in the manifest
+        Stage('population_long', time_series_df_generation.build_population_long,
+              inputs={'population_csv': 'wpopdata.csv', 'additions_csv': 'manual_additions_population.csv'},
+              outputs={'output_path': 'wpopdata_long_format_cleaned.parquet',
+                       'long_path': 'wpopdata_long_format.parquet',
+                       'aggregates_path': 'wpopdata_long_format_aggregate_nationality_long.parquet'}),
+        Stage('gdp_long', gpdstuff.build_gdp_long,
+              inputs={'gdp_csv': 'gpd.csv'},
+              outputs={'output_path': 'gdppc_long2.parquet', 'long_path': 'gdppc_long.parquet'}),
+        Stage('population_merge', time_series_df_generation.build_whois_population,
+              inputs={'ipv4_path': 'ipv4_allocations.parquet', 'population_path': 'wpopdata_long_format_cleaned.parquet'},
+              outputs={'output_path': 'whois_v4_pop.parquet',
+                       'merged_path': 'final_ipv4_with_population.parquet',
+                       'adjusted_path': 'final_ipv4_with_population_adjusted.parquet'}),
+        Stage('gdp_merge', gpdstuff.build_whois_gdp,
+              inputs={'whois_path': 'whois_v4_pop.parquet', 'gdp_path': 'gdppc_long2.parquet'},
+              outputs={'output_path': 'whoisv4_pop_gdp_merged.parquet',
+                       'whois_dropped_path': 'whois_v4_dropped.parquet',
+                       'gdp_dropped_path': 'gdp_dropped.parquet',
+                       'gdp_backfilled_path': 'gdp_dropped_bkfill.parquet',
+                       'gdp_filled_path': 'gdp_dropped_filled.parquet',
+                       'gdp_nodots_path': 'gdp_dropped_filled_nodots.parquet'}),
+        Stage('final', gpdstuff.last_cleanup,
+              inputs={'input_path': 'whoisv4_pop_gdp_merged.parquet'},
+              outputs={'output_path': 'whoisv4_pop_gdp.parquet'}),
+        Stage('column_store', storage.build_column_stores,
+              inputs={'paths': served_paths},
+              outputs={'store_paths': [storage.column_store_path(path) for path in served_paths]}),
+    ]
+
+
+def code_modules(module, package=__package__):
+    '''``module`` and every module of ``package`` it imports, directly or through the others, sorted by name.'''
+    found = {module.__name__: module}
+    pending = [module]
+    while pending:
+        for value in vars(pending.pop()).values():
+            imported = value if inspect.ismodule(value) else sys.modules.get(getattr(value, '__module__', None) or '')
+            if imported is None or imported.__name__ in found or not imported.__name__.startswith(package + '.'):
+                continue
+            found[imported.__name__] = imported
+            pending.append(imported)
+    return [found[name] for name in sorted(found)]
+
+
+def run_stage(stage):
+    # Executed in a worker process; the function and its arguments are looked up by name there
+    started = time.perf_counter()
+    stage.func(**stage.inputs, **stage.outputs)
+    return time.perf_counter() - started
+
+
+class Pipeline:
+    '''Runs a stage graph, skipping every stage whose inputs and code hash to the same key as last time.
+
+    Keys are kept in a JSON manifest next to the data. File hashes are cached there as well, by size and
+    modification time, so an unchanged multi-hundred-MB input is not re-read just to find out it is unchanged.
+    '''
+
+    def __init__(self, stages, manifest_path=MANIFEST_PATH, max_workers=None, offline=False):
+        self.stages = {stage.name: stage for stage in stages}
+        self.manifest_path = manifest_path
+        self.max_workers = max_workers
+        self.offline = offline
+        self.producers = {path: stage.name for stage in stages for path in stage.output_paths()}
+        self.manifest = self.load_manifest()
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            manifest = {}
+        manifest.setdefault('stages', {})
+        manifest.setdefault('files', {})
+        return manifest
+
+    def save_manifest(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def dependencies(self, stage):
+        return {self.producers[path] for path in stage.input_paths() if path in self.producers}
+
+    def file_hash(self, path):
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        cached = self.manifest['files'].get(path)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha256']
+        digest = hashlib.sha256()
+        with open(path, 'rb') as data_file:
+            for chunk in iter(lambda: data_file.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        self.manifest['files'][path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+        return digest.hexdigest()
+
+    def stage_key(self, stage):
+        # Whole modules are hashed rather than just the entry point: the stage's own and every module of
+        # this package it reaches through its imports (storage, ip_math, country_codes, ...)
+        digest = hashlib.sha256()
+        digest.update(stage.name.encode())
+        for module in code_modules(sys.modules[stage.func.__module__]):
+            digest.update(module.__name__.encode())
+            digest.update(inspect.getsource(module).encode())
+        digest.update(json.dumps([stage.inputs, stage.outputs], sort_keys=True).encode())
+        for path in stage.input_paths():
+            digest.update(f'{path}:{self.file_hash(path)}'.encode())
+        return digest.hexdigest()
+
+    def is_fresh(self, stage, key):
+        if not stage.outputs_exist():
+            return False
+        if stage.network:
+            return self.offline
+        return self.manifest['stages'].get(stage.name, {}).get('key') == key
+
+    def run(self, force=()):
+        '''Run every stage that is out of date, independent stages in parallel. Returns {stage: status}.'''
+        unknown = set(force) - set(self.stages)
+        if unknown:
+            raise ValueError(f'Unknown stages: {sorted(unknown)}')
+
+        pending = dict(self.stages)
+        done, results, running = set(), {}, {}
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    # A stage can only be judged once everything it reads has been (re)built
+                    if not self.dependencies(stage) <= done:
+                        continue
+                    del pending[name]
+                    key = self.stage_key(stage)
+                    if name not in force and self.is_fresh(stage, key):
+                        logger.info('%s: up to date, skipped', name)
+                        results[name] = 'skipped'
+                        done.add(name)
+                        continue
+                    logger.info('%s: running', name)
+                    running[executor.submit(run_stage, stage)] = (name, key)
+
+                if not running:
+                    if pending:
+                        raise RuntimeError(f'Stages with unmet inputs: {sorted(pending)}')
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, key = running.pop(future)
+                    seconds = future.result()
+                    self.manifest['stages'][name] = {'key': key, 'seconds': round(seconds, 2), 'finished': time.time()}
+                    self.save_manifest()
+                    logger.info('%s: done in %.1fs', name, seconds)
+                    results[name] = 'ran'
+                    done.add(name)
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rebuild the datasets the dashboard reads, skipping unchanged stages.')
+    parser.add_argument('--force', nargs='*', default=[], help='stages to rebuild even if they look up to date')
+    parser.add_argument('--offline', action='store_true', help='reuse the cached RIR files instead of checking for new ones')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    pipeline = Pipeline(default_stages(), max_workers=args.workers, offline=args.offline)
+    started = time.perf_counter()
+    results = pipeline.run(force=args.force)
+    ran = [name for name, status in results.items() if status == 'ran']
+    logger.info('Pipeline finished in %.1fs, rebuilt: %s', time.perf_counter() - started, ', '.join(ran) or 'nothing')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import pandas as pd
+
+# Registry names as they appear in the delegated files -> labels used by the charts
+REGISTRY_LABELS = {
+    'afrinic': 'AFRINIC',
+    'apnic': 'APNIC',
+    'arin': 'ARIN',
+    'lacnic': 'LACNIC',
+    'ripencc': 'RIPE NCC',
+}
+UNKNOWN = 'Unknown'
+RIR_DTYPE = pd.CategoricalDtype(list(REGISTRY_LABELS.values()) + [UNKNOWN])
+IGNORED_REGISTRIES = ('none', 'iana', '')
+
+
+def registry_votes(frames, iso3_column='ISO-3', registry_column='Registry', ignore=IGNORED_REGISTRIES):
+    '''Number of delegations per (ISO-3, Registry) pair over all ``frames``.
+
+    Each frame is grouped on its own (categorical columns group on their codes), so only the small
+    per-pair counts are combined across frames.
+    '''
+    counts = []
+    for frame in frames:
+        if frame is None:
+            continue
+        pairs = frame.groupby([iso3_column, registry_column], observed=True).size()
+        counts.append(pairs[pairs > 0].rename('Votes').reset_index().astype({iso3_column: str, registry_column: str}))
+    votes = pd.concat(counts, ignore_index=True).rename(columns={iso3_column: 'ISO-3', registry_column: 'Registry'})
+    votes = votes[~votes['Registry'].str.lower().isin(ignore)]
+    return votes.groupby(['ISO-3', 'Registry'], as_index=False)['Votes'].sum()
+
+
+def majority_registry(votes):
+    '''One row per ISO-3 with the registry holding most of its delegations.
+
+    ``Share`` is the winner's fraction of the country's delegations, ``Registries`` how many registries
+    delegated to it at all; ``Tied`` marks a winner picked alphabetically among equally many votes.
+    '''
+    ranked = votes.sort_values(['ISO-3', 'Votes', 'Registry'], ascending=[True, False, True])
+    by_country = ranked.groupby('ISO-3', sort=False)['Votes']
+    table = ranked.drop_duplicates('ISO-3').set_index('ISO-3')
+    table['Total'] = by_country.sum()
+    table['Registries'] = by_country.size()
+    table['Share'] = table['Votes'] / table['Total']
+    runner_up = ranked[by_country.cumcount() == 1].set_index('ISO-3')['Votes']
+    table['Tied'] = runner_up.reindex(table.index).eq(table['Votes'])
+    return table
+
+
+def rir_mapping(table):
+    '''ISO-3 -> RIR label as a categorical Series, from a majority_registry table.'''
+    labels = table['Registry'].str.lower().map(REGISTRY_LABELS).fillna(UNKNOWN)
+    return labels.astype(RIR_DTYPE).rename('RIR')
+
+
+def attribute(codes, mapping):
+    '''RIR of each ISO-3 code in ``codes``: one indexer lookup, Unknown where the mapping has no entry.'''
+    codes = pd.Series(codes, copy=False)
+    positions = mapping.index.get_indexer(codes.astype(str))
+    rir_codes = mapping.cat.codes.to_numpy()[positions]
+    rir_codes[positions < 0] = RIR_DTYPE.categories.get_loc(UNKNOWN)
+    return pd.Series(pd.Categorical.from_codes(rir_codes, dtype=RIR_DTYPE), index=codes.index)
+
+
+def attribution_report(table, codes=None):
+    '''Coverage and conflicts of a majority_registry table, optionally for a given set of ISO-3 codes.
+
+    Returns a dict: ``countries`` attributed, ``conflicts`` (countries with delegations from more than one
+    registry) as a frame sorted by the winner's share, ``ties``, and for ``codes`` the ``covered`` share
+    and the ``unmapped`` codes.
+    '''
+    conflicts = table[table['Registries'] > 1].sort_values('Share')
+    report = {
+        'countries': len(table),
+        'conflicts': conflicts[['Registry', 'Votes', 'Total', 'Share', 'Tied']],
+        'ties': conflicts.index[conflicts['Tied']].tolist(),
+    }
+    if codes is not None:
+        distinct = pd.Index(pd.Series(codes, copy=False).dropna().astype(str).unique())
+        unmapped = distinct[~distinct.isin(table.index)]
+        report['covered'] = 1 - len(unmapped) / len(distinct) if len(distinct) else 1.0
+        report['unmapped'] = sorted(unmapped)
+    return report
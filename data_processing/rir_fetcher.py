@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+rir_urls = {
+    'afrinic': 'https://ftp.afrinic.net/pub/stats/afrinic/delegated-afrinic-extended-latest',
+    'apnic': 'https://ftp.apnic.net/stats/apnic/delegated-apnic-extended-latest',
+    'arin': 'https://ftp.arin.net/pub/stats/arin/delegated-arin-extended-latest',
+    'lacnic': 'https://ftp.lacnic.net/pub/stats/lacnic/delegated-lacnic-extended-latest',
+    'ripe': 'https://ftp.ripe.net/pub/stats/ripencc/delegated-ripencc-extended-latest'
+}
+
+DEFAULT_CACHE_DIR = 'rir_cache'
+CHUNK_SIZE = 1 << 16
+MD5_PATTERN = re.compile(r'\b([0-9a-fA-F]{32})\b')
+
+logger = logging.getLogger(__name__)
+
+
+class ChecksumMismatchError(Exception):
+    pass
+
+
+class RIRFetchError(Exception):
+    '''Registries that could not be fetched and had no cached copy to fall back on.
+
+    ``errors`` maps each of them to its exception; ``paths`` holds the registries that were fetched (or
+    served from the cache) anyway.
+    '''
+
+    def __init__(self, errors, paths):
+        self.errors = errors
+        self.paths = paths
+        super().__init__('; '.join(f'{rir.upper()}: {error}' for rir, error in errors.items()))
+
+
+def file_md5(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as cached_file:
+        for chunk in iter(lambda: cached_file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CachedFetcher:
+    '''Downloads files into a local cache directory using conditional GET.
+
+    Every cached file gets a small ``.meta.json`` sidecar holding the ETag and
+    Last-Modified headers of the response it came from, which are replayed as
+    If-None-Match / If-Modified-Since on the next fetch. A 304 answer means the
+    cached copy is reused without any body being transferred.
+    '''
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, timeout=60):
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def cache_path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def load_meta(self, name):
+        try:
+            with open(self.cache_path(name) + '.meta.json') as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_meta(self, name, meta):
+        self.atomic_write(self.cache_path(name) + '.meta.json', json.dumps(meta, indent=2).encode())
+
+    def atomic_write(self, path, payload):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(payload)
+        os.replace(tmp_path, path)
+
+    def conditional_headers(self, name):
+        # Only send validators if the cached body is actually still on disk
+        if not os.path.exists(self.cache_path(name)):
+            return {}
+        meta = self.load_meta(name)
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def fetch(self, name, url, expected_md5=None, session=None, conditional=True):
+        '''Fetch ``url`` into the cache as ``name`` and return (path, changed).
+
+        The body is streamed to a temporary file while its MD5 is computed, and
+        is only moved into place once it matches ``expected_md5`` (when given).
+        A 304 is only trusted if the cached copy matches ``expected_md5`` too;
+        otherwise the file is downloaded again without validators.
+        '''
+        session = session or requests.Session()
+        path = self.cache_path(name)
+        headers = self.conditional_headers(name) if conditional else {}
+
+        with session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304:
+                if not expected_md5 or file_md5(path) == expected_md5.lower():
+                    return path, False
+                logger.warning('%s: cached copy does not match md5 %s, downloading it again', name, expected_md5)
+                return self.fetch(name, url, expected_md5=expected_md5, session=session, conditional=False)
+            response.raise_for_status()
+
+            digest = hashlib.md5()
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as tmp_file:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        digest.update(chunk)
+                        tmp_file.write(chunk)
+                md5 = digest.hexdigest()
+                if expected_md5 and md5 != expected_md5.lower():
+                    raise ChecksumMismatchError(f'{name}: expected md5 {expected_md5}, got {md5}')
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            self.save_meta(name, {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'md5': md5,
+            })
+        return path, True
+
+    def fetch_text(self, name, url, session=None):
+        path, changed = self.fetch(name, url, session=session)
+        with open(path, encoding='utf-8', errors='replace') as cached_file:
+            return cached_file.read(), changed
+
+
+def parse_md5_file(text):
+    # Registries publish either "MD5 (file) = <hash>" or "<hash>  file"
+    match = MD5_PATTERN.search(text)
+    return match.group(1).lower() if match else None
+
+
+def fetch_rir_file(fetcher, rir, url, verify_checksum=True):
+    session = requests.Session()
+    expected_md5 = None
+    if verify_checksum:
+        try:
+            md5_text, _ = fetcher.fetch_text(f'{rir}.md5', url + '.md5', session=session)
+            expected_md5 = parse_md5_file(md5_text)
+        except requests.RequestException as e:
+            logger.warning('No checksum available for %s: %s', rir.upper(), e)
+
+    # The checksum only changes together with the data file, so a cached body that
+    # already matches the published checksum needs no request at all
+    path = fetcher.cache_path(rir)
+    meta = fetcher.load_meta(rir)
+    if expected_md5 and meta.get('md5') == expected_md5 and os.path.exists(path) and file_md5(path) == expected_md5:
+        return rir, path, False
+
+    path, changed = fetcher.fetch(rir, url, expected_md5=expected_md5, session=session)
+    return rir, path, changed
+
+
+def fetch_rir_files(urls=None, cache_dir=DEFAULT_CACHE_DIR, verify_checksum=True, max_workers=None):
+    '''Download all delegated-extended files concurrently into ``cache_dir``.
+
+    Returns a dict of registry name to local file path. ``urls`` defaults to the
+    five live RIR endpoints but can point anywhere, e.g. a local test server.
+    A registry whose download fails (HTTP error, checksum mismatch) falls back
+    to its last good cached copy; RIRFetchError is raised for the ones that
+    have none, after every other registry has been fetched.
+    '''
+    urls = urls or rir_urls
+    fetcher = CachedFetcher(cache_dir)
+    paths = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(urls)) as executor:
+        futures = {rir: executor.submit(fetch_rir_file, fetcher, rir, url, verify_checksum) for rir, url in urls.items()}
+        for rir, future in futures.items():
+            try:
+                _, path, changed = future.result()
+            except (requests.RequestException, ChecksumMismatchError, OSError) as e:
+                path = fetcher.cache_path(rir)
+                if not os.path.exists(path):
+                    errors[rir] = e
+                    continue
+                logger.warning('%s: fetch failed, using the last good cached copy: %s', rir.upper(), e)
+                paths[rir] = path
+                continue
+            logger.info('%s: %s', rir.upper(), 'downloaded' if changed else 'unchanged, using cache')
+            paths[rir] = path
+    if errors:
+        raise RIRFetchError(errors, paths)
+    return paths
@@ -0,0 +1,120 @@
+import bz2
+import gzip
+import logging
+import resource
+import sys
+import time
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+RIR_COLUMNS = ['Registry', 'Code', 'Type', 'Start', 'Value', 'Date', 'Status', 'Extensions']
+CATEGORICAL_COLUMNS = ['Registry', 'Code', 'Type', 'Status']
+RECORD_TYPES = ['ipv4', 'ipv6', 'asn']
+CHUNK_ROWS = 100_000
+
+logger = logging.getLogger(__name__)
+
+
+def open_rir_source(source):
+    # Accepts a path (optionally .gz/.bz2 as found in the RIR archives) or an already open binary stream
+    if not isinstance(source, str):
+        return source
+    if source.endswith('.gz'):
+        return gzip.open(source, 'rb')
+    if source.endswith('.bz2'):
+        return bz2.open(source, 'rb')
+    return open(source, 'rb')
+
+
+def type_rir_chunk(chunk):
+    # Header (version) and summary lines share the file with the records; neither has a real start address
+    chunk = chunk[chunk['Type'].isin(RECORD_TYPES) & (chunk['Start'] != '*')]
+    chunk = chunk.reset_index(drop=True)
+    for column in CATEGORICAL_COLUMNS:
+        chunk[column] = chunk[column].fillna('').astype('category')
+    chunk['Value'] = pd.to_numeric(chunk['Value'], errors='coerce').fillna(0).astype('uint32')
+    chunk['Date'] = pd.to_datetime(chunk['Date'], format='%Y%m%d', errors='coerce')
+    return chunk
+
+
+def parse_rir_chunks(source, chunk_size=CHUNK_ROWS, stats=None):
+    '''Yield typed DataFrame chunks of at most ``chunk_size`` records from a delegated-extended file.
+
+    The file is consumed incrementally by the C CSV reader, so memory is bounded by the chunk size
+    rather than the file size. If a ``stats`` dict is passed it is filled with rows and seconds.
+    '''
+    stats = stats if stats is not None else {}
+    stats.setdefault('rows', 0)
+    stats.setdefault('seconds', 0.0)
+
+    stream = open_rir_source(source)
+    try:
+        reader = pd.read_csv(
+            stream,
+            sep='|',
+            header=None,
+            names=RIR_COLUMNS,
+            dtype=str,
+            comment='#',
+            keep_default_na=False,
+            na_values=[''],
+            on_bad_lines='skip',
+            chunksize=chunk_size,
+        )
+        while True:
+            # Only the time spent reading and typing is counted, not what the consumer does with a chunk
+            started = time.perf_counter()
+            raw_chunk = next(reader, None)
+            if raw_chunk is None:
+                stats['seconds'] += time.perf_counter() - started
+                break
+            chunk = type_rir_chunk(raw_chunk)
+            stats['rows'] += len(chunk)
+            stats['seconds'] += time.perf_counter() - started
+            yield chunk
+    finally:
+        if stream is not source:
+            stream.close()
+
+
+def concat_rir_chunks(chunks):
+    # Each chunk carries its own categories, so they are unioned instead of falling back to object
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype='object') for column in RIR_COLUMNS})
+    combined = pd.concat(chunks, ignore_index=True)
+    for column in CATEGORICAL_COLUMNS:
+        combined[column] = pd.Categorical(union_categoricals([chunk[column] for chunk in chunks], ignore_order=True))
+    return combined
+
+
+def read_rir_frame(source, chunk_size=CHUNK_ROWS, stats=None):
+    return concat_rir_chunks(parse_rir_chunks(source, chunk_size, stats))
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def report_parse_stats(stats, label='RIR parse'):
+    rows_per_second = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+    logger.info('%s: %s rows in %.2fs (%s rows/s), peak RSS %.1f MB',
+                label, f"{stats['rows']:,}", stats['seconds'], f'{rows_per_second:,.0f}', peak_rss_mb())
+
+
+if __name__ == '__main__':
+    # Usage: python -m data_processing.rir_parser delegated-*-extended-2015*.gz ...
+    # Streams every file without keeping the chunks, which is how the archive is benchmarked
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    total = {'rows': 0, 'seconds': 0.0}
+    for path in sys.argv[1:]:
+        file_stats = {}
+        for _ in parse_rir_chunks(path, stats=file_stats):
+            pass
+        report_parse_stats(file_stats, label=path)
+        total['rows'] += file_stats['rows']
+        total['seconds'] += file_stats['seconds']
+    report_parse_stats(total, label='Total')
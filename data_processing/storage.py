@@ -0,0 +1,351 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no advisory file locks, every process writes its snapshot as it did before
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Declared on-disk types for every column that appears in the ETL intermediates. Strings with few
+# distinct values are stored dictionary-encoded, which is what keeps the Parquet files small.
+SCHEMA = {
+    'Registry': 'category',
+    'Code': 'category',
+    'Type': 'category',
+    'Status': 'category',
+    'ISO-3': 'category',
+    'Country': 'category',
+    'Country_x': 'category',
+    'Country_y': 'category',
+    'Start': 'string',
+    'Extensions': 'string',
+    'Year': 'int16',
+    'Value': 'uint32',
+    'Prefix': 'uint8',
+    'StartInt': 'uint32',
+    'EndInt': 'uint32',
+    'StartHi': 'uint64',
+    'StartLo': 'uint64',
+    'EndHi': 'uint64',
+    'EndLo': 'uint64',
+    'Date': 'datetime64[ns]',
+    'Population': 'float64',
+    'GPDPerCap': 'float64',
+    'GDPPerCap': 'float64',
+}
+NULLABLE_INTEGERS = {'int16': 'Int16', 'uint32': 'UInt32', 'uint8': 'UInt8', 'uint64': 'UInt64'}
+COLUMN_STORE_SUFFIX = '.columns'
+# How much older than the current version of a column store an unused version must be before it is removed
+STALE_STORE_SECONDS = 60
+SNAPSHOT_MAGIC = b'IPSNAP'
+# Bumped whenever what a snapshot holds changes shape, which invalidates every snapshot written before
+SNAPSHOT_FORMAT = 1
+
+
+def apply_schema(df, schema=SCHEMA):
+    '''Cast the columns of ``df`` that appear in ``schema``; columns already of the right type are left alone.'''
+    for column, dtype in schema.items():
+        if column not in df.columns or str(df[column].dtype) == dtype:
+            continue
+        if dtype in NULLABLE_INTEGERS or dtype == 'float64':
+            values = pd.to_numeric(df[column], errors='coerce')
+            if dtype in NULLABLE_INTEGERS and values.isna().any():
+                # Integer columns with gaps keep them instead of silently becoming floats
+                dtype = NULLABLE_INTEGERS[dtype]
+            df[column] = values.astype(dtype)
+        elif dtype.startswith('datetime64'):
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+        elif dtype == 'category':
+            df[column] = df[column].astype('category')
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def is_parquet(path):
+    return path.endswith('.parquet')
+
+
+def csv_fallback(path):
+    return os.path.splitext(path)[0] + '.csv'
+
+
+def read_dataset(path, categorical=True, **csv_kwargs):
+    '''Read an ETL dataset, typed according to SCHEMA.
+
+    ``.parquet`` paths are read directly (falling back to a CSV of the same name if only that exists yet);
+    ``.csv`` paths are parsed and then cast. With ``categorical=False`` dictionary-encoded and string
+    columns are handed back as plain object columns, for stages that fill or rewrite strings freely.
+    '''
+    if is_parquet(path) and os.path.exists(path):
+        df = pd.read_parquet(path)
+    else:
+        csv_path = csv_fallback(path) if is_parquet(path) else path
+        df = apply_schema(pd.read_csv(csv_path, low_memory=False, **csv_kwargs))
+    if not categorical:
+        for column in df.columns:
+            if isinstance(df[column].dtype, (pd.CategoricalDtype, pd.StringDtype)):
+                df[column] = df[column].astype(object)
+    return df
+
+
+def write_dataset(df, path):
+    '''Write ``df`` to ``path`` with the declared schema; ``.csv`` paths are still written as CSV.'''
+    df = apply_schema(df.copy())
+    if is_parquet(path):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return df
+
+
+def column_store_path(path):
+    return os.path.splitext(path)[0] + COLUMN_STORE_SUFFIX
+
+
+def column_store_versions(store_path):
+    # Every version of a store is a hidden sibling directory, ".<name>-<random>"
+    parent, name = os.path.split(os.path.abspath(store_path))
+    return [os.path.join(parent, entry) for entry in os.listdir(parent) if entry.startswith(f'.{name}-')]
+
+
+def write_column_store(df, store_path):
+    '''Write ``df`` as a directory of ``.npy`` files, one per column, that can be memory-mapped back.
+
+    Categorical and string columns are stored dictionary-encoded (integer codes plus their categories),
+    nullable integers as values plus a mask. Each write goes to a new version directory next to
+    ``store_path``, which is a symlink swapped over to the finished version in one rename: readers see the
+    old store or the new one, never none, and workers writing the same store at once each swap in a whole
+    one. The version it replaced is kept for readers still opening it and removed by the write after.
+    '''
+    parent, name = os.path.split(os.path.abspath(store_path))
+    version_path = tempfile.mkdtemp(dir=parent, prefix=f'.{name}-')
+    columns = []
+    for position, column_name in enumerate(df.columns):
+        series = df[column_name]
+        stem = os.path.join(version_path, f'{position:03d}')
+        column = {'name': column_name, 'dtype': str(series.dtype)}
+        is_numeric = pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype)
+        if isinstance(series.dtype, pd.CategoricalDtype) or not is_numeric:
+            categorical = series.astype('category')
+            np.save(stem + '.codes.npy', categorical.cat.codes.to_numpy())
+            np.save(stem + '.categories.npy', categorical.cat.categories.astype(str).to_numpy(dtype=str))
+            column['kind'] = 'categorical'
+        elif isinstance(series.dtype, pd.api.extensions.ExtensionDtype) and pd.api.types.is_integer_dtype(series.dtype):
+            np.save(stem + '.npy', series.to_numpy(dtype=series.dtype.numpy_dtype, na_value=0))
+            np.save(stem + '.mask.npy', series.isna().to_numpy())
+            column['kind'] = 'masked'
+        else:
+            np.save(stem + '.npy', series.to_numpy())
+            column['kind'] = 'plain'
+        columns.append(column)
+
+    with open(os.path.join(version_path, 'columns.json'), 'w') as manifest_file:
+        json.dump({'rows': len(df), 'columns': columns}, manifest_file, indent=2)
+
+    replaced = os.path.realpath(store_path) if os.path.islink(store_path) else None
+    try:
+        swap_in_version(version_path, store_path)
+    except BaseException:
+        shutil.rmtree(version_path, ignore_errors=True)
+        raise
+    current = os.path.realpath(store_path)
+    for stale in column_store_versions(store_path):
+        # Earlier versions than the one just replaced. Another writer's version, finished a moment ago and
+        # about to be swapped in, is not older than the current one by the grace period and is left alone
+        if stale not in (current, replaced) and os.path.getmtime(stale) < os.path.getmtime(current) - STALE_STORE_SECONDS:
+            shutil.rmtree(stale, ignore_errors=True)
+    return store_path
+
+
+def swap_in_version(version_path, store_path):
+    link_path = version_path + '.link'
+    try:
+        os.symlink(os.path.basename(version_path), link_path)
+    except (OSError, NotImplementedError):
+        # No symlinks (Windows without the privilege): the version directory itself is renamed into place
+        swap_in_directory(version_path, store_path)
+        return
+    if os.path.isdir(store_path) and not os.path.islink(store_path):
+        # A store written before stores were versioned is moved aside once; another process may have
+        # moved it already
+        legacy_path = tempfile.mkdtemp(dir=os.path.dirname(version_path), prefix='.old-')
+        with contextlib.suppress(OSError):
+            os.replace(store_path, os.path.join(legacy_path, 'store'))
+        shutil.rmtree(legacy_path, ignore_errors=True)
+    try:
+        os.replace(link_path, store_path)
+    except OSError:
+        os.remove(link_path)
+        raise
+
+
+def swap_in_directory(version_path, store_path):
+    old_path = tempfile.mkdtemp(dir=os.path.dirname(version_path), prefix='.old-')
+    with contextlib.suppress(OSError):
+        # Another process may have moved the old store aside already
+        os.replace(store_path, os.path.join(old_path, 'store'))
+    try:
+        os.replace(version_path, store_path)
+    except OSError:
+        # Another process swapped in its store between the two renames: that one is built from the same data
+        shutil.rmtree(version_path, ignore_errors=True)
+        if not os.path.exists(os.path.join(store_path, 'columns.json')):
+            raise
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def open_column_store(store_path):
+    '''Open a column store as a DataFrame whose numeric columns and category codes are memory-mapped.
+
+    Nothing is parsed or copied: processes opening the same store share its pages through the page cache,
+    and only the distinct category labels are materialised per process. The mapped columns are read-only,
+    so code that modifies the frame in place has to copy first (adding or replacing columns is fine).
+    '''
+    with open(os.path.join(store_path, 'columns.json')) as manifest_file:
+        manifest = json.load(manifest_file)
+    # A zero-length array cannot be mapped
+    mmap_mode = 'r' if manifest['rows'] else None
+    data = {}
+    for position, column in enumerate(manifest['columns']):
+        stem = os.path.join(store_path, f'{position:03d}')
+        if column['kind'] == 'categorical':
+            codes = np.load(stem + '.codes.npy', mmap_mode=mmap_mode)
+            categories = pd.Index(np.load(stem + '.categories.npy').astype(object))
+            data[column['name']] = pd.Categorical.from_codes(codes, categories=categories)
+        elif column['kind'] == 'masked':
+            values = np.load(stem + '.npy', mmap_mode=mmap_mode)
+            mask = np.load(stem + '.mask.npy', mmap_mode=mmap_mode)
+            data[column['name']] = pd.arrays.IntegerArray(values, mask)
+        else:
+            data[column['name']] = np.load(stem + '.npy', mmap_mode=mmap_mode)
+    return pd.DataFrame(data, copy=False)
+
+
+def column_store_is_current(path, store_path):
+    manifest_path = os.path.join(store_path, 'columns.json')
+    if not os.path.exists(manifest_path):
+        return False
+    # Without the source (e.g. a deployment that only ships the stores) the store is all there is
+    return not os.path.exists(path) or os.path.getmtime(manifest_path) >= os.path.getmtime(path)
+
+
+def build_column_stores(paths, store_paths):
+    # Pipeline stage: prebuild the stores so no web worker ever has to
+    for path, store_path in zip(paths, store_paths):
+        write_column_store(read_dataset(path), store_path)
+
+
+def dataset_version(path):
+    '''Short token that changes whenever the dataset, or the column store serving it, is rewritten.'''
+    store_manifest = os.path.join(column_store_path(path), 'columns.json')
+    stamps = [f'{candidate}:{os.stat(candidate).st_size}:{os.stat(candidate).st_mtime_ns}'
+              for candidate in (path, store_manifest) if os.path.exists(candidate)]
+    return hashlib.sha1('|'.join(stamps).encode()).hexdigest()[:12]
+
+
+def read_dataset_mapped(path):
+    '''Like read_dataset, but served from the memory-mapped column store next to ``path``.
+
+    The store is (re)built from ``path`` first if it is missing or older than the dataset.
+    '''
+    store_path = column_store_path(path)
+    if not column_store_is_current(path, store_path):
+        write_column_store(read_dataset(path), store_path)
+    return open_column_store(store_path)
+
+
+def write_snapshot(path, key, state):
+    '''Write ``state`` (any picklable object) to ``path`` as one binary file, stamped with ``key``.
+
+    The layout is a magic number, a length-prefixed JSON header holding the format and ``key``, then the
+    pickled state (protocol 5, so array buffers are written as-is). It is written next to ``path`` and
+    renamed into place. Snapshots are a local cache the process writes for itself: never load one from
+    somewhere untrusted, unpickling runs code.
+    '''
+    header = json.dumps({'format': SNAPSHOT_FORMAT, 'key': key}, default=str).encode()
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as snapshot_file:
+            snapshot_file.write(SNAPSHOT_MAGIC + struct.pack('<I', len(header)) + header)
+            pickle.dump(state, snapshot_file, protocol=5)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+@contextlib.contextmanager
+def snapshot_lock(path):
+    '''Non-blocking exclusive lock on ``path``'s lock file: yields whether this process got it.
+
+    Worker processes sharing a snapshot elect their writer with it; the lock goes with the process, so a
+    writer that dies never leaves it held.
+    '''
+    if fcntl is None:
+        yield True
+        return
+    with open(path + '.lock', 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_snapshot_header(snapshot_file):
+    if snapshot_file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        return None
+    header_length, = struct.unpack('<I', snapshot_file.read(4))
+    header = json.loads(snapshot_file.read(header_length))
+    return header if header.get('format') == SNAPSHOT_FORMAT else None
+
+
+def read_snapshot_key(path):
+    '''Key of the snapshot at ``path`` without unpickling its state; None if there is no readable one.'''
+    try:
+        with open(path, 'rb') as snapshot_file:
+            header = read_snapshot_header(snapshot_file)
+    except (OSError, ValueError, struct.error):
+        return None
+    return header['key'] if header else None
+
+
+def read_snapshot(path, key_matches=None):
+    '''(key, state) of the snapshot at ``path``, or None if there is none or it is of another format.
+
+    ``key_matches`` is called with the header key before anything is unpickled, and a false answer skips
+    the (much larger) state.
+    '''
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as snapshot_file:
+            header = read_snapshot_header(snapshot_file)
+            if header is None:
+                return None
+            if key_matches is not None and not key_matches(header['key']):
+                return None
+            return header['key'], pickle.load(snapshot_file)
+    except (OSError, ValueError, struct.error, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+        logger.warning('Ignoring unreadable snapshot %s: %s', path, e)
+        return None
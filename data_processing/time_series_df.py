@@ -1,8 +1,10 @@
 import pandas as pd
 
+from data_processing.storage import read_dataset, write_dataset
+
 def load_and_prepare_data():
     # Load WHOIS IPv4 data
-    ipv4_df = pd.read_csv('ipv4_allocations.csv')
+    ipv4_df = read_dataset('ipv4_allocations.parquet', categorical=False)
 
     # Load population data, assuming the first row is headers with the country names
     population_df = pd.read_csv('wpopdata.csv', header=0)
@@ -39,8 +41,8 @@ def load_and_prepare_data():
 
 def save_processed_data(df):
     # Save the processed DataFrame to CSV
-    df.to_csv('processed_ipv4_population_data.csv', index=False)
-    print("Data processing complete. File saved: processed_ipv4_population_data.csv")
+    write_dataset(df, 'processed_ipv4_population_data.parquet')
+    print("Data processing complete. File saved: processed_ipv4_population_data.parquet")
 
 # Execute the processing
 processed_data = load_and_prepare_data()
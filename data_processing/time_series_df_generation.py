@@ -2,8 +2,11 @@ import pandas as pd
 import chardet
 import numpy as np
 
+from data_processing.rir_attribution import majority_registry, registry_votes
+from data_processing.storage import read_dataset, write_dataset
+
 def process_new_dataframe():
-    ipv4_df = pd.read_csv('ipv4_allocations.csv')
+    ipv4_df = read_dataset('ipv4_allocations.parquet', categorical=False)
     population_df = pd.read_csv('wpopdata.csv')
 
     print(ipv4_df.head())
@@ -14,7 +17,7 @@ def process_new_dataframe():
     return long_population_df, ipv4_df
 
 
-def convert_wpop_to_long(population_df):
+def convert_wpop_to_long(population_df, output_path='wpopdata_long_format.parquet'):
 
     # Transform the DataFrame from wide to long format
     df_long = pd.melt(population_df, id_vars=['Country', 'ISO-3'], var_name='Year', value_name='Population')
@@ -23,12 +26,12 @@ def convert_wpop_to_long(population_df):
     df_long['Year'] = df_long['Year'].astype(int)
 
     # Save the transformed DataFrame to a new CSV file
-    df_long.to_csv('wpopdata_long_format.csv', mode='w', index=False)
+    write_dataset(df_long, output_path)
     return df_long
 
 def check_naming_inconsitencies():
-    ipv4_df = pd.read_csv('ipv4_allocations.csv')
-    long_population_df = pd.read_csv('wpopdata_long_format_cleaned.csv')
+    ipv4_df = read_dataset('ipv4_allocations.parquet', categorical=False)
+    long_population_df = read_dataset('wpopdata_long_format_cleaned.parquet', categorical=False)
     # Get the unique ISO-3 codes from both datasets
     iso3_df1 = set(ipv4_df['ISO-3'].unique())
     iso3_df2 = set(long_population_df['ISO-3'].unique())
@@ -43,8 +46,8 @@ def check_naming_inconsitencies():
 
 #check_naming_inconsitencies()
 
-def process_and_save_datasets(input_csv_path):
-    df_long = pd.read_csv(input_csv_path)
+def process_and_save_datasets(input_path, aggregates_path=None, cleaned_path=None):
+    df_long = read_dataset(input_path, categorical=False)
 
     # Rename 'CHI' to 'GGY'
     df_long['ISO-3'] = df_long['ISO-3'].replace('CHI', 'GGY')
@@ -60,29 +63,31 @@ def process_and_save_datasets(input_csv_path):
     # Filter the DataFrame for aggregate and special codes
     df_aggregate = df_long[df_long['ISO-3'].isin(aggregate_and_special_codes)]
 
-    df_aggregate.to_csv(input_csv_path.replace('.csv', '_aggregate_nationality_long.csv'), index=False)
+    write_dataset(df_aggregate, aggregates_path or input_path.replace('.parquet', '_aggregate_nationality_long.parquet'))
 
     # Remove the aggregate and special codes entries from the original DataFrame
     df_cleaned = df_long[~df_long['ISO-3'].isin(aggregate_and_special_codes)]
 
-    df_cleaned.to_csv(input_csv_path.replace('.csv', '_cleaned.csv'), index=False)
+    cleaned_path = cleaned_path or input_path.replace('.parquet', '_cleaned.parquet')
+    write_dataset(df_cleaned, cleaned_path)
+    return cleaned_path
 
-#process_and_save_datasets('wpopdata_long_format.csv')
+#process_and_save_datasets('wpopdata_long_format.parquet')
 
 
 
 def check_naming_inconsitencies():
-    df_long_format = pd.read_csv('wpopdata_long_format.csv')
+    df_long_format = read_dataset('wpopdata_long_format.parquet', categorical=False)
 
     # Filter for rows with the ISO-3 code 'INX'
     inx_rows = df_long_format[df_long_format['ISO-3'] == 'INX']
 
     print(inx_rows)
-    wpop_df = 'wpopdata_long_format.csv'
-    whois_ipv4_df = 'ipv4_allocations.csv'
+    wpop_df = 'wpopdata_long_format.parquet'
+    whois_ipv4_df = 'ipv4_allocations.parquet'
 
-    df1 = pd.read_csv(wpop_df)
-    df2 = pd.read_csv(whois_ipv4_df)
+    df1 = read_dataset(wpop_df, categorical=False)
+    df2 = read_dataset(whois_ipv4_df, categorical=False)
 
     # Check if 'CHI' is present in both datasets
     chi_in_df1 = 'CHI' in df1['ISO-3'].unique()
@@ -95,8 +100,8 @@ def check_naming_inconsitencies():
 #process_new_dataframe()
 
 def check_code_consistency():
-    ipv4_df = pd.read_csv('ipv4_allocations.csv')
-    long_population_df = pd.read_csv('wpopdata_long_format_cleaned.csv')
+    ipv4_df = read_dataset('ipv4_allocations.parquet', categorical=False)
+    long_population_df = read_dataset('wpopdata_long_format_cleaned.parquet', categorical=False)
 
     # Check specific cases
     channel_islands_df1 = {'GGY', 'JEY'}.intersection(set(ipv4_df['ISO-3'].unique()))
@@ -117,18 +122,18 @@ def check_code_consistency():
 # Usage
 #check_code_consistency()
 
-def append_two_pop_csvs():
-    df1 = pd.read_csv('wpopdata_long_format_cleaned.csv')
+def append_two_pop_csvs(population_path='wpopdata_long_format_cleaned.parquet', additions_path='manual_additions_population.csv'):
+    df1 = read_dataset(population_path, categorical=False)
 
     # Load the manual additions
-    df2 = pd.read_csv('manual_additions_population.csv', encoding='ISO-8859-1')
+    df2 = pd.read_csv(additions_path, encoding='ISO-8859-1')
 
     # Concatenate the two DataFrames
     combined_df = pd.concat([df1, df2], ignore_index=True)
 
     # Save the combined data back to the original file
     # or to a new file if you want to preserve the original separately
-    combined_df.to_csv('wpopdata_long_format_cleaned.csv', index=False)#
+    write_dataset(combined_df, population_path)#
 
 #append_two_pop_csvs()
 
@@ -141,14 +146,14 @@ def get_encoding():
 #encoding = get_encoding()
 #print("Detected encoding:", encoding)
 
-#ipv4 = pd.read_csv('ipv4_allocations.csv')
+#ipv4 = read_dataset('ipv4_allocations.parquet', categorical=False)
 #unique_countries = ipv4['Country'].unique()
 #print(unique_countries)
 
 def process_and_merge_datasets(pop_data_path, ipv4_data_path, output_path):
     # Load the datasets
-    wpop_data = pd.read_csv(pop_data_path)
-    ipv4_data = pd.read_csv(ipv4_data_path)
+    wpop_data = read_dataset(pop_data_path, categorical=False)
+    ipv4_data = read_dataset(ipv4_data_path, categorical=False)
 
     # Define codes to drop and skip
     codes_to_drop = ['ALA', 'EUR', 'IOT', 'TKL', 'GLP', 'BES']
@@ -173,17 +178,17 @@ def process_and_merge_datasets(pop_data_path, ipv4_data_path, output_path):
     combined_data.fillna(method='bfill', inplace=True)  # This line is optional based on the requirement
 
     # Save or return the processed data
-    combined_data.to_csv(output_path, index=False)
+    write_dataset(combined_data, output_path)
     return combined_data
 
 # Example usage
-#processed_data = process_and_merge_datasets('wpopdata_long_format_cleaned.csv', 'ipv4_allocations.csv', 'combined_dataset.csv')
+#processed_data = process_and_merge_datasets('wpopdata_long_format_cleaned.parquet', 'ipv4_allocations.parquet', 'combined_dataset.parquet')
 
 # This one might be successful
-def merging_attempt():
+def merging_attempt(ipv4_path='ipv4_allocations.parquet', population_path='wpopdata_long_format_cleaned.parquet', output_path='final_ipv4_with_population.parquet'):
     # Load the datasets
-    ipv4_allocations = pd.read_csv('ipv4_allocations.csv', parse_dates=['Date'])
-    wpopdata = pd.read_csv('wpopdata_long_format_cleaned.csv')
+    ipv4_allocations = read_dataset(ipv4_path, categorical=False)
+    wpopdata = read_dataset(population_path, categorical=False)
 
     # Generate a full range of years from 1982 to 2023 for each unique ISO-3 code
     all_years = range(1982, 2024)
@@ -203,7 +208,8 @@ def merging_attempt():
 
     # Apply defaults to fill in missing data
     for column, default in defaults.items():
-        if full_ipv4_allocations[column].dtype == 'object':
+        # Dates are typed on disk now, so they take their NaT default instead of 0 like the numeric columns
+        if not pd.api.types.is_numeric_dtype(full_ipv4_allocations[column]):
             full_ipv4_allocations[column].fillna(default, inplace=True)
         else:
             full_ipv4_allocations[column].fillna(0, inplace=True)  # For numerical columns like Start, Value, Prefix
@@ -213,7 +219,7 @@ def merging_attempt():
     final_dataset['Population'].fillna(0, inplace=True)  # Assuming missing population should be zero
 
     # Save the final dataset to CSV
-    final_dataset.to_csv('final_ipv4_with_population.csv', index=False)
+    write_dataset(final_dataset, output_path)
 
     # Optionally print some rows to verify the contents
     print(final_dataset.head())
@@ -242,7 +248,7 @@ def testing_for_discrepancies(final_dataset):
         actual_population = final_dataset[(final_dataset['Year'] == year) & (final_dataset['ISO-3'] == country)]['Population'].iloc[0]
         print(f"Population for {country} in {year}: {actual_population} (Expected: {population})")
 
-final_dataset = pd.read_csv('final_ipv4_with_population.csv')
+#final_dataset = read_dataset('final_ipv4_with_population.parquet', categorical=False)
 #testing_for_discrepancies(final_dataset)
 
 
@@ -273,7 +279,7 @@ def load_and_clean_data(filepath):
     return df
 
 def load_and_clean_data(filepath):
-    df = pd.read_csv(filepath, low_memory=False)
+    df = read_dataset(filepath, categorical=False)
     # Convert problematic columns to numeric, handling errors
     for column in ['Value', 'Population']:  # Add or adjust columns based on your dataset specifics
         df[column] = pd.to_numeric(df[column], errors='coerce')
@@ -281,20 +287,10 @@ def load_and_clean_data(filepath):
     return df
 
 def refine_and_clean_dataset(df):
-    # Determine the most common 'Registry' for each country
-    common_rir = df[df['Registry'] != 'none'].groupby('ISO-3')['Registry'].agg(lambda x: pd.Series.mode(x)[0])
-
-    # Function to infer the RIR for rows where 'Registry' is 'none'
-    def infer_rir(row):
-        if row['Registry'] == 'none':
-            # Get the most common RIR for that country from the precomputed series
-            return common_rir.get(row['ISO-3'], 'none')
-        else:
-            return row['Registry']
-    
-    # Efficiently apply the function only to rows where 'Registry' is 'none'
+    # Rows without a registry get the one holding most of their country's delegations, in one lookup
+    majority = majority_registry(registry_votes([df]))['Registry']
     mask = df['Registry'] == 'none'
-    df.loc[mask, 'Registry'] = df.loc[mask].apply(infer_rir, axis=1)
+    df.loc[mask, 'Registry'] = df.loc[mask, 'ISO-3'].map(majority).fillna('none')
 
     # Columns to drop
     columns_to_drop = ['Code', 'Extensions', 'Country_x']
@@ -303,10 +299,10 @@ def refine_and_clean_dataset(df):
     return df
 
 # Usage
-# filepath = 'final_ipv4_with_population.csv'
+# filepath = 'final_ipv4_with_population.parquet'
 # final_dataset = load_and_clean_data(filepath)
 # final_dataset = refine_and_clean_dataset(final_dataset)
-# final_dataset.to_csv('final_ipv4_with_population_refined.csv', index=False)
+# write_dataset(final_dataset, 'final_ipv4_with_population_refined.parquet')
 
 
 
@@ -315,7 +311,7 @@ def refine_and_clean_dataset(df):
 
 def diagnose_and_handle_mixed_types(filepath):
     # Load the dataset with low_memory=False to avoid initial DtypeWarnings
-    df = pd.read_csv(filepath, low_memory=False)
+    df = read_dataset(filepath, categorical=False)
     
     # Identify columns with mixed types
     mixed_type_columns = []
@@ -341,7 +337,7 @@ def diagnose_and_handle_mixed_types(filepath):
     return df
 
 # Usage
-# filepath = 'final_ipv4_with_population.csv'
+# filepath = 'final_ipv4_with_population.parquet'
 # df = diagnose_and_handle_mixed_types(filepath)
 
 # def clean_dataset(filepath):
@@ -378,13 +374,13 @@ def diagnose_and_handle_mixed_types(filepath):
 #     return df
 
 # # Usage
-# filepath = 'final_ipv4_with_population.csv'
+# filepath = 'final_ipv4_with_population.parquet'
 # df = clean_dataset(filepath)
-# df.to_csv('final_ipv4_with_population_cleaned.csv', index=False)
+# write_dataset(df, 'final_ipv4_with_population_cleaned.parquet')
 
 # def load_and_diagnose_dataset(filepath):
 #     # Load the dataset without specifying dtypes to see what data it contains
-#     df = pd.read_csv(filepath, low_memory=False)
+#     df = read_dataset(filepath, categorical=False)
 
 #     # Identify the problematic column by index and print unique values to diagnose the issues
 #     problematic_column = df.columns[13]  # Adjust the index based on zero-indexing
@@ -394,7 +390,7 @@ def diagnose_and_handle_mixed_types(filepath):
 #     return df
 
 # # Use this function to specifically diagnose the issues in column 13
-# filepath = 'final_ipv4_with_population.csv'
+# filepath = 'final_ipv4_with_population.parquet'
 # df = load_and_diagnose_dataset(filepath)
 
 def diagnose_column_data_types(df, column_name):
@@ -409,19 +405,19 @@ def diagnose_column_data_types(df, column_name):
         print(f"Example of type {data_type}: {sample_value}")
 
 # Usage of the function
-# filepath = 'final_ipv4_with_population.csv'
-# df = pd.read_csv(filepath, low_memory=False)
+# filepath = 'final_ipv4_with_population.parquet'
+# df = read_dataset(filepath, categorical=False)
 # diagnose_column_data_types(df, 'Population')
 
 def clean_and_convert_population_column(filepath):
     # Load the dataset
-    df = pd.read_csv(filepath, low_memory=False)
+    df = read_dataset(filepath, categorical=False)
     
     # Convert the 'Population' column to integers
     df['Population'] = pd.to_numeric(df['Population'], errors='coerce').astype('Int64')  # Use 'Int64' to handle NaN properly
     
     # Save the cleaned dataset
-    df.to_csv('final_ipv4_with_population_cleaned.csv', index=False)
+    write_dataset(df, 'final_ipv4_with_population_cleaned.parquet')
 
     # Check for any remaining missing values
     print(df.isnull().sum())
@@ -434,7 +430,7 @@ def clean_and_convert_population_column(filepath):
 
 
 # Usage
-# filepath = 'final_ipv4_with_population.csv'
+# filepath = 'final_ipv4_with_population.parquet'
 # df = clean_and_convert_population_column(filepath)
 
 
@@ -458,7 +454,7 @@ def finalize_dataset_cleanup(df):
 
 # Load the refined dataset
 def load_and_clean_refined_dataset(filepath):
-    df = pd.read_csv(filepath, low_memory=False)
+    df = read_dataset(filepath, categorical=False)
     
     # Convert 'Population' column to integers, handling NaNs if necessary
     df['Population'] = pd.to_numeric(df['Population'], errors='coerce').astype('Int64')
@@ -474,11 +470,11 @@ def load_and_clean_refined_dataset(filepath):
     return df
 
 # # Filepath to the refined dataset
-# filepath = 'final_ipv4_with_population_refined.csv'
+# filepath = 'final_ipv4_with_population_refined.parquet'
 # df = load_and_clean_refined_dataset(filepath)
 
 # # Save the cleaned data back to a new CSV
-# df.to_csv('final_ipv4_with_population_refined_cleaned.csv', index=False)
+# write_dataset(df, 'final_ipv4_with_population_refined_cleaned.parquet')
 
 # # Final checks
 # print(df.describe(include='all'))
@@ -486,7 +482,7 @@ def load_and_clean_refined_dataset(filepath):
 def load_and_clean_dataset(filepath):
     # Load the dataset, specifying low_memory=False to handle data types more efficiently
     try:
-        df = pd.read_csv(filepath, low_memory=False)
+        df = read_dataset(filepath, categorical=False)
         print("Dataset loaded successfully.")
     except FileNotFoundError:
         print("File not found. Please check the filepath.")
@@ -513,14 +509,14 @@ def load_and_clean_dataset(filepath):
 
 def save_cleaned_data(df, output_filepath):
     if df is not None:
-        df.to_csv(output_filepath, index=False)
+        write_dataset(df, output_filepath)
         print(f"Cleaned data saved to {output_filepath}")
     else:
         print("No data to save.")
 
 # File paths
-input_filepath = 'final_ipv4_with_population_refined.csv'
-output_filepath = 'final_ipv4_with_population_refined_cleaned.csv'
+input_filepath = 'final_ipv4_with_population_refined.parquet'
+output_filepath = 'final_ipv4_with_population_refined_cleaned.parquet'
 
 # Load, clean, and save the dataset
 # df = load_and_clean_dataset(input_filepath)
@@ -549,13 +545,13 @@ def clean_and_standardize_columns(df):
     return df
 
 # Load the dataset
-# df = pd.read_csv('final_ipv4_with_population_refined.csv', low_memory=False)
+# df = read_dataset('final_ipv4_with_population_refined.parquet', categorical=False)
 
 # # Clean and standardize specific columns
 # df = clean_and_standardize_columns(df)
 
 # # Save the cleaned data back to a new CSV
-# df.to_csv('final_ipv4_with_population_refined_cleaned.csv', index=False)
+# write_dataset(df, 'final_ipv4_with_population_refined_cleaned.parquet')
 # print("Data saved successfully.")
 # def test_uniform_data_types(df):
 #     for col in df.columns:
@@ -573,7 +569,7 @@ def clean_and_standardize_columns(df):
 #         assert nan_count == 0, f"Column {col} has {nan_count} NaNs"
 #         print(f"Column {col} passed with no NaNs.")
 
-# df = pd.read_csv('final_ipv4_with_population_refined_cleaned.csv')
+# df = read_dataset('final_ipv4_with_population_refined_cleaned.parquet', categorical=False)
 # test_uniform_data_types(df)
 
 
@@ -606,7 +602,7 @@ def test_sample_values(df, column_name, expected_values):
 
 
 # Assuming df is your DataFrame after cleaning
-df = pd.read_csv('final_ipv4_with_population_refined_cleaned.csv')
+#df = read_dataset('final_ipv4_with_population_refined_cleaned.parquet', categorical=False)
 
 # Run tests
 # test_uniform_data_types(df)
@@ -621,7 +617,7 @@ def diagnose_column_types(df, column_name):
     print(df[column_name].apply(lambda x: type(x)).value_counts())
 
 # Load the data
-df = pd.read_csv('final_ipv4_with_population_refined_cleaned.csv')
+#df = read_dataset('final_ipv4_with_population_refined_cleaned.parquet', categorical=False)
 
 # Diagnose types in 'Country_y'
 # diagnose_column_types(df, 'Country_y')
@@ -643,16 +639,16 @@ def clean_country_column(df, column_name):
     return df
 
 # Assuming df is already loaded from the previous code
-# df = pd.read_csv('final_ipv4_with_population.csv')
+# df = read_dataset('final_ipv4_with_population.parquet', categorical=False)
 # df = clean_country_column(df, 'Country_y')
 
 # # Optional: Save the cleaned dataframe
-# df.to_csv('final_ipv4_with_population_refined_cleaned.csv', index=False)
+# write_dataset(df, 'final_ipv4_with_population_refined_cleaned.parquet')
 
 
 # def check_country_column_types(filepath):
 #     # Load the dataset
-#     df = pd.read_csv(filepath)
+#     df = read_dataset(filepath, categorical=False)
 
 #     # Print the data types of the country columns
 #     country_x_type = df['Country_x'].dtype
@@ -666,34 +662,33 @@ def clean_country_column(df, column_name):
 #     print("Sample values from Country_y:", df['Country_y'].dropna().unique()[:5])  # show first 5 unique non-null values
 
 # # Specify the path to your CSV file
-# filepath = 'final_ipv4_with_population_refined_cleaned.csv'
+# filepath = 'final_ipv4_with_population_refined_cleaned.parquet'
 # check_country_column_types(filepath)
 
 import pandas as pd
 import pycountry
 
+from data_processing.country_codes import alpha3_to_country_name
+
 def update_country_names(df, iso_col, country_cols):
     # Convert country columns to string in case they are not
     for col in country_cols:
         df[col] = df[col].astype(str)
 
-    # Define a helper to get country names from ISO-3 codes
-    def get_country_name(iso_code):
-        try:
-            return pycountry.countries.get(alpha_3=iso_code).name
-        except AttributeError:
-            return None
+    # Country names from ISO-3 codes, resolved once per distinct code through the shared crosswalk. Only
+    # pycountry's codes are renamed: UNK, XKX and the other custom codes keep the names they came with
+    country_names = alpha3_to_country_name(df[iso_col], unknown=None, special_cases=False, replacements=False).astype(object)
 
     # Update country columns based on ISO-3 codes
     for col in country_cols:
-        df[col] = df[iso_col].apply(get_country_name).fillna(df[col])
+        df[col] = country_names.fillna(df[col])
 
     return df
 
 # Example usage
-# df = pd.read_csv('final_ipv4_with_population_refined_cleaned.csv')
+# df = read_dataset('final_ipv4_with_population_refined_cleaned.parquet', categorical=False)
 # df = update_country_names(df, 'ISO-3', ['Country_x', 'Country_y'])
-# df.to_csv('final_ipv4_with_population_updated.csv', index=False)
+# write_dataset(df, 'final_ipv4_with_population_updated.parquet')
 
 
 def check_country_iso_discrepancies(df, iso_col, country_cols):
@@ -722,14 +717,14 @@ def check_country_iso_discrepancies(df, iso_col, country_cols):
     return discrepancies
 
 # Example usage
-df = pd.read_csv('final_ipv4_with_population_updated.csv')
+#df = read_dataset('final_ipv4_with_population_updated.parquet', categorical=False)
 #discrepancies = check_country_iso_discrepancies(df, 'ISO-3', ['Country_x', 'Country_y'])
 
 import pandas as pd
 
-def clean_and_adjust_dataset(filepath):
+def clean_and_adjust_dataset(filepath, output_path='final_ipv4_with_population_adjusted.parquet'):
     # Load the dataset
-    df = pd.read_csv(filepath)
+    df = read_dataset(filepath, categorical=False)
 
     # Filter out rows where ISO-3 is 'RES' or 'EUR'
     df = df[~df['ISO-3'].isin(['RES', 'EUR'])]
@@ -741,12 +736,12 @@ def clean_and_adjust_dataset(filepath):
     df.rename(columns={'Country_x': 'Country'}, inplace=True)
 
     # Save the cleaned and adjusted DataFrame
-    df.to_csv('final_ipv4_with_population_adjusted.csv', index=False)
+    write_dataset(df, output_path)
 
     return df
 
 # Specify the path to your CSV file
-# filepath = 'final_ipv4_with_population_updated.csv'
+# filepath = 'final_ipv4_with_population_updated.parquet'
 # df = clean_and_adjust_dataset(filepath)
 
 # # Optionally, print a summary to confirm the changes
@@ -756,23 +751,40 @@ def clean_and_adjust_dataset(filepath):
 
 def clean_and_save_dataframe(filepath, output_file):
     # Load the dataset
-    df = pd.read_csv(filepath)
+    df = read_dataset(filepath, categorical=False)
 
     # Drop the 'Code' and 'Extensions' columns
     df.drop(['Code', 'Extensions'], axis=1, inplace=True)
 
     # Save the cleaned DataFrame to a new CSV file
-    df.to_csv(output_file, index=False)
+    write_dataset(df, output_file)
 
     return df
 
-# Specify the path to your CSV file and the output file name
-input_filepath = 'final_ipv4_with_population_adjusted.csv'
-output_filepath = 'whois_v4_pop.csv'
-
-# Clean the DataFrame and save it
-df = clean_and_save_dataframe(input_filepath, output_filepath)
-
-# Optionally, print a summary to confirm the changes
-print("Data after dropping columns:")
-print(df.head())
\ No newline at end of file
+def build_population_long(population_csv='wpopdata.csv', additions_csv='manual_additions_population.csv',
+                          output_path='wpopdata_long_format_cleaned.parquet', long_path='wpopdata_long_format.parquet',
+                          aggregates_path='wpopdata_long_format_aggregate_nationality_long.parquet'):
+    # Pipeline stage: World Bank population (wide) -> long format without aggregates, plus the manual additions
+    convert_wpop_to_long(pd.read_csv(population_csv), long_path)
+    process_and_save_datasets(long_path, aggregates_path, output_path)
+    append_two_pop_csvs(output_path, additions_csv)
+
+def build_whois_population(ipv4_path='ipv4_allocations.parquet', population_path='wpopdata_long_format_cleaned.parquet',
+                           output_path='whois_v4_pop.parquet', merged_path='final_ipv4_with_population.parquet',
+                           adjusted_path='final_ipv4_with_population_adjusted.parquet'):
+    # Pipeline stage: every country/year of the WHOIS data with its population
+    merging_attempt(ipv4_path, population_path, merged_path)
+    clean_and_adjust_dataset(merged_path, adjusted_path)
+    return clean_and_save_dataframe(adjusted_path, output_path)
+
+if __name__ == '__main__':
+    # Specify the path to your CSV file and the output file name
+    input_filepath = 'final_ipv4_with_population_adjusted.parquet'
+    output_filepath = 'whois_v4_pop.parquet'
+
+    # Clean the DataFrame and save it
+    df = clean_and_save_dataframe(input_filepath, output_filepath)
+
+    # Optionally, print a summary to confirm the changes
+    print("Data after dropping columns:")
+    print(df.head())
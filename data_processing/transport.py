@@ -0,0 +1,128 @@
+import base64
+import io
+
+import numpy as np
+import pandas as pd
+
+# Payloads carry their format version; a decoder refuses versions it does not know
+COLUMNAR_VERSION = 1
+FORMATS = ('columnar', 'arrow')
+# Element types a browser has a TypedArray for (assets/transport.js); other numeric types are widened to these
+TYPED_ARRAYS = ('int8', 'uint8', 'int16', 'uint16', 'int32', 'uint32', 'int64', 'uint64', 'float32', 'float64')
+NS_PER_MS = 1_000_000
+
+
+def to_base64(values, dtype):
+    # Little-endian explicitly: that is what the TypedArrays over the decoded buffer read
+    return base64.b64encode(np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<')).tobytes()).decode('ascii')
+
+
+def from_base64(data, dtype):
+    return np.frombuffer(base64.b64decode(data), dtype=np.dtype(dtype).newbyteorder('<')).astype(dtype)
+
+
+def code_dtype(size):
+    '''Smallest signed integer type holding dictionary codes 0 .. size - 1 and -1 for missing.'''
+    for dtype in ('int8', 'int16', 'int32'):
+        if size <= np.iinfo(dtype).max:
+            return dtype
+    return 'int64'
+
+
+def encode_column(name, series):
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        return {'name': name, 'kind': 'dictionary', 'categorical': True, 'ordered': bool(dtype.ordered), 'dtype': str(codes.dtype),
+                'data': to_base64(codes, codes.dtype), 'dictionary': dtype.categories.tolist()}
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        # Milliseconds since the epoch as float64, NaN for NaT: exact for these dates and a plain Date in JS
+        values = series.dt.tz_convert(None) if getattr(dtype, 'tz', None) else series
+        values = values.to_numpy(dtype='datetime64[ns]').view('int64').astype('float64') / NS_PER_MS
+        values[series.isna().to_numpy()] = np.nan
+        return {'name': name, 'kind': 'datetime', 'dtype': 'float64', 'data': to_base64(values, 'float64')}
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_numeric_dtype(dtype):
+        kind = 'bool' if pd.api.types.is_bool_dtype(dtype) else 'numeric'
+        column = {'name': name, 'kind': kind}
+        if isinstance(dtype, pd.api.extensions.ExtensionDtype):
+            # Nullable integers and booleans: values with the gaps filled, plus one validity byte per row
+            missing = series.isna().to_numpy()
+            numpy_dtype = 'uint8' if kind == 'bool' else dtype.numpy_dtype
+            values = series.to_numpy(dtype=numpy_dtype, na_value=0)
+            if missing.any():
+                column['valid'] = to_base64(~missing, 'uint8')
+        else:
+            values = series.to_numpy()
+            if kind == 'bool':
+                values = values.astype('uint8')
+        if str(values.dtype) not in TYPED_ARRAYS:
+            values = values.astype('float64')
+        column.update(dtype=str(values.dtype), data=to_base64(values, values.dtype))
+        return column
+    # Everything else travels as strings, dictionary-encoded
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    codes = codes.astype(code_dtype(len(uniques)))
+    return {'name': name, 'kind': 'dictionary', 'categorical': False, 'dtype': str(codes.dtype),
+            'data': to_base64(codes, codes.dtype), 'dictionary': [str(value) for value in uniques]}
+
+
+def decode_column(column):
+    values = from_base64(column['data'], column['dtype'])
+    kind = column['kind']
+    if kind == 'dictionary':
+        categorical = pd.Categorical.from_codes(values, categories=column['dictionary'], ordered=column.get('ordered', False))
+        return categorical if column['categorical'] else np.asarray(categorical.astype(object))
+    if kind == 'datetime':
+        return pd.to_datetime(values, unit='ms')
+    if kind == 'bool':
+        values = values.astype(bool)
+    if 'valid' in column:
+        valid = from_base64(column['valid'], 'uint8').astype(bool)
+        nullable = pd.array(values, dtype='boolean' if kind == 'bool' else nullable_dtype(values.dtype))
+        nullable[~valid] = pd.NA
+        return nullable
+    return values
+
+
+def nullable_dtype(dtype):
+    # uint32 -> UInt32, int16 -> Int16
+    name = np.dtype(dtype).name
+    return ('UInt' + name[4:]) if name.startswith('uint') else ('Int' + name[3:])
+
+
+def encode_frame(df, format='columnar'):
+    '''A JSON-serialisable payload of ``df`` (without its index) for a dcc.Store or an HTTP response.
+
+    ``columnar``: one base64 little-endian typed array per column. Numbers keep their width, 64-bit
+    integers included, dates become float64 milliseconds since the epoch and strings and categoricals are
+    dictionary-encoded (codes plus the distinct values). assets/transport.js decodes it in the browser.
+
+    ``arrow``: the frame as a base64 Arrow IPC stream, for consumers with an Arrow library; needs pyarrow.
+    '''
+    if format == 'columnar':
+        return {'format': 'columnar', 'version': COLUMNAR_VERSION, 'length': len(df),
+                'columns': [encode_column(str(name), df[name]) for name in df.columns]}
+    if format == 'arrow':
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return {'format': 'arrow', 'data': base64.b64encode(sink.getvalue()).decode('ascii')}
+    raise ValueError(f'Unknown transport format {format!r}, expected one of {FORMATS}')
+
+
+def decode_frame(payload):
+    '''The DataFrame of an ``encode_frame`` payload, with a fresh RangeIndex.'''
+    if payload.get('format') == 'columnar':
+        if payload.get('version') != COLUMNAR_VERSION:
+            raise ValueError(f"Unsupported columnar payload version {payload.get('version')!r}")
+        return pd.DataFrame({column['name']: decode_column(column) for column in payload['columns']},
+                            index=pd.RangeIndex(payload['length']))
+    if payload.get('format') == 'arrow':
+        import pyarrow as pa
+
+        with pa.ipc.open_stream(base64.b64decode(payload['data'])) as reader:
+            return reader.read_all().to_pandas()
+    raise ValueError(f"Unknown transport format {payload.get('format')!r}, expected one of {FORMATS}")
@@ -1,8 +1,9 @@
 import pandas as pd
 import requests
-import pycountry
 import numpy as np
 
+from data_processing.country_codes import resolve_alpha2, custom_codes_in
+
 # Initialize a set to collect ISO-2 country codes that are converted to custom values
 custom_country_codes = set()
 
@@ -14,32 +15,6 @@ rir_urls = {
     'ripe': 'https://ftp.ripe.net/pub/stats/ripencc/delegated-ripencc-extended-latest'
 }
 
-# Enhanced function to handle special cases and convert ISO-2 to ISO-3, also returns country name
-def alpha2_to_alpha3_and_name(alpha_2):
-    # Define custom replacements for codes and names
-    custom_replacements = {
-        '': ('UNK', 'Unknown'),
-        'ZZ': ('RES', 'Reserved'),
-        'AP': ('ITU', 'International Telecommunication Union'),
-        'EU': ('EUR', 'Europe')
-    }
-    
-    if alpha_2 in custom_replacements:
-        custom_country_codes.add(alpha_2)
-        return custom_replacements[alpha_2]
-    
-    if alpha_2 == 'XK':
-        return ('XKX', 'Kosovo')  # Special case for Kosovo
-    
-    try:
-        country = pycountry.countries.get(alpha_2=alpha_2)
-        if country:
-            return (country.alpha_3, country.name)
-        else:
-            return ('UNK', 'Unknown')  # Use 'UNK' for unhandled unknown cases
-    except AttributeError:
-        return ('UNK', 'Unknown')
-
 def fetch_and_process_rir_data(url):
     response = requests.get(url)
     lines = response.text.strip().split("\n")
@@ -47,7 +22,8 @@ def fetch_and_process_rir_data(url):
     df = pd.DataFrame(data, columns=['Registry', 'Code', 'Type', 'Start', 'Value', 'Date', 'Status', 'Extensions'])
     
     # Apply conversion to country_code and add country name
-    df[['Code', 'Country']] = df['Code'].apply(lambda x: pd.Series(alpha2_to_alpha3_and_name(x)))
+    custom_country_codes.update(custom_codes_in(df['Code']))
+    df[['Code', 'Country']] = resolve_alpha2(df['Code'])
     
     return df
 
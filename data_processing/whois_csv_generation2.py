@@ -1,77 +1,71 @@
+# Run from the project root: python -m data_processing.whois_csv_generation2
+import logging
+import os
+
 import pandas as pd
-import requests
-import pycountry
-import numpy as np
+
+from data_processing.rir_fetcher import fetch_rir_files, rir_urls
+from data_processing.rir_parser import parse_rir_chunks, concat_rir_chunks, report_parse_stats
+from data_processing.country_codes import resolve_alpha2, custom_codes_in
+from data_processing.ip_math import explode_ipv4_cidrs, ipv4_address_columns, ipv6_address_columns
+from data_processing.storage import write_dataset
 
 # Initialize a set to collect ISO-2 country codes that are converted to custom values
 custom_country_codes = set()
 
-rir_urls = {
-    'afrinic': 'https://ftp.afrinic.net/pub/stats/afrinic/delegated-afrinic-extended-latest',
-    'apnic': 'https://ftp.apnic.net/stats/apnic/delegated-apnic-extended-latest',
-    'arin': 'https://ftp.arin.net/pub/stats/arin/delegated-arin-extended-latest',
-    'lacnic': 'https://ftp.lacnic.net/pub/stats/lacnic/delegated-lacnic-extended-latest',
-    'ripe': 'https://ftp.ripe.net/pub/stats/ripencc/delegated-ripencc-extended-latest'
-}
-
-def calculate_prefix(value):
-    if value == 1:
-        return 32
-    return 32 - int(np.log2(value))
-
-def alpha2_to_alpha3_and_name(alpha_2):
-    custom_replacements = {
-        '': ('UNK', 'Unknown'),
-        'ZZ': ('RES', 'Reserved'),
-        'AP': ('ITU', 'International Telecommunication Union'),
-        'EU': ('EUR', 'Europe')
-    }
-    
-    if alpha_2 in custom_replacements:
-        custom_country_codes.add(alpha_2)
-        return custom_replacements[alpha_2]
-    
-    if alpha_2 == 'XK':
-        return ('XKX', 'Kosovo')
-    
-    try:
-        country = pycountry.countries.get(alpha_2=alpha_2)
-        if country:
-            return (country.alpha_3, country.name)
-        else:
-            return ('UNK', 'Unknown')
-    except AttributeError:
-        return ('UNK', 'Unknown')
-
-def fetch_and_process_rir_data(url):
-    response = requests.get(url)
-    lines = response.text.strip().split("\n")
-    data = [line.split("|") for line in lines if line.count('|') >= 7]
-    df = pd.DataFrame(data, columns=['Registry', 'Code', 'Type', 'Start', 'Value', 'Date', 'Status', 'Extensions'])
-    df['Value'] = pd.to_numeric(df['Value'], errors='coerce').fillna(0).astype(int)
-    df['Prefix'] = df['Value'].apply(calculate_prefix)
-    df[['ISO-3', 'Country']] = df['Code'].apply(lambda x: pd.Series(alpha2_to_alpha3_and_name(x)))
+def process_rir_chunk(df):
+    # IPv4 ranges that are not a power of two are split into their exact CIDR blocks;
+    # for IPv6 the registries already publish the prefix length in the Value field
+    ipv4_df = explode_ipv4_cidrs(df[df['Type'] == 'ipv4'])
+    ipv6_df = df[df['Type'] == 'ipv6'].copy()
+    ipv6_df['Prefix'] = ipv6_df['Value'].astype('uint8')
+    df = pd.concat([ipv4_df, ipv6_df], ignore_index=True)
+    # One crosswalk join for the whole chunk instead of a pycountry lookup per row
+    df[['ISO-3', 'Country']] = resolve_alpha2(df['Code'])
+    custom_country_codes.update(custom_codes_in(df['Code']))
 
-    # Handle invalid date values robustly
-    df['Date'] = pd.to_datetime(df['Date'], errors='coerce', format='%Y%m%d')
+    # Invalid dates are already NaT from the parser
     df['Date'] = df['Date'].fillna(pd.Timestamp('1900-01-01'))  # Replace NaT with a default date if necessary
     df['Year'] = df['Date'].dt.year
     return df
 
-ipv4_dfs = []
-ipv6_dfs = []
+def fetch_and_process_rir_data(path):
+    # Streams the delegated file from the local cache populated by fetch_rir_files
+    stats = {}
+    chunks = [process_rir_chunk(chunk) for chunk in parse_rir_chunks(path, stats=stats)]
+    report_parse_stats(stats, label=path)
+    return concat_rir_chunks(chunks)
+
+def fetch_delegated_files(rir_paths):
+    # Pipeline stage: each path is <cache dir>/<registry>, which is where fetch_rir_files keeps its copy
+    cache_dir = os.path.dirname(rir_paths[0]) or '.'
+    return fetch_rir_files({os.path.basename(path): rir_urls[os.path.basename(path)] for path in rir_paths}, cache_dir=cache_dir)
+
+def build_allocation_datasets(rir_paths, ipv4_path='ipv4_allocations.parquet', ipv6_path='ipv6_allocations.parquet'):
+    ipv4_dfs = []
+    ipv6_dfs = []
+
+    for path in rir_paths:
+        print(f"Processing data from {os.path.basename(path).upper()}")
+        df = fetch_and_process_rir_data(path)
+        ipv4_dfs.append(df[df['Type'] == 'ipv4'])
+        ipv6_dfs.append(df[df['Type'] == 'ipv6'])
+
+    ipv4_combined_df = pd.concat(ipv4_dfs, ignore_index=True)
+    ipv6_combined_df = pd.concat(ipv6_dfs, ignore_index=True)
 
-for rir, url in rir_urls.items():
-    print(f"Processing data from {rir.upper()}")
-    df = fetch_and_process_rir_data(url)
-    ipv4_dfs.append(df[df['Type'] == 'ipv4'])
-    ipv6_dfs.append(df[df['Type'] == 'ipv6'])
+    # Integer start/end addresses next to the strings: uint32 for v4, (hi, lo) uint64 pairs for v6
+    ipv4_combined_df = pd.concat([ipv4_combined_df, ipv4_address_columns(ipv4_combined_df)], axis=1)
+    ipv6_combined_df = pd.concat([ipv6_combined_df, ipv6_address_columns(ipv6_combined_df)], axis=1)
 
-ipv4_combined_df = pd.concat(ipv4_dfs, ignore_index=True)
-ipv6_combined_df = pd.concat(ipv6_dfs, ignore_index=True)
+    write_dataset(ipv4_combined_df, ipv4_path)
+    write_dataset(ipv6_combined_df, ipv6_path)
 
-ipv4_combined_df.to_csv('ipv4_allocations.csv', mode='w', index=False)
-ipv6_combined_df.to_csv('ipv6_allocations.csv', mode='w', index=False)
+    print(f"Data processing complete. Files saved: {ipv4_path}, {ipv6_path}")
+    print("Special ISO-2 country codes converted:", custom_country_codes)
 
-print("Data processing complete. Files saved: ipv4_allocations.csv, ipv6_allocations.csv")
-print("Special ISO-2 country codes converted:", custom_country_codes)
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    # Downloads all five files concurrently, re-using the on-disk cache when nothing has changed
+    rir_paths = fetch_rir_files(rir_urls)
+    build_allocation_datasets(list(rir_paths.values()))
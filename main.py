@@ -1,57 +1,89 @@
+import logging
+import threading
+
 import dash
-from dash import Dash, html, dcc, Input, Output, State, callback_context, clientside_callback, Patch
-import dash_ag_grid as dag
-import dash_bootstrap_components as dbc
-from dash_bootstrap_templates import load_figure_template
-from io import StringIO
-
-from classes.data_handler import DataHandler
-from classes.pie_chart_handler import PieChartHandler
-from classes.ag_grid_handler import AgGridHandler
-from classes.scatter_plot_handler import ScatterHandler
-from classes.choropleth_map_handler import ChoroplethHandler
-from classes.hover_template_handler import HoverTemplateHandler
-from classes.dynamic_card_handler import DynamicCardHandler
-from classes.bar_chart_handler import BarChartHandler
-from classes.custom_chart_handler import CustomChartHandler
-
-load_figure_template(['bootstrap', 'bootstrap_dark'])
+from dash import Dash, html, dcc, Input, Output, State, callback, callback_context, clientside_callback, ClientsideFunction, Patch
+from flask import Response, jsonify, request
+
+# Only what the callback declarations below need is imported here. Plotting, the grid, the Bootstrap
+# components and the data layer are imported by create_app, so importing this module (tests, tooling,
+# forked workers) stays cheap; tests/test_import_time.py checks that.
 dbc_css = 'https://cdn.jsdelivr.net/gh/AnnMarieW/dash-bootstrap-templates/dbc.min.css'
 roboto_font_url = 'https://fonts.googleapis.com/css2?family=Roboto:wght@400;700&display=swap'
-external_stylesheets = [
-    dbc.themes.BOOTSTRAP,
-    dbc.icons.FONT_AWESOME,
-    roboto_font_url,
-    dbc_css
-]
-
-# Initialising DataHandler
-data_handler = DataHandler(
-    json_url='https://raw.githubusercontent.com/impliedchaos/ip-alloc/main/ip_alloc.json',
-    whois_v4_pop_csv='whoisv4_pop_gdp.csv',
-    population_csv='wpopdata.csv',
-    whoisv6_allocation_csv='ipv6_allocations.csv'
-    
-)
 
-data_handler.fetch_json_data()
-data_handler.fetch_whois_ipv4_data()
-data_handler.create_time_series_df()
-data_handler.create_allocation_bar_df()
-data_handler.fetch_whois_ipv6_data()
-
-# Instantiating Handlers
-hover_template_handler = HoverTemplateHandler(data_handler)
-pie_chart_handler = PieChartHandler(data_handler, hover_template_handler)
-ag_grid_handler = AgGridHandler(data_handler)
-scatter_plot_handler = ScatterHandler(data_handler)#, hover_template_handler
-choropleth_map_handler = ChoroplethHandler(data_handler, hover_template_handler)
-dynamic_card_handler = DynamicCardHandler(data_handler)
-bar_chart_handler = BarChartHandler(data_handler)
-custom_chart_handler = CustomChartHandler(data_handler)
-
-# Prepping data for the ag_grid
-ag_grid_data = ag_grid_handler.format_json_data_for_aggrid()
+# Built by create_app; the callbacks read them when they run
+data_handler = None
+hover_template_handler = None
+pie_chart_handler = None
+ag_grid_handler = None
+scatter_plot_handler = None
+choropleth_map_handler = None
+dynamic_card_handler = None
+bar_chart_handler = None
+custom_chart_handler = None
+
+
+def create_app(warm_start=True, export_dir=None, export_formats=('csv',)):
+    '''Build the data handler and chart handlers, then the Dash app serving them.
+
+    With ``export_dir``, the processed pool data is also exported there in ``export_formats`` for debugging.
+    '''
+    global data_handler, hover_template_handler, pie_chart_handler, ag_grid_handler, scatter_plot_handler
+    global choropleth_map_handler, dynamic_card_handler, bar_chart_handler, custom_chart_handler
+    import dash_bootstrap_components as dbc
+    from dash_bootstrap_templates import load_figure_template
+
+    from classes.data_handler import DataHandler
+    from classes.pie_chart_handler import PieChartHandler
+    from classes.ag_grid_handler import AgGridHandler
+    from classes.scatter_plot_handler import ScatterHandler
+    from classes.choropleth_map_handler import ChoroplethHandler
+    from classes.hover_template_handler import HoverTemplateHandler
+    from classes.dynamic_card_handler import DynamicCardHandler
+    from classes.bar_chart_handler import BarChartHandler
+    from classes.custom_chart_handler import CustomChartHandler
+    from data_processing.export_sink import ExportSink
+
+    load_figure_template(['bootstrap', 'bootstrap_dark'])
+    external_stylesheets = [
+        dbc.themes.BOOTSTRAP,
+        dbc.icons.FONT_AWESOME,
+        roboto_font_url,
+        dbc_css
+    ]
+
+    # Initialising DataHandler
+    data_handler = DataHandler(
+        json_url='https://raw.githubusercontent.com/impliedchaos/ip-alloc/main/ip_alloc.json',
+        whois_v4_pop_csv='whoisv4_pop_gdp.parquet',
+        population_csv='wpopdata.csv',
+        whoisv6_allocation_csv='ipv6_allocations.parquet',
+        netlist_url='https://raw.githubusercontent.com/impliedchaos/ip-alloc/main/netlist.txt',
+        snapshot_path='processed_state.snapshot',
+        export_sink=ExportSink(export_dir, export_formats) if export_dir else None
+    )
+    # Datasets load in the background so the server comes up straight away; /api/ready reports their progress
+    if warm_start:
+        data_handler.warm_start()
+
+    # Instantiating Handlers
+    hover_template_handler = HoverTemplateHandler(data_handler)
+    pie_chart_handler = PieChartHandler(data_handler, hover_template_handler)
+    ag_grid_handler = AgGridHandler(data_handler)
+    scatter_plot_handler = ScatterHandler(data_handler)#, hover_template_handler
+    choropleth_map_handler = ChoroplethHandler(data_handler, hover_template_handler)
+    dynamic_card_handler = DynamicCardHandler(data_handler)
+    bar_chart_handler = BarChartHandler(data_handler)
+    custom_chart_handler = CustomChartHandler(data_handler)
+
+    # App Initialisation
+    app = Dash(__name__, external_stylesheets=external_stylesheets, suppress_callback_exceptions=True)
+    app.server.add_url_rule('/api/ready', view_func=readiness)
+    app.server.add_url_rule('/api/lookup/<address>', view_func=lookup_address)
+    app.server.add_url_rule('/api/frame-cache', view_func=frame_cache_stats)
+    app.server.add_url_rule('/api/datasets/<dataset_id>', view_func=dataset_payload)
+    app.layout = serve_layout()
+    return app
 
 '''stuff for bug squashing'''
 #print('json_df columns:', json_df.columns.tolist())
@@ -65,74 +97,123 @@ ag_grid_data = ag_grid_handler.format_json_data_for_aggrid()
 #print(json_df['percentv4'].dtype)
 
 
-# App Initialisation
-app = Dash(__name__, external_stylesheets=external_stylesheets, suppress_callback_exceptions=True)
+'''----------Readiness----------'''
+def readiness():
+    datasets = data_handler.readiness()
+    ready = not any(data_handler.is_loading(name) for name in datasets)
+    return jsonify({'ready': ready, 'datasets': datasets}), 200 if ready else 503
+
+def frame_cache_stats():
+    return jsonify(data_handler.registry.frames.stats())
+
+def dataset_payload(dataset_id):
+    # For clients that need the rows themselves: ?format=columnar (the default, decoded by
+    # assets/transport.js), arrow, or split for the pandas JSON the stores used to carry
+    from data_processing import transport
+
+    transport_format = request.args.get('format', 'columnar')
+    if transport_format not in transport.FORMATS + ('split',):
+        return jsonify({'error': f'Unknown format {transport_format}'}), 400
+    try:
+        df = data_handler.registry.resolve(data_handler.registry.token(dataset_id))
+    except KeyError:
+        return jsonify({'error': f'No dataset {dataset_id}'}), 404
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 503
+    if transport_format == 'split':
+        return Response(df.to_json(date_format='iso', orient='split'), mimetype='application/json')
+    return jsonify(transport.encode_frame(df, transport_format))
+
+def wait_for_dataset(name, current_data):
+    # Store callbacks skip their update while the dataset is still loading, and the warm start poll fills
+    # the store once it is ready; later poll ticks leave a filled store alone
+    polled = callback_context.triggered_id == 'warm-start-interval'
+    if data_handler.is_loading(name) or (polled and current_data is not None):
+        raise dash.exceptions.PreventUpdate
+
+# Stores filled by the warm start poll
+WARM_START_STORES = ('ipv4-dataset', 'whois-ipv4-dataset', 'ipv4-time-series-dataset', 'allocation-dataset')
+
+@callback(
+    [Output('warm-start-interval', 'disabled'),
+     Output('warm-start-status', 'children')],
+    Input('warm-start-interval', 'n_intervals'),
+    [State(store, 'data') for store in WARM_START_STORES]
+)
+def update_warm_start_status(n_intervals, *stores):
+    loading = [name for name in data_handler.DATASETS if data_handler.is_loading(name)]
+    if loading:
+        return False, f"Loading {', '.join(loading)}..."
+    # The tick that finds the datasets ready may have reached the store callbacks while they were still
+    # loading, so the poll only stops once every store has been filled
+    return all(data is not None for data in stores), ''
+
+'''----------Address lookup API----------'''
+def lookup_address(address):
+    try:
+        allocation = data_handler.lookup(address)
+    except ValueError:
+        return jsonify({'error': f'{address} is not an IP address'}), 400
+    if allocation is None:
+        return jsonify({'error': f'No allocation holds {address}'}), 404
+    return jsonify(allocation)
 
 '''----------Fetch and store dataset----------'''
-@app.callback(
+@callback(
     Output('ipv4-time-series-dataset', 'data'),
-    [Input('whoisv4', 'n_clicks')],
+    [Input('whoisv4', 'n_clicks'),
+     Input('warm-start-interval', 'n_intervals')],
     [State('ipv4-time-series-dataset', 'data')]
 )
-def update_ipv4_time_series_dataset(n_whoisv4, ipv4_ts_dataset):
+def update_ipv4_time_series_dataset(n_whoisv4, n_intervals, ipv4_ts_dataset):
     if n_whoisv4 is None:
         raise dash.exceptions.PreventUpdate
+    wait_for_dataset('ipv4_ts_df', ipv4_ts_dataset)
 
-    # Fetch the data
-    data_handler.create_time_series_df()
-    ipv4_ts_dataset = {
-        'dataset': 'ipv4_time_series',
-        'data': data_handler.ipv4_ts_df.to_json(date_format='iso', orient='split')
-    }
-    return ipv4_ts_dataset
+    # Stores hold a token; the frame itself stays in the dataset registry
+    return data_handler.registry.token('ipv4_time_series')
 
-@app.callback(
+@callback(
     Output('whois-ipv4-dataset', 'data'),
-    [Input('whoisv4', 'n_clicks')],
+    [Input('whoisv4', 'n_clicks'),
+     Input('warm-start-interval', 'n_intervals')],
     [State('whois-ipv4-dataset', 'data')]
 )
-def update_whoisv4_dataset(n_whoisv4, whois_ipv4_dataset):
+def update_whoisv4_dataset(n_whoisv4, n_intervals, whois_ipv4_dataset):
     if n_whoisv4 is None:
         raise dash.exceptions.PreventUpdate
+    wait_for_dataset('whois_ipv4_df', whois_ipv4_dataset)
 
-    # Fetch the data
-    data_handler.fetch_whois_ipv4_data()
-    whois_ipv4_dataset = {'dataset': 'whois_ipv4', 'data': data_handler.whois_ipv4_df.to_json(date_format='iso', orient='split')}
-    return whois_ipv4_dataset
+    return data_handler.registry.token('whois_ipv4')
 
-@app.callback(
+@callback(
     Output('allocation-dataset', 'data'),
-    [Input('whoisv4', 'n_clicks')],
+    [Input('whoisv4', 'n_clicks'),
+     Input('warm-start-interval', 'n_intervals')],
     [State('allocation-dataset', 'data')]
 )
-def update_allocation_bar_dataset(n_whoisv4, allocation_dataset):
+def update_allocation_bar_dataset(n_whoisv4, n_intervals, allocation_dataset):
     if n_whoisv4 is None:
         raise dash.exceptions.PreventUpdate
+    wait_for_dataset('allocation_df', allocation_dataset)
 
-    # Fetch the data
-    data_handler.create_allocation_bar_df()
-    allocation_dataset = {
-        'dataset': 'v4_allocation',
-        'data': data_handler.allocation_df.to_json(orient='split')
-    }
-    return allocation_dataset
+    return data_handler.registry.token('v4_allocation')
 
-@app.callback(
+@callback(
     Output('ipv4-dataset', 'data'),
-    [Input('whoisv4', 'n_clicks')],
+    [Input('whoisv4', 'n_clicks'),
+     Input('warm-start-interval', 'n_intervals')],
     State('ipv4-dataset', 'data')
 )
-def update_ipv4_dataset(n_whoisv4, data):
+def update_ipv4_dataset(n_whoisv4, n_intervals, data):
     if n_whoisv4 is None:
         raise dash.exceptions.PreventUpdate
+    wait_for_dataset('json_df', data)
 
-    # Fetch the data regardless of the current state
-    data_handler.fetch_json_data()
-    ipv4_dataset = {'dataset': 'ipv4', 'data': data_handler.json_df.to_json(date_format='iso', orient='split')}
     #print(ipv4_dataset.get('dataset'), 'successfully populated')
-    return ipv4_dataset
+    return data_handler.registry.token('ipv4')
         
-@app.callback(
+@callback(
     Output('ipv6-dataset', 'data'),
     [Input('whoisv6', 'n_clicks')],
     [State('ipv6-dataset', 'data')],
@@ -142,15 +223,12 @@ def update_ipv6_dataset(n_whoisv6, ipv6_dataset):
     if n_whoisv6 is None:
         raise dash.exceptions.PreventUpdate
 
-    # Fetch the data
-    data_handler.fetch_whois_ipv6_data()
-    ipv6_dataset = {'dataset': 'whois_ipv6', 'data': data_handler.whoisv6_df.to_json(date_format='iso', orient='split')}
-    return ipv6_dataset
+    return data_handler.registry.token('whois_ipv6')
 
 '''----------Choropleth Map Stuff----------'''
 # Main bossmeng logic for the choropleth map, this will take in data from all related stores and callbacks and
 # return the correct graph logic based on the arguments the class has been served
-@app.callback(
+@callback(
         Output('the-choropleth-map', 'figure'),
         [Input('ipv4-dataset', 'data'),
         #Input('whois-ipv4-dataset', 'data'),
@@ -196,7 +274,7 @@ def update_choropleth_map(ipv4_dataset, active_tab, active_item, switch_on, allo
 '''----------Scatter Plot----------'''
 # Main bossmeng logic for the scatter plot, this will take in data from all related stores and callbacks and
 # return the correct graph logic based on the arguments the class has been served
-@app.callback(
+@callback(
     Output('the-scatter-plot', 'figure'),
     [Input('ipv4-dataset', 'data'),
      Input('whois-ipv4-dataset', 'data'),
@@ -217,7 +295,6 @@ def update_scatter_plots(ipv4_data, whois_ipv4_data, ipv6_data, time_series_data
         active_dataset = ipv4_data
     if scatter_selector_accordion == 'animated':
         active_dataset = time_series_data
-        print(active_dataset.get('dataset'))
 
     if not active_dataset:
         raise dash.exceptions.PreventUpdate
@@ -228,7 +305,7 @@ def update_scatter_plots(ipv4_data, whois_ipv4_data, ipv6_data, time_series_data
 '''----------Pie Chart----------'''
 # Main bossmeng logic for the pie chart, this will take in data from all related stores and callbacks and
 # return the correct graph logic based on the arguments the class has been served
-@app.callback(
+@callback(
     Output('the-pie-chart', 'figure'),
     [Input('pie-selector-accordion', 'active_item'),
      Input('ipv4-dataset', 'data'),
@@ -277,7 +354,7 @@ def update_pie_figure(active_item, ipv4_data, whois_ipv4_data, ipv6_data, alloca
     return figure#, {'active_item': active_item}
 
 
-@app.callback(
+@callback(
     Output('pie-accordion-store', 'data'),
     [Input('pie-selector-accordion', 'active_item'),
      Input('graph-tabs', 'value')],
@@ -296,7 +373,7 @@ def update_pie_active_item_store(pie_active_item, active_tab):
 '''----------Bar Chart----------'''
 # Main bossmeng logic for the bar chart, this will take in data from all related stores and callbacks and
 # return the correct graph logic based on the arguments the class has been served
-@app.callback(
+@callback(
     Output('the-bar-chart', 'figure'),
     [Input('bar-selector-accordion', 'active_item'),
      Input('ipv4-dataset', 'data'),
@@ -319,7 +396,6 @@ def update_bar_chart(active_item, ipv4_data, whois_ipv4_data, ipv6_data, allocat
     #print(log_scale_data, 'top of bar chart callback')
     #print(active_item, 'in the good ole update_bar_chart function')
     active_dataset = None
-    print(allocation_data)
     if active_item in ['TotalPool', 'RIR', 'RIPENCC', 'ARIN', 'APNIC', 'AFRINIC', 'GLOBALBAR' 'LACNIC', 'RIRV6', 'RIPENCCV6', 'ARINV6', 'APNICV6', 'LACNICV6']:
         active_dataset = ipv4_data
         #df = pd.read_json(active_dataset['data'], orient='split')
@@ -327,8 +403,7 @@ def update_bar_chart(active_item, ipv4_data, whois_ipv4_data, ipv6_data, allocat
     elif active_item == 'ipv6':
         active_dataset = ipv6_data
 
-    if active_item == 'UNVSALLOCATED':
-        print('before the dataset')
+    if active_item in ['UNVSALLOCATED', 'FOOTPRINT']:
         active_dataset = allocation_data
         #for key in active_dataset:
         #    print(key)
@@ -346,7 +421,7 @@ def update_bar_chart(active_item, ipv4_data, whois_ipv4_data, ipv6_data, allocat
     figure = bar_chart_handler.generate_figure(active_item, active_dataset, switch_on, allocation_version, log_scale_active, view_mode)
     return figure
 
-@app.callback(
+@callback(
     Output('bar-accordion-store', 'data'),
     [Input('bar-selector-accordion', 'active_item'),
      Input('graph-tabs', 'value')],
@@ -359,7 +434,7 @@ def update_bar_active_item_store(bar_active_item, active_tab):
     return dash.no_update
 
 '''----------Custom Graph Stuff----------'''
-@app.callback(
+@callback(
     Output('the-custom-chart', 'figure'),
     [Input('the-ag-grid', 'virtualRowData'),
      Input('ipv4-dataset', 'data'),
@@ -373,10 +448,6 @@ def update_bar_active_item_store(bar_active_item, active_tab):
 def update_custom_graph(virtual_row_data, ipv4_data, whois_ipv4_data, ipv6_data, allocation_version, active_tab, active_item, switch_on):
     if active_tab != 'custom-tab':
         raise dash.exceptions.PreventUpdate
-    if ipv4_data == None:
-        print('dataset none')
-
-    print(allocation_version)
     #print(ipv4_data) 
     #print(active_tab, 'cust graph callback') this is good
     active_dataset = None
@@ -387,8 +458,8 @@ def update_custom_graph(virtual_row_data, ipv4_data, whois_ipv4_data, ipv6_data,
     return custom_chart_handler.generate_figure(virtual_row_data, active_item, active_dataset, switch_on)
 
 '''----------AG Grid Stuff----------'''
-@app.callback(
-    [Output('the-ag-grid', 'rowData'),
+@callback(
+    [Output('ag-grid-rows', 'data'),
      Output('the-ag-grid', 'columnDefs')],
     [Input('ag-switch', 'value'),
      Input('ipv4-dataset', 'data'),
@@ -398,7 +469,12 @@ def update_custom_graph(virtual_row_data, ipv4_data, whois_ipv4_data, ipv6_data,
     prevent_initial_call=True
 )
 def update_columns(switch_value, ipv4_data, whois_ipv4_data, ipv6_data, allocation_version):
-    row_data = []
+    # The rows go to the browser as a columnar payload and become rowData there (see the clientside
+    # callback below): a fraction of the size of row records, and no per-row work on the server
+    import pandas as pd
+    from data_processing import transport
+
+    grid_df = None
     column_defs = []
     
     #print(switch_value, 'ag grid main')
@@ -419,28 +495,34 @@ def update_columns(switch_value, ipv4_data, whois_ipv4_data, ipv6_data, allocati
     if allocation_version['allocation_type'] == 'ipv4':
         if switch_value:
             #active_dataset = whois_ipv4_data
-            row_data = ag_grid_handler.format_whois4_data_for_aggrid()
+            grid_df = ag_grid_handler.whois4_grid()
             column_defs = ag_grid_handler.generate_column_definitions('whoisv4')#active_dataset = ipv4_data
 
         else:
-            row_data = ag_grid_handler.format_json_data_for_aggrid()
+            grid_df = ag_grid_handler.json_grid()
             column_defs = ag_grid_handler.generate_column_definitions('v4_pool')
     if allocation_version['allocation_type'] == 'ipv6':
         if switch_value:
             active_dataset = ipv6_data
             #print(active_dataset.keys())
             #print(active_dataset['dataset'])
-            row_data = ag_grid_handler.format_whoisv6_data_for_aggrid(active_dataset)
+            grid_df = ag_grid_handler.whoisv6_grid(active_dataset)
             column_defs = ag_grid_handler.generate_column_definitions('whoisv6')
         else:
-            row_data = ag_grid_handler.format_json_data_for_aggrid()
+            grid_df = ag_grid_handler.json_grid()
             column_defs = ag_grid_handler.generate_column_definitions('v6_pool')
             #print(column_defs)
 
-    return row_data, column_defs
+    return transport.encode_frame(grid_df if grid_df is not None else pd.DataFrame()), column_defs
+
+clientside_callback(
+    ClientsideFunction(namespace='transport', function_name='toRecords'),
+    Output('the-ag-grid', 'rowData'),
+    Input('ag-grid-rows', 'data'),
+)
 
 # Ag-grid pagination logic
-@app.callback(
+@callback(
     Output('ag-pagination-component', 'max_value'),
     Input('the-ag-grid', 'paginationInfo')
 )
@@ -449,7 +531,7 @@ def update_pagination_control(pagination_info):
         return dash.no_update
     return pagination_info['totalPages']
 
-@app.callback(
+@callback(
     Output('the-ag-grid', 'paginationGoTo'),
     Input('ag-pagination-component', 'active_page'),
     prevent_initial_call=True
@@ -465,7 +547,7 @@ def goto_page(n):
 # of their respective "parent"
 
 # This function will display information related to the graph that's currently on display in the graph tab.
-@app.callback(
+@callback(
     Output('dynamic-card-content', 'children'),
     [Input('ipv4-dataset', 'data'),
      Input('whois-ipv4-dataset', 'data'),
@@ -490,7 +572,7 @@ def update_dynamic_card_content(ipv4_data, whois_ipv4_data, ipv4_time_series_dat
     return dynamic_card_handler.get_content(active_dataset, active_tab, allocation_version)
 
 # Fetches the toggle-button(s) that are/is shown below the accordion based on the case it is served
-@app.callback(
+@callback(
     Output('dynamic-button-div', 'children'),
     [Input('pie-accordion-store', 'data'),
      Input('bar-accordion-store', 'data'),
@@ -516,7 +598,7 @@ def update_dynamic_toggle_button(pie_store_data, bar_store_data, active_tab):
         return html.Div()
 
 # Does what the function name says
-@app.callback(
+@callback(
     [Output('toggle-legend-store', 'data'),
      Output('toggle-legend-button', 'className')],
     [Input('toggle-legend-button', 'n_clicks')],
@@ -533,7 +615,7 @@ def toggle_legend_visibility(n_clicks, current_legend_state):
     return new_legend_state, button_style
 
 # Updates the graph display if the top/bottom 10 buttons have been clicked
-@app.callback(
+@callback(
     [Output('view-mode-store', 'data'),
      Output('top10-button', 'className'),
      Output('bottom10-button', 'className')],
@@ -573,7 +655,7 @@ def update_view_mode(top10_clicks, bottom10_clicks, current_view_mode):
     return new_mode, top10_class, bottom10_class
 
 # Does what the function name says
-@app.callback(
+@callback(
     [Output('log-scale-store', 'data'),
      Output('toggle-log-button', 'className')],
     [Input('toggle-log-button', 'n_clicks')],
@@ -595,7 +677,7 @@ def toggle_log_scale(n_clicks, log_scale_state):
     # Return the new state and button style
     return {'log_scale_active': new_state}, button_style
 
-@app.callback(
+@callback(
     [Output('v4v6-button-store', 'data'),
      Output('whoisv4', 'className'),
      Output('whoisv6', 'className'),
@@ -656,135 +738,160 @@ clientside_callback(
 
 '''----------Render the application----------'''    
 # App Layout
-app.layout = dbc.Container([
-    # State Storages
-    dcc.Store(id='v4v6-button-store', data={'allocation_type': 'ipv4'}),
-    dcc.Store(id='ipv4-dataset', storage_type='memory'),
-    dcc.Store(id='whois-ipv4-dataset', storage_type='memory'),
-    dcc.Store(id='ipv4-time-series-dataset', storage_type='memory'),
-    dcc.Store(id='ipv6-dataset', storage_type='memory'),
-    dcc.Store(id='allocation-dataset', storage_type='memory'),
-    dcc.Store(id='intermediate-data-from-grid', storage_type='memory'),
-    dcc.Store(id='pie-accordion-store', data={'active_item': 'log'}),
-    dcc.Store(id='bar-accordion-store', data={'active_item': 'linear'}),
-    dcc.Store(id='toggle-legend-store', data=False),
-    dcc.Store(id='view-mode-store', data={'view_mode': 'top10'}),
-    dcc.Store(id='log-scale-store', data={'log_scale_active': False}),
-    # State Debugging:
-    dcc.Store(id='button-state-store', data={'top10_clicked': 0, 'legend_clicked': 0, 'log_clicked': 0, 'bottom10_clicked': 0}),
-
-    # Header section
-    dbc.Row([
-        dbc.Col([
-            html.H3('Internet Protocol Allocation Visualisation Model'),
-
-        ], width={'size': 7, 'offset': 1}),
-        dbc.Col([
-            html.Div([
-                dbc.Label(className='fa fa-moon', html_for='switch'),
-                dbc.Switch(id='switch', value=True, className='d-inline-block ms-1', persistence=True),
-                dbc.Label(className='fa fa-sun', html_for='switch')
-            ], className='sec1-button-column', style={'padding-right': '0.7rem', 'padding-bottom': '0.3rem'}),
-            dbc.ButtonGroup([
-                dbc.Button('IPv4', id='whoisv4', outline=True, className='btn-primary', n_clicks=0),
-                dbc.Button('IPv6', id='whoisv6', outline=True, className='btn-outline-primary', n_clicks=0),
-                #dbc.Button('WHOIS v4', id='whoisv4', outline=True, className='btn-outline-primary', n_clicks=0),
-            ], className='mb-3')
-        ], className='sec1-button-column', width={'size': 3}),
-    ], className='section-1-container'),  # Adjusting header to take 8% of the height
+def serve_layout():
+    import dash_ag_grid as dag
+    import dash_bootstrap_components as dbc
+
+    return dbc.Container([
+        # State Storages
+        dcc.Store(id='v4v6-button-store', data={'allocation_type': 'ipv4'}),
+        dcc.Store(id='ipv4-dataset', storage_type='memory'),
+        dcc.Store(id='whois-ipv4-dataset', storage_type='memory'),
+        dcc.Store(id='ipv4-time-series-dataset', storage_type='memory'),
+        dcc.Store(id='ipv6-dataset', storage_type='memory'),
+        dcc.Store(id='allocation-dataset', storage_type='memory'),
+        dcc.Store(id='intermediate-data-from-grid', storage_type='memory'),
+        dcc.Store(id='pie-accordion-store', data={'active_item': 'log'}),
+        dcc.Store(id='bar-accordion-store', data={'active_item': 'linear'}),
+        dcc.Store(id='toggle-legend-store', data=False),
+        dcc.Store(id='view-mode-store', data={'view_mode': 'top10'}),
+        dcc.Store(id='log-scale-store', data={'log_scale_active': False}),
+        # State Debugging:
+        dcc.Store(id='button-state-store', data={'top10_clicked': 0, 'legend_clicked': 0, 'log_clicked': 0, 'bottom10_clicked': 0}),
+        # Polls until the background warm start has loaded every dataset, then switches itself off
+        dcc.Interval(id='warm-start-interval', interval=1000),
+
+        # Header section
+        dbc.Row([
+            dbc.Col([
+                html.H3('Internet Protocol Allocation Visualisation Model'),
+                html.Small(id='warm-start-status', className='text-muted'),
+
+            ], width={'size': 7, 'offset': 1}),
+            dbc.Col([
+                html.Div([
+                    dbc.Label(className='fa fa-moon', html_for='switch'),
+                    dbc.Switch(id='switch', value=True, className='d-inline-block ms-1', persistence=True),
+                    dbc.Label(className='fa fa-sun', html_for='switch')
+                ], className='sec1-button-column', style={'padding-right': '0.7rem', 'padding-bottom': '0.3rem'}),
+                dbc.ButtonGroup([
+                    dbc.Button('IPv4', id='whoisv4', outline=True, className='btn-primary', n_clicks=0),
+                    dbc.Button('IPv6', id='whoisv6', outline=True, className='btn-outline-primary', n_clicks=0),
+                    #dbc.Button('WHOIS v4', id='whoisv4', outline=True, className='btn-outline-primary', n_clicks=0),
+                ], className='mb-3')
+            ], className='sec1-button-column', width={'size': 3}),
+        ], className='section-1-container'),  # Adjusting header to take 8% of the height
     
-    # Main content section
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    html.Div(id='dynamic-card-content', className='dynamic-card'),
-                    html.Div(id='dynamic-button-div', className='dynamic-button')
-                ]),
-            ], className='sec2-dynamic-card'),
-        ], width={'size': 2, 'offset': 1}),
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    dcc.Tabs(
-                        id='graph-tabs',
-                        value='choropleth-tab',
-                        children=[
-                            dcc.Tab(label='Choropleth Map', value='choropleth-tab', children=[dcc.Loading(dcc.Graph(id='the-choropleth-map', style={'height':'45vh'}, className='dbc'))], className='tab-content dbc'),
-                            dcc.Tab(label='Scatter Plot', value='scatter-tab', children=[dcc.Loading(dcc.Graph(id='the-scatter-plot', style={'height':'45vh'}, className='dbc'))], className='tab-content dbc'),
-                            dcc.Tab(label='Pie Chart', value='pie-tab', children=[dcc.Loading(dcc.Graph(id='the-pie-chart', style={'height':'45vh'}))], className='tab-content'),
-                            dcc.Tab(label='Bar Chart', value='bar-tab', children=[dcc.Loading(dcc.Graph(id='the-bar-chart', style={'height':'45vh'}))], className='tab-content'),
-                            dcc.Tab(label='Custom Graph', value='custom-tab', children=[dcc.Loading(dcc.Graph(id='the-custom-chart', figure={}))], className='tab-content dbc'),
-                        ], className='sec2-graph-tabs')  # Classname sets tab width
-                ], className='sec2-card-body')
-            ], className='sec2-tab-card'),
-        ], width={'size': 8}),
-        dbc.Col([], width={'size': 1}, className='h-100'),
-    ], className='section-2-container'),
-
-    # Bottom section for the AG-Grid
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    dbc.Row([
-                        dbc.Col([
-                            dbc.Pagination(
-                                id='ag-pagination-component',
-                                first_last=True,
-                                previous_next=True,
-                                size='sm',
-                                fully_expanded=False,
-                                max_value=1
-                            )
-                        ]),
-                        dbc.Col([
-                            html.Div([
-                                html.H6(id='pool-data-text', children='IPv4 Pool Data'),
-                                dbc.Switch(id='ag-switch', value=True, className='d-inline-block ms-1', persistence=True),
-                                html.H6(id='whois-data-text', children='IPv4 WHOIS Data'),
-                            ], className='sec1-button-column', style={'padding-right': '0.5rem', 'padding-bottom': '0.2rem'}),
-                        ]),
-                    ]),  
-
-                    dbc.Container([
-                        dcc.Loading(
-                            id='loading-1',
-                            type='default',
-                            children=html.Div([
-                                dag.AgGrid(
-                                    id='the-ag-grid',
-                                    rowData=[],
-                                    columnDefs=[],
-                                    className='ag-theme-alpine',
-                                    style={'height': '25vh'},
-                                    columnSize='sizeToFit',
-                                    dashGridOptions={
-                                        'pagination': True,
-                                        #'paginationAutoPageSize': True,
-                                        'rowHeight': 28,
-                                        'headerHeight': 35,
-                                        'suppressPaginationPanel': True,
-                                        'rowSelection': 'multiple',
-                                        'animateRows': False,
-                                        'suppressScrollOnNewData':True,
-                                    },
-                                    defaultColDef={
-                                        'flex': 1,
-                                        'minWidth': 100,
-                                        'filter': True,
-                                    },
+        # Main content section
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.Div(id='dynamic-card-content', className='dynamic-card'),
+                        html.Div(id='dynamic-button-div', className='dynamic-button')
+                    ]),
+                ], className='sec2-dynamic-card'),
+            ], width={'size': 2, 'offset': 1}),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        dcc.Tabs(
+                            id='graph-tabs',
+                            value='choropleth-tab',
+                            children=[
+                                dcc.Tab(label='Choropleth Map', value='choropleth-tab', children=[dcc.Loading(dcc.Graph(id='the-choropleth-map', style={'height':'45vh'}, className='dbc'))], className='tab-content dbc'),
+                                dcc.Tab(label='Scatter Plot', value='scatter-tab', children=[dcc.Loading(dcc.Graph(id='the-scatter-plot', style={'height':'45vh'}, className='dbc'))], className='tab-content dbc'),
+                                dcc.Tab(label='Pie Chart', value='pie-tab', children=[dcc.Loading(dcc.Graph(id='the-pie-chart', style={'height':'45vh'}))], className='tab-content'),
+                                dcc.Tab(label='Bar Chart', value='bar-tab', children=[dcc.Loading(dcc.Graph(id='the-bar-chart', style={'height':'45vh'}))], className='tab-content'),
+                                dcc.Tab(label='Custom Graph', value='custom-tab', children=[dcc.Loading(dcc.Graph(id='the-custom-chart', figure={}))], className='tab-content dbc'),
+                            ], className='sec2-graph-tabs')  # Classname sets tab width
+                    ], className='sec2-card-body')
+                ], className='sec2-tab-card'),
+            ], width={'size': 8}),
+            dbc.Col([], width={'size': 1}, className='h-100'),
+        ], className='section-2-container'),
+
+        # Bottom section for the AG-Grid
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        dbc.Row([
+                            dbc.Col([
+                                dbc.Pagination(
+                                    id='ag-pagination-component',
+                                    first_last=True,
+                                    previous_next=True,
+                                    size='sm',
+                                    fully_expanded=False,
+                                    max_value=1
                                 )
-                            ])
-                        ),
-
-                    ],fluid=True, className='dbc-ag-grid grid-container')
-                ])
-            ], className='h-100')
-        ], width={'size': 10, 'offset': 1})
-    ], className='section-3-container'),
-
-], fluid=True, className='main-container dbc')
+                            ]),
+                            dbc.Col([
+                                html.Div([
+                                    html.H6(id='pool-data-text', children='IPv4 Pool Data'),
+                                    dbc.Switch(id='ag-switch', value=True, className='d-inline-block ms-1', persistence=True),
+                                    html.H6(id='whois-data-text', children='IPv4 WHOIS Data'),
+                                ], className='sec1-button-column', style={'padding-right': '0.5rem', 'padding-bottom': '0.2rem'}),
+                            ]),
+                        ]),  
+
+                        dbc.Container([
+                            dcc.Loading(
+                                id='loading-1',
+                                type='default',
+                                children=html.Div([
+                                    # Columnar payload of the grid rows, decoded into rowData by assets/transport.js
+                                    dcc.Store(id='ag-grid-rows', storage_type='memory'),
+                                    dag.AgGrid(
+                                        id='the-ag-grid',
+                                        rowData=[],
+                                        columnDefs=[],
+                                        className='ag-theme-alpine',
+                                        style={'height': '25vh'},
+                                        columnSize='sizeToFit',
+                                        dashGridOptions={
+                                            'pagination': True,
+                                            #'paginationAutoPageSize': True,
+                                            'rowHeight': 28,
+                                            'headerHeight': 35,
+                                            'suppressPaginationPanel': True,
+                                            'rowSelection': 'multiple',
+                                            'animateRows': False,
+                                            'suppressScrollOnNewData':True,
+                                        },
+                                        defaultColDef={
+                                            'flex': 1,
+                                            'minWidth': 100,
+                                            'filter': True,
+                                        },
+                                    )
+                                ])
+                            ),
+
+                        ],fluid=True, className='dbc-ag-grid grid-container')
+                    ])
+                ], className='h-100')
+            ], width={'size': 10, 'offset': 1})
+        ], className='section-3-container'),
+
+    ], fluid=True, className='main-container dbc')
+
+'''----------WSGI entry point----------'''
+# `gunicorn main:server` (or anything loading main:app) gets an app built on first access, with the
+# defaults of create_app; importing main itself still builds nothing
+wsgi_app = None
+wsgi_app_lock = threading.Lock()
+
+def __getattr__(name):
+    global wsgi_app
+    if name not in ('app', 'server'):
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    with wsgi_app_lock:
+        if wsgi_app is None:
+            wsgi_app = create_app()
+    return wsgi_app if name == 'app' else wsgi_app.server
 
 if __name__ == '__main__':
-    app.run_server(debug=True)
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    create_app().run(debug=True)
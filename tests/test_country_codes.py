@@ -0,0 +1,37 @@
+'''The labels the ISO-2 crosswalk produces for the dashboard and for the ETL.'''
+import pandas as pd
+
+from classes.data_handler import DataHandler
+from data_processing import country_codes
+from data_processing.time_series_df_generation import update_country_names
+
+PLACEHOLDERS = ['AP', 'EU', 'ZZ', '']
+
+
+def test_dashboard_keeps_placeholder_codes_unknown():
+    # What the charts and the pool grid have always shown for the registries' placeholder codes
+    for code in PLACEHOLDERS:
+        assert DataHandler.alpha2_to_alpha3(code) == 'Unknown'
+    assert DataHandler.alpha2_to_alpha3('XK') == 'XKX'
+    assert DataHandler.alpha2_to_alpha3('NL') == 'NLD'
+
+    iso3 = country_codes.alpha2_to_alpha3(pd.Series(['NL', 'AP', None, 'XK']), unknown='Unknown', replacements=False)
+    assert iso3.astype(str).tolist() == ['NLD', 'Unknown', 'Unknown', 'XKX']
+
+
+def test_dashboard_names_only_pycountry_codes():
+    assert DataHandler.alpha3_to_country_name('NLD') == 'Netherlands'
+    for code in ['XKX', 'UNK', 'ITU', 'RES', 'EUR']:
+        assert DataHandler.alpha3_to_country_name(code) == 'Unknown'
+
+
+def test_etl_gives_placeholder_codes_their_own_codes():
+    resolved = country_codes.resolve_alpha2(pd.Series(PLACEHOLDERS + ['XK', 'NL', 'QQ']))
+    assert resolved['ISO-3'].astype(str).tolist() == ['ITU', 'EUR', 'RES', 'UNK', 'XKX', 'NLD', 'UNK']
+    assert resolved['Country'].astype(str).tolist()[:5] == [
+        'International Telecommunication Union', 'Europe', 'Reserved', 'Unknown', 'Kosovo']
+
+
+def test_update_country_names_keeps_custom_codes_names():
+    df = pd.DataFrame({'ISO-3': ['NLD', 'UNK', 'XKX'], 'Country': ['Holland', 'Nowhere', 'Kosova']})
+    assert update_country_names(df, 'ISO-3', ['Country'])['Country'].tolist() == ['Netherlands', 'Nowhere', 'Kosova']
@@ -0,0 +1,38 @@
+'''CountryYearCube against the groupby over the WHOIS rows it replaces.'''
+import numpy as np
+import pandas as pd
+
+from data_processing.country_year_cube import CountryYearCube
+
+
+def whois_ipv4():
+    return pd.DataFrame({
+        'ISO-3': pd.Categorical(['NLD', 'NLD', 'NLD', 'USA', 'USA', 'USA']),
+        'Year': np.array([2000, 2000, 2003, 2001, 2001, 2002], dtype='int16'),
+        'Value': np.array([256, 512, 1024, 0, 65536, 256], dtype='uint32'),
+        'Population': [16e6, 16e6, np.nan, 285e6, 285e6, 288e6],
+        'GDPPerCap': [np.nan, 26000.0, 33000.0, 37000.0, 38000.0, 38500.0],
+    })
+
+
+def test_cells_match_groupby():
+    df = whois_ipv4()
+    cube = CountryYearCube.from_frames(df)
+    grouped = df.groupby(['ISO-3', 'Year'], observed=True).agg(
+        {'Value': 'sum', 'Population': 'first', 'GDPPerCap': 'first', 'ISO-3': 'size'})
+    for (iso3, year), row in grouped.iterrows():
+        assert cube.value(iso3, year, 'allocated') == row['Value']
+        assert cube.value(iso3, year, 'delegations') == row['ISO-3']
+        np.testing.assert_equal(cube.value(iso3, year, 'population'), row['Population'])
+        np.testing.assert_equal(cube.value(iso3, year, 'gdp_per_capita'), row['GDPPerCap'])
+    # Every other cell is empty
+    assert cube.metric('delegations').sum() == len(df)
+    assert list(cube.years) == [2000, 2001, 2002, 2003]
+
+
+def test_cumulative_runs_over_empty_years():
+    cube = CountryYearCube.from_frames(whois_ipv4())
+    assert cube.country('NLD', 'cumulative').tolist() == [768, 768, 768, 1792]
+    assert cube.country('USA', 'cumulative').tolist() == [0, 65536, 65792, 65792]
+    # A year with only an empty delegation still has a row's worth of delegations
+    assert cube.value('USA', 2001, 'delegations') == 2
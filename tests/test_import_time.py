@@ -0,0 +1,58 @@
+'''Import cost of main.py.
+
+Importing main must not pull in the plotting, grid or data layers (create_app does that). That is checked
+structurally, from ``sys.modules`` in a fresh interpreter. The import time itself, measured with
+``python -X importtime``, is only reported (run pytest with ``-s`` to see it) unless MAIN_IMPORT_BUDGET_MS
+sets a budget for it, since wall-clock time depends on the machine the tests run on.
+'''
+import json
+import os
+import re
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_MS = os.environ.get('MAIN_IMPORT_BUDGET_MS')
+RUNS = 3
+DEFERRED_MODULES = [
+    'plotly.express',
+    'dash_ag_grid',
+    'dash_bootstrap_components',
+    'dash_bootstrap_templates',
+    'pycountry',
+    'classes.data_handler',
+    'data_processing.ip_math',
+]
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|\s+(\S+)$')
+
+
+def imported_with(module):
+    '''Names in ``sys.modules`` after importing ``module`` in a fresh interpreter.'''
+    result = subprocess.run([sys.executable, '-c', f'import json, sys, {module}; print(json.dumps(sorted(sys.modules)))'],
+                            capture_output=True, text=True, check=True, cwd=REPO_ROOT)
+    return set(json.loads(result.stdout.splitlines()[-1]))
+
+
+def import_ms(module):
+    '''Cumulative import time of ``module`` in a fresh interpreter, in milliseconds.'''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True, cwd=REPO_ROOT)
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and match.group(3) == module:
+            return int(match.group(2)) / 1000
+    raise AssertionError(f'-X importtime reported nothing for {module}')
+
+
+def test_import_main_defers_heavy_modules():
+    imported = imported_with('main')
+    eager = sorted(module for module in DEFERRED_MODULES if module in imported)
+    assert not eager, 'imported eagerly: ' + ', '.join(eager)
+
+
+def test_import_main_time():
+    # The fastest run is the least disturbed by the rest of the machine
+    best_ms = min(import_ms('main') for _ in range(RUNS))
+    print(f'import main: {best_ms:.0f} ms')
+    if BUDGET_MS:
+        assert best_ms <= float(BUDGET_MS), f'import main took {best_ms:.0f} ms, budget {BUDGET_MS} ms'
@@ -0,0 +1,28 @@
+'''IPv4 parsing and CIDR decomposition in data_processing.ip_math.'''
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_processing import ip_math
+
+
+def test_ipv4_to_int_round_trip():
+    addresses = pd.Series(['0.0.0.0', '1.2.3.4', '192.0.2.255', '255.255.255.255'])
+    values = ip_math.ipv4_to_int(addresses)
+    assert values.dtype == np.uint32
+    assert values.tolist() == [0, 0x01020304, 0xC00002FF, 0xFFFFFFFF]
+    assert list(ip_math.int_to_ipv4(values)) == addresses.tolist()
+    assert ip_math.ipv4_to_int(addresses.astype('category')).tolist() == values.tolist()
+
+
+@pytest.mark.parametrize('address', ['1.2.3.256', '1.2.3', '1.2.3.4.5', '01.2.3.4', ' 1.2.3.4', 'a.b.c.d', '', None])
+def test_ipv4_to_int_rejects_malformed_addresses(address):
+    with pytest.raises(ValueError):
+        ip_math.ipv4_to_int(pd.Series(['10.0.0.0', address], dtype=object))
+
+
+def test_explode_ipv4_cidrs_skips_rows_without_addresses():
+    df = pd.DataFrame({'Start': ['10.0.0.0', None], 'Value': [768, 0]})
+    exploded = ip_math.explode_ipv4_cidrs(df)
+    assert exploded['Start'].tolist()[:2] == ['10.0.0.0', '10.0.2.0']
+    assert exploded['Prefix'].tolist() == [23, 24, 0]
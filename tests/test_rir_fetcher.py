@@ -0,0 +1,122 @@
+'''CachedFetcher and fetch_rir_files against a local http.server: download, ETag revalidation, checksums.'''
+import hashlib
+import http.server
+import os
+import threading
+
+import pytest
+
+from data_processing import rir_fetcher
+
+DELEGATED = b'2|test|20240101|2|19830101|20240101|+0000\ntest|NL|ipv4|192.0.2.0|256|20100101|allocated|abc\n'
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    '''Serves ``server.files`` (path -> bytes) with an ETag per body, answering If-None-Match with a 304.'''
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.files = {}
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def publish(server, name, body, md5=None):
+    server.files[f'/{name}'] = body
+    server.files[f'/{name}.md5'] = f'MD5 ({name}) = {md5 or hashlib.md5(body).hexdigest()}\n'.encode()
+    return f'http://127.0.0.1:{server.server_address[1]}/{name}'
+
+
+def test_download_then_etag_revalidation(server, tmp_path):
+    url = publish(server, 'delegated-test', DELEGATED)
+    fetcher = rir_fetcher.CachedFetcher(str(tmp_path))
+
+    path, changed = fetcher.fetch('test', url)
+    assert changed
+    with open(path, 'rb') as cached_file:
+        assert cached_file.read() == DELEGATED
+
+    path, changed = fetcher.fetch('test', url, expected_md5=hashlib.md5(DELEGATED).hexdigest())
+    assert not changed
+    # The second request carried the ETag of the first answer and got a 304
+    assert server.requests[-1] == ('/delegated-test', '"' + hashlib.sha1(DELEGATED).hexdigest() + '"')
+
+
+def test_fetch_rir_files_skips_unchanged_files(server, tmp_path):
+    urls = {'test': publish(server, 'delegated-test', DELEGATED)}
+    paths = rir_fetcher.fetch_rir_files(urls, cache_dir=str(tmp_path))
+    assert paths == {'test': os.path.join(str(tmp_path), 'test')}
+
+    del server.requests[:]
+    assert rir_fetcher.fetch_rir_files(urls, cache_dir=str(tmp_path)) == paths
+    # Only the checksum is asked for: the cached body already matches it
+    assert [path for path, _ in server.requests] == ['/delegated-test.md5']
+
+
+def test_corrupt_cached_copy_is_downloaded_again_on_304(server, tmp_path):
+    url = publish(server, 'delegated-test', DELEGATED)
+    fetcher = rir_fetcher.CachedFetcher(str(tmp_path))
+    path, _ = fetcher.fetch('test', url)
+    with open(path, 'wb') as cached_file:
+        cached_file.write(DELEGATED[:20])
+
+    path, changed = fetcher.fetch('test', url, expected_md5=hashlib.md5(DELEGATED).hexdigest())
+    assert changed
+    with open(path, 'rb') as cached_file:
+        assert cached_file.read() == DELEGATED
+    assert [etag is not None for _, etag in server.requests] == [False, True, False]
+
+
+def test_checksum_mismatch(server, tmp_path):
+    good = {'good': publish(server, 'delegated-good', DELEGATED)}
+    bad = {'bad': publish(server, 'delegated-bad', DELEGATED, md5='0' * 32)}
+
+    with pytest.raises(rir_fetcher.RIRFetchError) as raised:
+        rir_fetcher.fetch_rir_files({**good, **bad}, cache_dir=str(tmp_path))
+    # The good registry is still fetched, and only the bad one is reported
+    assert set(raised.value.errors) == {'bad'}
+    assert isinstance(raised.value.errors['bad'], rir_fetcher.ChecksumMismatchError)
+    assert set(raised.value.paths) == {'good'}
+    assert not os.path.exists(os.path.join(str(tmp_path), 'bad'))
+
+
+def test_failed_fetch_falls_back_to_cached_copy(server, tmp_path):
+    urls = {'test': publish(server, 'delegated-test', DELEGATED)}
+    paths = rir_fetcher.fetch_rir_files(urls, cache_dir=str(tmp_path))
+
+    # A new upload whose body does not match its checksum leaves the last good copy in service
+    publish(server, 'delegated-test', DELEGATED + b'truncated', md5=hashlib.md5(b'something else').hexdigest())
+    assert rir_fetcher.fetch_rir_files(urls, cache_dir=str(tmp_path)) == paths
+    with open(paths['test'], 'rb') as cached_file:
+        assert cached_file.read() == DELEGATED
+
+    del server.files['/delegated-test']
+    del server.files['/delegated-test.md5']
+    assert rir_fetcher.fetch_rir_files(urls, cache_dir=str(tmp_path)) == paths
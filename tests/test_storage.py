@@ -0,0 +1,46 @@
+'''Column stores in data_processing.storage: round trip and swapping in a new version.'''
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_processing import storage
+
+
+def sample_frame(offset=0):
+    return pd.DataFrame({
+        'Start': np.arange(offset, offset + 6, dtype='uint32'),
+        'Registry': pd.Categorical(['arin', 'ripencc', None, 'arin', 'apnic', 'arin']),
+        'Value': pd.array([1, None, 3, 4, 5, 6], dtype='UInt32'),
+        'Date': pd.to_datetime(['2020-01-01'] * 6),
+    })
+
+
+def test_round_trip(tmp_path):
+    store_path = str(tmp_path / 'whois.columns')
+    storage.write_column_store(sample_frame(), store_path)
+    # copy() turns the memory-mapped columns into ordinary arrays to compare
+    pd.testing.assert_frame_equal(storage.open_column_store(store_path).copy(), sample_frame())
+
+
+def test_rewrite_keeps_open_readers_and_the_store_in_place(tmp_path):
+    store_path = str(tmp_path / 'whois.columns')
+    storage.write_column_store(sample_frame(), store_path)
+    opened = storage.open_column_store(store_path)
+
+    storage.write_column_store(sample_frame(100), store_path)
+    storage.write_column_store(sample_frame(200), store_path)
+    assert storage.open_column_store(store_path)['Start'].tolist() == list(range(200, 206))
+    # A frame mapped from an earlier version still reads its own data
+    assert opened['Start'].tolist() == list(range(6))
+    assert os.path.islink(store_path)
+
+
+def test_replaces_a_store_written_as_a_plain_directory(tmp_path):
+    store_path = tmp_path / 'whois.columns'
+    store_path.mkdir()
+    (store_path / 'columns.json').write_text(json.dumps({'rows': 0, 'columns': []}))
+
+    storage.write_column_store(sample_frame(), str(store_path))
+    assert len(storage.open_column_store(str(store_path))) == 6